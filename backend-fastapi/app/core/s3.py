@@ -31,6 +31,24 @@ class S3Client:
             error_code = e.response.get("Error", {}).get("Code", "Unknown")
             raise S3ServiceException(message=f"S3 버킷 접근 실패: {error_code}")
 
+    @staticmethod
+    def _is_faststart_mp4(data: bytes) -> bool:
+        # 최상위 박스를 훑어 moov가 mdat보다 앞에 있으면 이미 faststart
+        offset = 0
+        while offset + 8 <= len(data):
+            size = int.from_bytes(data[offset : offset + 4], "big")
+            box_type = data[offset + 4 : offset + 8]
+            if box_type == b"moov":
+                return True
+            if box_type == b"mdat":
+                return False
+            if size == 1 and offset + 16 <= len(data):
+                size = int.from_bytes(data[offset + 8 : offset + 16], "big")
+            if size < 8:
+                return False
+            offset += size
+        return False
+
     def _extract_thumbnail(
         self, video_file: UploadFile = File(...), thumbnail_time: int = 5
     ) -> bytes:
@@ -93,46 +111,49 @@ class S3Client:
             file_content = file.file.read()
             file.file.seek(0)
 
-            processed_bytes = None
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp_in:
-                tmp_in.write(file_content)
-                input_path = tmp_in.name
-
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp_out:
-                output_path = tmp_out.name
-
-            try:
-                subprocess.run(
-                    [
-                        "ffmpeg",
-                        "-i",
-                        input_path,
-                        "-movflags",
-                        "faststart",
-                        "-c",
-                        "copy",
-                        "-y",
-                        output_path,
-                    ],
-                    check=True,
-                    capture_output=True,
-                )
-                with open(output_path, "rb") as f:
-                    processed_bytes = f.read()
-
-            except subprocess.CalledProcessError as e:
-                # FFmpeg 처리 실패 시 원본 파일 사용 (임시 방편)
-                processed_bytes = file_content
-                self.logger.error(
-                    f"FFmpeg faststart 실패. 원본 업로드 시도: {e.stderr.decode()}"
-                )
-            except FileNotFoundError:
-                # FFmpeg가 환경에 설치되지 않은 경우
+            if self._is_faststart_mp4(file_content):
+                # 워커가 이미 faststart MP4로 먹싱해 올린 클립은 재먹싱하지 않음
                 processed_bytes = file_content
-                self.logger.error("FFmpeg가 설치되지 않았습니다. 원본 업로드 시도.")
-            finally:
-                os.remove(input_path)
-                os.remove(output_path)
+            else:
+                with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp_in:
+                    tmp_in.write(file_content)
+                    input_path = tmp_in.name
+
+                with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp_out:
+                    output_path = tmp_out.name
+
+                try:
+                    subprocess.run(
+                        [
+                            "ffmpeg",
+                            "-i",
+                            input_path,
+                            "-movflags",
+                            "faststart",
+                            "-c",
+                            "copy",
+                            "-y",
+                            output_path,
+                        ],
+                        check=True,
+                        capture_output=True,
+                    )
+                    with open(output_path, "rb") as f:
+                        processed_bytes = f.read()
+
+                except subprocess.CalledProcessError as e:
+                    # FFmpeg 처리 실패 시 원본 파일 사용 (임시 방편)
+                    processed_bytes = file_content
+                    self.logger.error(
+                        f"FFmpeg faststart 실패. 원본 업로드 시도: {e.stderr.decode()}"
+                    )
+                except FileNotFoundError:
+                    # FFmpeg가 환경에 설치되지 않은 경우
+                    processed_bytes = file_content
+                    self.logger.error("FFmpeg가 설치되지 않았습니다. 원본 업로드 시도.")
+                finally:
+                    os.remove(input_path)
+                    os.remove(output_path)
 
             from io import BytesIO
 
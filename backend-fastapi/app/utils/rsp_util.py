@@ -57,6 +57,7 @@ class ExerciseGameHandler:
             if not self._is_mqtt_connected():
                 raise ConnectionError("MQTT client not connected")
             await self._send_prepare_status()
+            await self._send_worker_arm()
             await tts_callback("준비됐어? 하나 둘 셋!")
             await asyncio.sleep(5)
 
@@ -118,6 +119,10 @@ class ExerciseGameHandler:
             payload=json.dumps(payload), topic="buriburi/robot/all/command"
         )
 
+    async def _send_worker_arm(self):
+        """카운트다운 동안 워커가 포즈 판정을 미리 모아 두도록 알림 (응답 없음)"""
+        await self.mqtt_client.publish(payload="arm", topic="rsp_req")
+
     async def _send_worker_request(self):
         await self.mqtt_client.publish(payload="start", topic="rsp_req")
 
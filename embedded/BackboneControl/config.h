@@ -16,6 +16,7 @@
 // 구독할 토픽 (로봇 명령 채널)
 #define SUB_TOPIC           BASE_TOPIC "/robot/all/command"
 #define SUB_TOPIC_BACKBONE  BASE_TOPIC "/robot/robot_backbone/command" // 백본 전용 명령 토픽
+#define SUB_TOPIC_BACKBONE_BIN  SUB_TOPIC_BACKBONE "/bin"        // 얼굴 추적 binary 메시지 토픽 (16바이트 struct)
 #define PUB_TOPIC_JOINT     BASE_TOPIC "/robot/joint"   // 상태 발행(Publish) 토픽(수동 제어 시 사용)
 
 // ===== Servo Motors =====
@@ -1,5 +1,7 @@
 #pragma once 
 
+#include <sys/time.h>
+
 // NTP 시간 동기화를 위한 설정
 const long gmtOffset_sec = 9 * 3600;
 const int daylightOffset_sec = 0;
@@ -90,8 +92,120 @@ void publishStatus() {
   }
 }
 
+// ===== 얼굴 추적 처리 (JSON / binary 공용) =====
+
+// 얼굴 추적 (track_face) - 매우 자주 오므로 moveInitPose() 호출 금지
+void applyTrackFace(float x, float y) {
+  isIdle = false;             
+  lastCommandTime = millis(); 
+  currentAction = ACTION_TRACKING; 
+  actionStep = 0; // 트래킹 중에는 다른 액션 step이 간섭하지 않도록 초기화
+  trackingTargetX = x;
+  trackingTargetY = y;
+}
+
+// 얼굴 놓침 (track_lost)
+void applyTrackLost() {
+  if (currentAction == ACTION_TRACKING) {
+    Serial.println("Target lost. Stopping at current pose.");
+    detachWaistServo(); // 허리 서보 전원 차단
+    currentAction = ACTION_NONE; 
+    isIdle = true;            
+  }
+}
+
+// binary 얼굴 추적 메시지 (SUB_TOPIC_BACKBONE_BIN, little-endian 16바이트)
+// object-detection/face_tracking/tracking_wire.py의 TRACK_STRUCT("<BBHIHHhh")와 같아야 함
+const uint8_t TRACK_WIRE_VERSION = 1;
+const uint8_t TRACK_KIND_FACE = 1;
+const uint8_t TRACK_KIND_LOST = 2;
+const unsigned int TRACK_WIRE_SIZE = 16;
+const unsigned long trackStatsInterval = 10000; // 지연 / 유실 통계 출력 주기 (ms)
+
+// 워커 시각(유닉스 ms 하위 32비트)과 비교할 현재 시각 - NTP 동기화 전이면 0
+uint32_t epochMillis32() {
+  struct timeval tv;
+  gettimeofday(&tv, NULL);
+  if (tv.tv_sec < 1600000000) {
+    return 0;
+  }
+  return (uint32_t)((uint64_t)tv.tv_sec * 1000ULL + tv.tv_usec / 1000);
+}
+
+void handleBinaryTracking(const byte* payload, unsigned int length) {
+  static bool hasLastSeq = false;
+  static uint16_t lastSeq = 0;
+  static unsigned long received = 0;
+  static unsigned long lost = 0;
+  static unsigned long latencySamples = 0;
+  static unsigned long latencySumMs = 0;
+  static unsigned long latencyMaxMs = 0;
+  static unsigned long lastStatsTime = 0;
+
+  if (length != TRACK_WIRE_SIZE || payload[0] != TRACK_WIRE_VERSION) {
+    Serial.printf("Unknown tracking message (len=%u, version=%u)\n", length, length ? payload[0] : 0);
+    return;
+  }
+
+  // 정렬되지 않은 접근을 피하려고 필드별로 memcpy (ESP32는 little-endian)
+  uint8_t kind = payload[1];
+  uint16_t seq, x, y;
+  uint32_t sentMs;
+  memcpy(&seq, payload + 2, 2);
+  memcpy(&sentMs, payload + 4, 4);
+  memcpy(&x, payload + 8, 2);
+  memcpy(&y, payload + 10, 2);
+  // vx, vy (offset 12, 14)는 아직 쓰지 않음
+
+  // 시퀀스 간격으로 유실 수 계산 (uint16 wrap 고려, 워커 재시작처럼 크게 튀면 무시)
+  received++;
+  if (hasLastSeq) {
+    uint16_t gap = (uint16_t)(seq - lastSeq);
+    if (gap > 1 && gap < 1000) {
+      lost += gap - 1;
+    }
+  }
+  hasLastSeq = true;
+  lastSeq = seq;
+
+  // 종단 지연 (워커 인코딩 → 여기까지), 양쪽 시계가 NTP로 맞춰져 있을 때만
+  uint32_t nowMs = epochMillis32();
+  if (nowMs != 0) {
+    uint32_t latencyMs = nowMs - sentMs;
+    if (latencyMs < 60000) {
+      latencySamples++;
+      latencySumMs += latencyMs;
+      if (latencyMs > latencyMaxMs) {
+        latencyMaxMs = latencyMs;
+      }
+    }
+  }
+
+  if (millis() - lastStatsTime > trackStatsInterval) {
+    lastStatsTime = millis();
+    Serial.printf("[Tracking] recv=%lu lost=%lu latency avg=%lums max=%lums\n",
+                  received, lost,
+                  latencySamples ? latencySumMs / latencySamples : 0, latencyMaxMs);
+    latencySamples = 0;
+    latencySumMs = 0;
+    latencyMaxMs = 0;
+  }
+
+  if (kind == TRACK_KIND_FACE) {
+    applyTrackFace(x / 65535.0f, y / 65535.0f);
+  } else if (kind == TRACK_KIND_LOST) {
+    applyTrackLost();
+  }
+}
+
 // MQTT 메시지 수신 시 호출될 콜백 함수
 void mqttCallback(char* topic, byte* payload, unsigned int length) {
+  // binary 추적 메시지는 토픽 접미사로 구분해 JSON 파싱 없이 처리
+  if (strcmp(topic, SUB_TOPIC_BACKBONE_BIN) == 0) {
+    handleBinaryTracking(payload, length);
+    return;
+  }
+
   // payload를 문자열로 복사 (로그 출력보다 먼저 수행되어야 함)
   char msg[length + 1];
   memcpy(msg, payload, length);
@@ -138,26 +252,13 @@ void mqttCallback(char* topic, byte* payload, unsigned int length) {
   // Case A: 얼굴 추적 (track_face)
   // 매우 자주 오므로 moveInitPose() 호출 금지
   if (strcmp(cmd, "track_face") == 0) {
-    isIdle = false;             
-    lastCommandTime = millis(); 
-    currentAction = ACTION_TRACKING; 
-    actionStep = 0; // 트래킹 중에는 다른 액션 step이 간섭하지 않도록 초기화
-
-    if (doc.containsKey("x") && doc.containsKey("y")) {
-      trackingTargetX = doc["x"];
-      trackingTargetY = doc["y"];
-    }
+    applyTrackFace(doc["x"] | trackingTargetX, doc["y"] | trackingTargetY);
     return; // 바로 리턴
   }
 
   // Case B: 얼굴 놓침 (track_lost)
   if (strcmp(cmd, "track_lost") == 0) {
-    if (currentAction == ACTION_TRACKING) {
-      Serial.println("Target lost. Stopping at current pose.");
-      detachWaistServo(); // 허리 서보 전원 차단
-      currentAction = ACTION_NONE; 
-      isIdle = true;            
-    }
+    applyTrackLost();
     return;
   }
   // Case C: 일반 명령어
@@ -228,10 +329,13 @@ void ensureMqttConnected() {
     // 구독할 토픽 설정
     mqttClient.subscribe(SUB_TOPIC); // 공용 토픽
     mqttClient.subscribe(SUB_TOPIC_BACKBONE); // 백본 전용 토픽(얼굴 추적)
+    mqttClient.subscribe(SUB_TOPIC_BACKBONE_BIN); // 얼굴 추적 binary 토픽
     Serial.print("Subscribed to: ");
     Serial.println(SUB_TOPIC);
     Serial.print("Subscribed to: ");
     Serial.println(SUB_TOPIC_BACKBONE);
+    Serial.print("Subscribed to: ");
+    Serial.println(SUB_TOPIC_BACKBONE_BIN);
   } else {
     Serial.print("failed, rc=");
     Serial.print(mqttClient.state());
@@ -0,0 +1,138 @@
+# clip_encoder.py
+# decode 경로 스마일 클립 인코더 선택
+# 기본은 PyAV + libx264로 H.264 faststart MP4를 바로 만든다 (브라우저 재생 가능, 백엔드 재먹싱 생략)
+# mp4v(MPEG-4 Part 2)를 쓰던 cv2.VideoWriter는 CLIP_CODEC=mp4v로 계속 쓸 수 있다
+#   CLIP_PROFILE=speed     ultrafast / CRF 28 (기본, 인코더 스레드 부담 최소)
+#   CLIP_PROFILE=balanced  veryfast / CRF 26
+#   CLIP_PROFILE=size      faster / CRF 30 (업로드 / S3 용량 최소)
+# CLIP_PRESET / CLIP_CRF를 주면 프로필 값을 덮어쓴다 (용량은 프로필로 조절)
+# CLIP_MAX_HEIGHT를 주면 그 높이 이하로 줄인다 (기본 0 = 원본 해상도 유지, 필요할 때만 켠다)
+import os
+from fractions import Fraction
+
+import av
+import cv2
+
+CLIP_CODEC = os.getenv("CLIP_CODEC", "libx264").lower()
+CLIP_PROFILES = {
+    "speed": ("ultrafast", 28),
+    "balanced": ("veryfast", 26),
+    "size": ("faster", 30),
+}
+CLIP_PROFILE = os.getenv("CLIP_PROFILE", "speed").lower()
+CLIP_PRESET = os.getenv("CLIP_PRESET", "")
+CLIP_CRF = os.getenv("CLIP_CRF", "")
+CLIP_MAX_HEIGHT = int(os.getenv("CLIP_MAX_HEIGHT", "0"))
+# libx264 내부 스레드 수 (기본값은 코어 수 x 1.5라 추론 스레드와 CPU를 다툰다)
+CLIP_X264_THREADS = int(os.getenv("CLIP_X264_THREADS", "2"))
+
+
+def output_size(width, height, max_height=CLIP_MAX_HEIGHT):
+    """max_height 이하로 종횡비를 유지해 줄인 크기 (yuv420p용 짝수)"""
+    if max_height > 0 and height > max_height:
+        width = width * max_height / height
+        height = max_height
+    return max(2, int(width) // 2 * 2), max(2, int(height) // 2 * 2)
+
+
+def frame_size(frame):
+    """av.VideoFrame 또는 bgr24 배열의 (width, height)"""
+    if hasattr(frame, "to_ndarray"):
+        return frame.width, frame.height
+    return frame.shape[1], frame.shape[0]
+
+
+class PyAVClipWriter:
+    """
+    libx264 faststart MP4 writer
+    write()는 av.VideoFrame(디코딩된 수신 프레임, 그대로 yuv420p로 변환)과 bgr24 배열(pre-roll)을 모두 받는다
+    """
+
+    def __init__(self, path, fps, size, codec="libx264", preset="ultrafast", crf=28, threads=2):
+        self.path = path
+        self.width, self.height = size
+        self._rate = Fraction(fps).limit_denominator(1000)
+        self._time_base = 1 / self._rate
+        self._index = 0
+        self.container = av.open(path, mode="w", format="mp4", options={"movflags": "faststart"})
+        try:
+            self.stream = self.container.add_stream(
+                codec,
+                rate=self._rate,
+                options={"preset": preset, "crf": str(crf), "threads": str(threads)},
+            )
+            self.stream.width = self.width
+            self.stream.height = self.height
+            self.stream.pix_fmt = "yuv420p"
+        except Exception:
+            self.container.close()
+            raise
+
+    def write(self, frame):
+        if not hasattr(frame, "to_ndarray"):
+            frame = av.VideoFrame.from_ndarray(frame, format="bgr24")
+        # 크기 조정과 색 공간 변환을 swscale 한 번으로
+        frame = frame.reformat(width=self.width, height=self.height, format="yuv420p")
+        frame.pts = self._index
+        frame.time_base = self._time_base
+        self._index += 1
+        for packet in self.stream.encode(frame):
+            self.container.mux(packet)
+
+    def release(self):
+        if self.container is None:
+            return
+        try:
+            for packet in self.stream.encode():
+                self.container.mux(packet)
+        finally:
+            self.container.close()
+            self.container = None
+
+
+class OpenCVClipWriter:
+    """예전 방식 cv2.VideoWriter(mp4v) - 파일이 크고 브라우저 재생이 불안정해 백엔드에서 재먹싱된다"""
+
+    def __init__(self, path, fps, size, fourcc="mp4v"):
+        self.path = path
+        self.size = size
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+        if not self.writer.isOpened():
+            raise RuntimeError(f"VideoWriter initialization failed for FourCC='{fourcc}'")
+
+    def write(self, frame):
+        if hasattr(frame, "to_ndarray"):
+            frame = frame.to_ndarray(format="bgr24")
+        if (frame.shape[1], frame.shape[0]) != self.size:
+            frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        self.writer.write(frame)
+
+    def release(self):
+        self.writer.release()
+
+
+def open_clip_writer(path, fps, size):
+    """
+    설정된 인코더로 클립 writer를 연다 (size: 입력 프레임 크기, 출력은 CLIP_MAX_HEIGHT 기준으로 줄임)
+    libx264를 열 수 없으면 mp4v로 대체, 그것도 실패하면 None
+    """
+    out_size = output_size(*size)
+    if CLIP_CODEC != "mp4v":
+        preset, crf = CLIP_PROFILES.get(CLIP_PROFILE, CLIP_PROFILES["speed"])
+        try:
+            return PyAVClipWriter(
+                path,
+                fps,
+                out_size,
+                codec=CLIP_CODEC,
+                preset=CLIP_PRESET or preset,
+                crf=int(CLIP_CRF) if CLIP_CRF else crf,
+                threads=CLIP_X264_THREADS,
+            )
+        except Exception as e:
+            print(f"⚠️ [ClipEncoder] {CLIP_CODEC} 인코더를 열 수 없어 mp4v로 녹화합니다: {e}")
+    try:
+        return OpenCVClipWriter(path, fps, out_size)
+    except RuntimeError as e:
+        print(f"❌ ERROR: {e}. Check FFmpeg installation.")
+        return None
@@ -0,0 +1,181 @@
+# clip_recorder.py
+# decode 경로 스마일 클립 인코딩을 감지 루프 밖의 인코더 스레드에서 수행
+# 감지 스레드는 pre-roll JPEG 스냅샷과 이후 프레임의 참조(av.VideoFrame)만 넘기고 바로 돌아간다
+# 인코더 스레드가 pre-roll을 한 장씩 디코딩해 쓰고, 이어서 라이브 프레임을 인코딩한다 (인코더는 clip_encoder.py)
+# 여러 세션이 인코더 스레드 풀(CLIP_ENCODER_THREADS)을 나눠 쓴다 - 기본은 세션 수만큼이라 동시 클립이 서로 기다리지 않는다
+# 그래도 큐가 넘쳐 프레임이 빠진 클립은 degraded로 표시하고 로그 / metrics로 남긴다
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from clip_encoder import frame_size, open_clip_writer
+from metrics import CLIP_ENCODE_SECONDS, CLIP_FRAMES_DROPPED, CLIPS_DEGRADED
+
+# 인코더 스레드 수 (0이면 워커가 구독하는 세션 수만큼)
+CLIP_ENCODER_THREADS = int(os.getenv("CLIP_ENCODER_THREADS", "0"))
+# 클립 하나가 인코더를 기다리며 쌓아 둘 수 있는 라이브 프레임 수 (넘치면 드롭, 감지 루프는 막지 않음)
+CLIP_QUEUE_FRAMES = int(os.getenv("CLIP_QUEUE_FRAMES", "90"))
+# 이 시간 동안 다음 프레임도 finish()도 오지 않으면 모인 만큼으로 클립을 닫는다 (공유 인코더 스레드 보호)
+CLIP_FRAME_TIMEOUT = float(os.getenv("CLIP_FRAME_TIMEOUT", "5.0"))
+
+_END = object()
+
+
+class ClipJob:
+    """
+    클립 하나 - 감지 스레드는 push(frame) / finish()만 호출한다
+    frame은 av.VideoFrame(인코더 스레드에서 변환) 또는 소유권을 넘긴 bgr24 배열
+    """
+
+    def __init__(self, path, fps, preroll, max_queue, on_done):
+        self.path = path
+        self.fps = fps
+        self.preroll = preroll  # JPEG bytes 목록 (오래된 순)
+        self.max_queue = max_queue
+        self.on_done = on_done
+        self.frames = queue.Queue()
+        self.pushed = 0
+        self.dropped = 0
+        self.written = 0
+        self.closed = False  # 인코딩이 끝났거나 실패함 (더 받지 않음)
+
+    @property
+    def degraded(self):
+        """큐가 넘쳐 빠진 프레임이 있는 클립"""
+        return self.dropped > 0
+
+    def push(self, frame):
+        if self.closed:
+            return False
+        if self.frames.qsize() >= self.max_queue:
+            if not self.dropped:
+                print(
+                    f"⚠️ [ClipEncoder] 인코더가 밀려 프레임을 버립니다 "
+                    f"(대기 {self.max_queue}장 초과): {self.path}"
+                )
+            self.dropped += 1
+            return False
+        self.frames.put_nowait(frame)
+        self.pushed += 1
+        return True
+
+    def finish(self):
+        self.frames.put_nowait(_END)
+
+
+class ClipRecorder:
+    """
+    start(path, fps, preroll, on_done)로 클립을 시작하면 ClipJob을 돌려준다
+    인코더 스레드는 작업을 하나씩 끝까지 처리하고 on_done(path, ok)를 호출한다 (인코더 스레드에서)
+    """
+
+    def __init__(
+        self, threads=CLIP_ENCODER_THREADS, max_queue=CLIP_QUEUE_FRAMES, frame_timeout=CLIP_FRAME_TIMEOUT
+    ):
+        self.max_queue = max(1, max_queue)
+        self.frame_timeout = frame_timeout
+        self._jobs = queue.Queue()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"ClipEncoder-{i}", daemon=True)
+            for i in range(max(1, threads))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def start(self, path, fps, preroll, on_done=None):
+        job = ClipJob(path, fps, preroll, self.max_queue, on_done)
+        self._jobs.put(job)
+        return job
+
+    def close(self, timeout=30.0):
+        """남은 작업을 마저 인코딩하고 스레드를 멈춘다"""
+        for _ in self._threads:
+            self._jobs.put(None)
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            started = time.monotonic()
+            ok = False
+            try:
+                ok = self._encode(job)
+            except Exception as e:
+                print(f"❌ [ClipEncoder] 인코딩 중 오류 ({job.path}): {e}")
+            job.closed = True
+            self._drain(job)
+            elapsed = time.monotonic() - started
+            CLIP_ENCODE_SECONDS.observe(elapsed)
+            if job.degraded:
+                CLIP_FRAMES_DROPPED.inc(job.dropped)
+                CLIPS_DEGRADED.inc()
+            if ok and job.degraded:
+                print(
+                    f"⚠️ 녹화 완료 (degraded): {job.path} "
+                    f"({job.written}장, 드롭 {job.dropped}/{job.pushed + job.dropped}장, 인코딩 {elapsed:.1f}s)"
+                )
+            elif ok:
+                print(f"녹화 완료: {job.path} ({job.written}장, 인코딩 {elapsed:.1f}s)")
+            if job.on_done is not None:
+                try:
+                    job.on_done(job.path, ok)
+                except Exception as e:
+                    print(f"[ClipEncoder] on_done 처리 중 오류: {e}")
+
+    def _encode(self, job):
+        writer = None
+        try:
+            # pre-roll은 한 장씩 디코딩해 바로 쓴다 (전체를 메모리에 풀지 않음)
+            frames = (
+                cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+                for data in job.preroll
+            )
+            for frame_bgr in frames:
+                if frame_bgr is None:
+                    continue
+                if writer is None:
+                    writer = open_clip_writer(job.path, job.fps, frame_size(frame_bgr))
+                    if writer is None:
+                        return False
+                writer.write(frame_bgr)
+                job.written += 1
+            job.preroll = None
+
+            while True:
+                try:
+                    item = job.frames.get(timeout=self.frame_timeout)
+                except queue.Empty:
+                    print(
+                        f"⚠️ [ClipEncoder] {self.frame_timeout:.0f}s 동안 프레임이 없어 클립을 닫습니다: {job.path}"
+                    )
+                    break
+                if item is _END:
+                    break
+                # av.VideoFrame은 writer가 출력 형식으로 바로 변환 (BGR 배열을 거치지 않음)
+                if writer is None:
+                    writer = open_clip_writer(job.path, job.fps, frame_size(item))
+                    if writer is None:
+                        return False
+                writer.write(item)
+                job.written += 1
+        finally:
+            if writer is not None:
+                writer.release()
+        return writer is not None
+
+    @staticmethod
+    def _drain(job):
+        # 실패한 클립에 쌓인 프레임 참조를 바로 놓아 준다
+        while True:
+            try:
+                job.frames.get_nowait()
+            except queue.Empty:
+                return
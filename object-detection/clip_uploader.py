@@ -0,0 +1,270 @@
+# clip_uploader.py
+# 스마일 클립 업로드 서브시스템
+# - 모든 업로드가 커넥션 풀을 가진 httpx.AsyncClient 하나를 공유 (h2 패키지가 있으면 HTTP/2)
+# - 파일은 multipart 스트림으로 디스크에서 조각조각 읽어 보낸다 (메모리에 통째로 올리지 않음)
+#   디스크 읽기는 asyncio.to_thread에서 해서 이벤트 루프(WebRTC / MQTT)를 막지 않는다
+# - 업로드할 클립은 먼저 스풀 디렉터리로 옮기고 성공했을 때만 지우므로, 백엔드 장애나 워커 재시작에도 남는다
+# - 실패하면 지터를 섞은 지수 백오프로 재시도, 동시 업로드 수는 concurrency로 제한
+import asyncio
+import importlib.util
+import os
+import random
+import shutil
+import time
+
+import httpx
+
+from metrics import UPLOAD_SECONDS, UPLOADS
+
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR", "upload_spool")
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "2"))
+UPLOAD_MAX_ATTEMPTS = int(os.getenv("UPLOAD_MAX_ATTEMPTS", "8"))
+UPLOAD_SPOOL_MAX_BYTES = int(os.getenv("UPLOAD_SPOOL_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 256 * 1024
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class ClipUploader:
+    """
+    queue에 클립 경로를 넣으면 (StreamSession.submit_upload) 바로 스풀로 옮기고, 업로드는 작업 큐에서 순서대로 진행
+    - 2xx: 스풀에서 삭제
+    - 408 / 429 / 5xx / 네트워크 오류: base_delay * 2^(시도-1) (최대 max_delay, 지터 포함) 뒤 재시도
+    - 그 밖의 4xx 또는 max_attempts 초과: 스풀의 failed/ 로 옮겨 보관 (자동으로 다시 보내지 않음)
+    시작할 때 스풀에 남아 있는 클립을 다시 큐에 넣는다
+    """
+
+    def __init__(
+        self,
+        url,
+        spool_dir=UPLOAD_SPOOL_DIR,
+        concurrency=UPLOAD_CONCURRENCY,
+        max_attempts=UPLOAD_MAX_ATTEMPTS,
+        max_spool_bytes=UPLOAD_SPOOL_MAX_BYTES,
+        base_delay=1.0,
+        max_delay=300.0,
+        directory="smile_videos",
+    ):
+        self.url = url
+        self.spool_dir = spool_dir
+        self.failed_dir = os.path.join(spool_dir, "failed")
+        self.concurrency = max(1, concurrency)
+        self.max_attempts = max_attempts
+        self.max_spool_bytes = max_spool_bytes
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.directory = directory
+
+        self.queue = asyncio.Queue()  # 접수 (녹화가 끝난 클립 경로)
+        self._work = asyncio.Queue()  # 스풀에 들어간 업로드 대기 클립
+        self.client = None
+        self._attempts = {}  # 스풀 경로 -> 실패 횟수
+        self._uploading = set()  # 지금 보내는 중인 스풀 경로 (용량 정리에서 지우지 않음)
+        self._tasks = []
+        self._retry_tasks = set()
+        self.in_flight = 0
+
+    @property
+    def pending(self):
+        """대기 + 업로드 중 + 재시도 대기 클립 수"""
+        return (
+            self.queue.qsize() + self._work.qsize() + self.in_flight + len(self._retry_tasks)
+        )
+
+    async def start(self):
+        os.makedirs(self.failed_dir, exist_ok=True)
+        self.client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=self.concurrency,
+                max_keepalive_connections=self.concurrency,
+            ),
+            timeout=httpx.Timeout(60.0, connect=10.0),
+        )
+
+        recovered = sorted(
+            os.path.join(self.spool_dir, name)
+            for name in os.listdir(self.spool_dir)
+            if name.endswith(".mp4")
+        )
+        for path in recovered:
+            self._work.put_nowait(path)
+        if recovered:
+            print(f"[Upload] 스풀에 남은 클립 {len(recovered)}개 재업로드 대기")
+
+        self._tasks = [asyncio.create_task(self._intake())] + [
+            asyncio.create_task(self._worker(i)) for i in range(self.concurrency)
+        ]
+        print(
+            f"✓ 업로더 시작 (동시 {self.concurrency}개, HTTP/2: {'on' if HTTP2_AVAILABLE else 'off'}, 스풀: {self.spool_dir})"
+        )
+
+    async def close(self):
+        for task in self._tasks + list(self._retry_tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._retry_tasks, return_exceptions=True)
+        self._tasks = []
+        self._retry_tasks.clear()
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def _spool(self, path):
+        """클립을 스풀로 옮긴다 (이미 스풀에 있으면 그대로)"""
+        if os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.spool_dir):
+            return path
+        target = os.path.join(self.spool_dir, os.path.basename(path))
+        shutil.move(path, target)
+        self._enforce_spool_limit(keep=target)
+        return target
+
+    def _enforce_spool_limit(self, keep):
+        # 백엔드가 오래 죽어 있어도 디스크를 다 채우지 않도록 오래된 클립부터 버린다
+        entries = []
+        for name in os.listdir(self.spool_dir):
+            path = os.path.join(self.spool_dir, name)
+            if name.endswith(".mp4") and os.path.isfile(path):
+                entries.append((os.path.getmtime(path), os.path.getsize(path), path))
+        total = sum(size for _, size, _ in entries)
+        uploading = set(self._uploading)  # 이 함수는 to_thread에서 돌므로 복사본으로 본다
+        for _, size, path in sorted(entries):
+            if total <= self.max_spool_bytes:
+                break
+            if path == keep or path in uploading:
+                continue
+            print(f"[Upload] ⚠️ 스풀 용량 초과, 오래된 클립 삭제: {path}")
+            self._remove(path)
+            total -= size
+
+    async def _intake(self):
+        # 업로드가 밀려 있어도 완성된 클립은 즉시 스풀로 옮겨 재시작에 대비
+        while True:
+            path = await self.queue.get()
+            try:
+                if not path or not os.path.exists(path):
+                    print(f"Upload Error: 파일 없음 {path}")
+                    continue
+                path = await asyncio.to_thread(self._spool, path)
+                await self._work.put(path)
+            except Exception as e:
+                print(f"❌ (Upload Exception) 스풀 이동 실패 {path} -> {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _worker(self, index):
+        while True:
+            path = await self._work.get()
+            self.in_flight += 1
+            try:
+                await self._handle(path)
+            except Exception as e:
+                print(f"❌ (Upload Exception) {path} -> {e}")
+            finally:
+                self.in_flight -= 1
+                self._work.task_done()
+
+    async def _handle(self, path):
+        if not os.path.exists(path):
+            # 스풀 용량 초과로 지워진 경우
+            return
+        if not self.url:
+            print(f"Upload Error: API_UPLOAD_URL이 설정되지 않아 스풀에 보관합니다: {path}")
+            return
+
+        print(f"파일 업로드 시도: {path}")
+        started = time.monotonic()
+        self._uploading.add(path)
+        try:
+            boundary = os.urandom(16).hex()
+            head, tail = self._multipart_parts(path, boundary)
+            size = len(head) + await asyncio.to_thread(os.path.getsize, path) + len(tail)
+            response = await self.client.post(
+                self.url,
+                content=self._multipart_body(path, head, tail),
+                params={"directory": self.directory},
+                headers={
+                    "Content-Type": f"multipart/form-data; boundary={boundary}",
+                    "Content-Length": str(size),
+                },
+            )
+            status = response.status_code
+            error = None if 200 <= status < 300 else f"{status} - {response.text[:200]}"
+            retryable = status in (408, 429) or status >= 500
+        except (httpx.HTTPError, OSError) as e:
+            # 파일 읽기 오류도 재시도 (스풀에 남겨 둔 채 버리지 않음)
+            error, retryable = str(e) or type(e).__name__, True
+        finally:
+            self._uploading.discard(path)
+
+        elapsed = time.monotonic() - started
+        if error is None:
+            UPLOAD_SECONDS.labels("ok").observe(elapsed)
+            UPLOADS.labels("ok").inc()
+            print(f"✓ (Upload Success) {path} ({elapsed:.1f}s)")
+            self._attempts.pop(path, None)
+            self._remove(path)
+            return
+
+        attempts = self._attempts.get(path, 0) + 1
+        self._attempts[path] = attempts
+        if retryable and attempts < self.max_attempts:
+            delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+            delay *= random.uniform(0.5, 1.0)
+            UPLOAD_SECONDS.labels("retry").observe(elapsed)
+            UPLOADS.labels("retry").inc()
+            print(
+                f"❌ (Upload Failed) {path} -> {error} "
+                f"({attempts}/{self.max_attempts}회, {delay:.1f}초 후 재시도)"
+            )
+            task = asyncio.create_task(self._retry_later(path, delay))
+            self._retry_tasks.add(task)
+            task.add_done_callback(self._retry_tasks.discard)
+            return
+
+        UPLOAD_SECONDS.labels("failed").observe(elapsed)
+        UPLOADS.labels("failed").inc()
+        self._attempts.pop(path, None)
+        target = os.path.join(self.failed_dir, os.path.basename(path))
+        try:
+            os.replace(path, target)
+        except OSError:
+            target = path
+        print(f"❌ (Upload Failed) {path} -> {error} (포기, 보관: {target})")
+
+    @staticmethod
+    def _multipart_parts(path, boundary):
+        # files={"file": (이름, f, "video/mp4")}와 같은 multipart 앞뒤 부분
+        name = os.path.basename(path).replace('"', "%22")
+        head = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{name}"\r\n'
+            "Content-Type: video/mp4\r\n\r\n"
+        ).encode("utf-8")
+        tail = f"\r\n--{boundary}--\r\n".encode("ascii")
+        return head, tail
+
+    @staticmethod
+    async def _multipart_body(path, head, tail):
+        """multipart 본문 async 스트림 - 파일 열기 / 읽기는 스레드에서 (이벤트 루프를 막지 않음)"""
+        f = await asyncio.to_thread(open, path, "rb")
+        try:
+            yield head
+            while True:
+                chunk = await asyncio.to_thread(f.read, UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                yield chunk
+            yield tail
+        finally:
+            await asyncio.to_thread(f.close)
+
+    async def _retry_later(self, path, delay):
+        await asyncio.sleep(delay)
+        await self._work.put(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,81 @@
+# detection_cadence.py
+# 스마일 감지용 FaceLandmarker 호출 주기 조절기
+# 감지 비용을 측정해 N프레임마다 한 번만 감지한다 (사이 프레임은 감지를 건너뛰고, 세션의 트리거 상태는 직전 감지 그대로 유지)
+# 얼굴이 스마일 임계값 근처에 있으면 매 프레임 감지로 되돌아간다
+import time
+
+
+class DetectionCadence:
+    """
+    감지 간격(초)을 스스로 조절하는 컨트롤러
+
+    - 기본 간격: base_stride 프레임마다 1회
+    - 감지 비용이 프레임 예산(target_load)을 넘으면 간격을 늘림
+    - 간격은 max_gap_seconds를 넘지 않음 (짧은 미소도 놓치지 않도록)
+    - 점수가 threshold * near_ratio 이상이면 hot_hold_seconds 동안 매 프레임 감지
+    """
+
+    def __init__(
+        self,
+        fps=30.0,
+        threshold=0.3,
+        base_stride=3,
+        max_gap_seconds=0.25,
+        near_ratio=0.7,
+        hot_hold_seconds=1.0,
+        target_load=0.5,
+        phase=0.0,
+    ):
+        self.frame_interval = 1.0 / fps
+        self.threshold = threshold
+        self.base_interval = self.frame_interval * max(1, base_stride)
+        self.max_gap = max(self.frame_interval, max_gap_seconds)
+        self.near_score = threshold * near_ratio
+        self.hot_hold_seconds = hot_hold_seconds
+        self.target_load = target_load
+
+        self.cost_ema = 0.0
+        self.hot_until = 0.0
+        # phase: 여러 스트림이 같은 프레임에 몰려 감지하지 않도록 첫 감지 시점을 분산
+        self.next_detect_time = time.monotonic() + phase * self.base_interval
+
+        self.detections = 0
+        self.skipped = 0
+
+    @property
+    def interval(self):
+        """현재 감지 간격 (초)"""
+        return self.interval_at(time.monotonic())
+
+    def interval_at(self, now):
+        """now 시각 기준 감지 간격 (초)"""
+        if now < self.hot_until:
+            return 0.0
+        budget_interval = self.cost_ema / self.target_load if self.target_load > 0 else 0.0
+        return min(self.max_gap, max(self.base_interval, budget_interval))
+
+    def should_detect(self, now=None):
+        now = time.monotonic() if now is None else now
+        # 프레임 도착 오차만큼 여유를 둬서 N프레임 주기가 N+1로 밀리지 않게 함
+        if now + self.frame_interval * 0.5 >= self.next_detect_time:
+            return True
+        self.skipped += 1
+        return False
+
+    def record_detection(self, cost_seconds, now=None):
+        """감지 1회 완료 - 비용을 EMA로 반영하고 다음 감지 시각을 정한다"""
+        now = time.monotonic() if now is None else now
+        if self.detections == 0:
+            self.cost_ema = cost_seconds
+        else:
+            self.cost_ema = 0.8 * self.cost_ema + 0.2 * cost_seconds
+        self.detections += 1
+        self.next_detect_time = now + self.interval_at(now)
+
+    def observe_score(self, score, now=None):
+        """스마일 점수(좌/우 중 낮은 값)를 보고 임계값 근처면 매 프레임 감지로 전환"""
+        now = time.monotonic() if now is None else now
+        if score >= self.near_score:
+            self.hot_until = now + self.hot_hold_seconds
+            self.next_detect_time = now
+
@@ -0,0 +1,130 @@
+# expression_scorer.py
+# FaceLandmarker 블렌드셰이프 → 표정 점수
+# 카테고리 이름은 시작할 때 한 번만 인덱스로 바꿔 두고, 프레임마다 필요한 점수만 인덱스로 읽어
+# 미리 할당한 배열에 채운다 (매 감지마다 52개 category_name 문자열을 비교하지 않음)
+# 어떤 표정으로 녹화할지는 EXPRESSION_TRIGGERS(JSON)로 설정한다
+#   [{"name": "smile", "blendshapes": ["mouthSmileLeft", "mouthSmileRight"], "combine": "min", "threshold": 0.3},
+#    {"name": "surprise", "blendshapes": ["jawOpen", "browInnerUp"], "combine": "min", "threshold": 0.5},
+#    {"name": "blink", "blendshapes": ["eyeBlinkLeft", "eyeBlinkRight"], "combine": "min", "threshold": 0.6}]
+import json
+from collections import namedtuple
+
+import numpy as np
+
+# face_landmarker.task 블렌드셰이프 출력 순서 (category.index와 같음)
+BLENDSHAPE_NAMES = (
+    "_neutral", "browDownLeft", "browDownRight", "browInnerUp", "browOuterUpLeft",
+    "browOuterUpRight", "cheekPuff", "cheekSquintLeft", "cheekSquintRight", "eyeBlinkLeft",
+    "eyeBlinkRight", "eyeLookDownLeft", "eyeLookDownRight", "eyeLookInLeft", "eyeLookInRight",
+    "eyeLookOutLeft", "eyeLookOutRight", "eyeLookUpLeft", "eyeLookUpRight", "eyeSquintLeft",
+    "eyeSquintRight", "eyeWideLeft", "eyeWideRight", "jawForward", "jawLeft",
+    "jawOpen", "jawRight", "mouthClose", "mouthDimpleLeft", "mouthDimpleRight",
+    "mouthFrownLeft", "mouthFrownRight", "mouthFunnel", "mouthLeft", "mouthLowerDownLeft",
+    "mouthLowerDownRight", "mouthPressLeft", "mouthPressRight", "mouthPucker", "mouthRight",
+    "mouthRollLower", "mouthRollUpper", "mouthShrugLower", "mouthShrugUpper", "mouthSmileLeft",
+    "mouthSmileRight", "mouthStretchLeft", "mouthStretchRight", "mouthUpperUpLeft", "mouthUpperUpRight",
+    "noseSneerLeft", "noseSneerRight",
+)
+
+# 여러 블렌드셰이프를 표정 점수 하나로 합치는 방법 (새 방식은 여기에 추가)
+COMBINERS = {
+    "min": np.min,  # 모두 일정 이상 (양쪽 입꼬리 등)
+    "max": np.max,  # 하나라도
+    "mean": np.mean,
+}
+
+DEFAULT_EXPRESSION_TRIGGERS = [
+    {
+        "name": "smile",
+        "blendshapes": ["mouthSmileLeft", "mouthSmileRight"],
+        "combine": "min",
+        "threshold": 0.3,
+    }
+]
+
+
+class ExpressionTrigger(namedtuple("ExpressionTrigger", "name blendshapes combine threshold")):
+    """표정 하나: blendshapes 점수를 combine으로 합쳐 threshold를 넘으면 트리거"""
+
+    @classmethod
+    def from_config(cls, config):
+        name = config.get("name")
+        blendshapes = tuple(config.get("blendshapes") or ())
+        combine = config.get("combine", "min")
+        if not name or not blendshapes:
+            raise ValueError(f"표정 트리거에 name / blendshapes가 필요합니다: {config}")
+        unknown = [b for b in blendshapes if b not in BLENDSHAPE_NAMES]
+        if unknown:
+            raise ValueError(f"알 수 없는 블렌드셰이프 ({name}): {unknown}")
+        if combine not in COMBINERS:
+            raise ValueError(f"알 수 없는 combine ({name}): {combine} (가능: {list(COMBINERS)})")
+        return cls(name, blendshapes, combine, float(config.get("threshold", 0.5)))
+
+
+def load_expression_triggers(config=None):
+    """JSON 문자열 / 리스트 → ExpressionTrigger 목록 (비어 있으면 기본 스마일 트리거)"""
+    if not config:
+        config = DEFAULT_EXPRESSION_TRIGGERS
+    elif isinstance(config, str):
+        config = json.loads(config)
+    return [ExpressionTrigger.from_config(c) for c in config]
+
+
+class ExpressionScorer:
+    """
+    score(face_result)는 표정별 점수 배열(self.scores, 트리거 순서)을 채워 돌려준다 (얼굴이 없으면 None)
+    - 필요한 블렌드셰이프만 인덱스로 읽어 self.values에 채움
+    - 첫 결과에서 인덱스 위치의 category_name이 맞는지 한 번 확인하고, 다르면 그때만 이름으로 다시 찾음
+    배열은 매번 덮어쓰므로 다음 score() 전까지만 유효하다
+    """
+
+    def __init__(self, triggers):
+        self.triggers = list(triggers)
+        self.names = [t.name for t in self.triggers]
+        used = sorted({b for t in self.triggers for b in t.blendshapes}, key=BLENDSHAPE_NAMES.index)
+        self.blendshapes = used
+        self.indices = [BLENDSHAPE_NAMES.index(b) for b in used]
+        self._positions = [
+            np.array([used.index(b) for b in t.blendshapes], dtype=np.intp) for t in self.triggers
+        ]
+        self._combiners = [COMBINERS[t.combine] for t in self.triggers]
+        self.thresholds = np.array([t.threshold for t in self.triggers], dtype=np.float32)
+
+        self.values = np.zeros(len(used), dtype=np.float32)
+        self.scores = np.zeros(len(self.triggers), dtype=np.float32)
+        self._verified = False
+
+    def _verify(self, categories):
+        # 모델이 다른 순서로 내보내는 경우에만 이름 검색 (통과한 뒤로는 다시 하지 않음)
+        if all(
+            idx < len(categories) and categories[idx].category_name == name
+            for idx, name in zip(self.indices, self.blendshapes)
+        ):
+            self._verified = True
+            return
+        by_name = {c.category_name: i for i, c in enumerate(categories)}
+        missing = [name for name in self.blendshapes if name not in by_name]
+        if missing:
+            raise ValueError(f"모델 출력에 없는 블렌드셰이프: {missing}")
+        self.indices = [by_name[name] for name in self.blendshapes]
+        self._verified = True
+        print(f"[Expression] ⚠️ 블렌드셰이프 순서가 달라 인덱스를 다시 매핑했습니다: {self.indices}")
+
+    def score(self, face_result):
+        if not face_result or not face_result.face_blendshapes:
+            return None
+        categories = face_result.face_blendshapes[0]
+        if not self._verified:
+            self._verify(categories)
+
+        values = self.values
+        for i, idx in enumerate(self.indices):
+            values[i] = categories[idx].score
+        for i, (positions, combine) in enumerate(zip(self._positions, self._combiners)):
+            self.scores[i] = combine(values[positions])
+        return self.scores
+
+    def closeness(self, scores):
+        """임계값 대비 가장 가까운 표정의 비율 (1.0 이상이면 트리거 수준) - 감지 주기 조절용"""
+        return float(np.max(scores / self.thresholds)) if len(scores) else 0.0
+
@@ -0,0 +1,150 @@
+# face_roi.py
+# 얼굴 관심 영역(ROI) 추적
+# 얼굴을 한 번 찾으면 다음 감지부터는 직전 랜드마크 주변을 넓힌 정사각형만 잘라 모델에 넘긴다
+# 결과 랜드마크는 InferenceView의 오프셋(x0, y0)으로 원본 프레임 좌표로 되돌리므로
+# 트래커 / 스마일 판정은 잘라낸 영역인지 신경 쓰지 않아도 된다
+import time
+
+import numpy as np
+
+from inference_frame import InferenceView, project_landmarks
+
+
+class FaceROI:
+    """
+    view(frame_rgb, resizer)로 이번 감지에 쓸 InferenceView를 만들고, 결과는 update(face_result, view)로 알려 준다
+    다음 경우에는 전체 프레임 감지로 돌아간다 (신뢰도 하락으로 본다)
+    - 얼굴을 놓침
+    - 얼굴 상자가 잘라낸 영역 가장자리에 걸림 (영역 밖으로 나가는 중)
+    - 얼굴이 영역에 비해 너무 작음 (엉뚱한 곳에 맞춘 결과)
+    - refresh_seconds 동안 계속 잘라낸 영역만 봄 (새로 들어온 얼굴 확인용)
+    """
+
+    def __init__(
+        self,
+        expand=2.0,
+        min_side_ratio=0.2,
+        edge_margin=0.05,
+        min_fill=0.15,
+        recenter_ratio=0.15,
+        refresh_seconds=2.0,
+        count=4,
+        enabled=True,
+    ):
+        self.expand = expand  # 얼굴 상자 대비 영역 한 변 배율
+        self.min_side_ratio = min_side_ratio  # 영역 한 변 최소값 (프레임 짧은 변 비율)
+        self.edge_margin = edge_margin
+        self.min_fill = min_fill
+        self.recenter_ratio = recenter_ratio  # 얼굴 중심이 이만큼(영역 한 변 비율) 움직여야 영역을 옮김
+        self.refresh_seconds = refresh_seconds
+        self.enabled = enabled
+
+        self.region = None  # (x0, y0, side) 원본 픽셀, None이면 전체 프레임
+        self._frame_size = None
+        self._full_since = time.monotonic()  # 마지막으로 전체 프레임을 감지한 시각
+        self.count = max(2, count)
+        self._shape = None
+        self._buffers = []
+        self._next = 0
+
+        self.crops = 0
+        self.full_frames = 0
+        self.fallbacks = 0
+
+    def reset(self):
+        self.region = None
+
+    def view(self, frame_rgb, resizer=None, now=None):
+        """
+        이번 감지 입력 - ROI가 있으면 잘라낸 영역, 없으면 전체 프레임 (resizer가 있으면 max_width로 축소)
+        now: refresh_seconds 판정 시각 (기본: 단조 시계, replay 최대 속도에서는 영상 시각)
+        """
+        height, width = frame_rgb.shape[:2]
+        if self._frame_size != (width, height):
+            self._frame_size = (width, height)
+            self.region = None
+
+        now = time.monotonic() if now is None else now
+        if self.region is not None and now - self._full_since >= self.refresh_seconds:
+            self.region = None
+
+        if self.region is None:
+            self._full_since = now
+            self.full_frames += 1
+            if resizer is not None:
+                return resizer.resize(frame_rgb)
+            return InferenceView.full(frame_rgb, width, height)
+
+        x0, y0, side = self.region
+        crop = self._crop(frame_rgb, x0, y0, side)
+        self.crops += 1
+        if resizer is not None:
+            image = resizer.resize(crop).image
+        else:
+            image = crop
+        return InferenceView(image, x0, y0, side, side, width, height)
+
+    def _crop(self, frame_rgb, x0, y0, side):
+        # mp.Image는 연속 배열이 필요하므로 돌려 쓰는 버퍼로 복사 (count - 1 프레임 뒤까지 유효)
+        shape = (side, side, 3)
+        if self._shape != shape:
+            self._shape = shape
+            self._buffers = [np.empty(shape, dtype=np.uint8) for _ in range(self.count)]
+            self._next = 0
+        dst = self._buffers[self._next]
+        self._next = (self._next + 1) % self.count
+        np.copyto(dst, frame_rgb[y0 : y0 + side, x0 : x0 + side])
+        return dst
+
+    def update(self, face_result, view):
+        """감지 결과로 다음 영역을 정한다 (view: 이 결과를 만든 입력)"""
+        if not self.enabled:
+            return
+        cropped = not view.is_full
+        if not face_result or not face_result.face_landmarks:
+            self._fall_back(cropped)
+            return
+
+        points = project_landmarks(face_result.face_landmarks[0], view, pixels=True)
+        if len(points) == 0:
+            self._fall_back(cropped)
+            return
+        left, top = points[:, 0].min(), points[:, 1].min()
+        right, bottom = points[:, 0].max(), points[:, 1].max()
+        face_side = max(right - left, bottom - top)
+
+        if cropped:
+            margin = self.edge_margin * view.width
+            touches_edge = (
+                (left - view.x0 < margin and view.x0 > 0)
+                or (top - view.y0 < margin and view.y0 > 0)
+                or (view.x0 + view.width - right < margin and view.x0 + view.width < view.full_width)
+                or (view.y0 + view.height - bottom < margin and view.y0 + view.height < view.full_height)
+            )
+            if touches_edge or face_side < self.min_fill * view.width:
+                self._fall_back(cropped)
+                return
+
+        full_width, full_height = view.full_width, view.full_height
+        side = int(max(face_side * self.expand, self.min_side_ratio * min(full_width, full_height)))
+        if side >= min(full_width, full_height):
+            # 얼굴이 화면을 거의 채우면 잘라도 이득이 없다
+            self.region = None
+            return
+
+        center_x, center_y = (left + right) / 2, (top + bottom) / 2
+        if self.region is not None:
+            x0, y0, current = self.region
+            # 얼굴이 조금 움직인 정도면 영역을 그대로 둬서 VIDEO 모드 추적과 버퍼 재할당을 안정시킨다
+            moved = max(abs(center_x - (x0 + current / 2)), abs(center_y - (y0 + current / 2)))
+            if moved < self.recenter_ratio * current and abs(side - current) < self.recenter_ratio * current:
+                return
+
+        x0 = int(min(max(center_x - side / 2, 0), full_width - side))
+        y0 = int(min(max(center_y - side / 2, 0), full_height - side))
+        self.region = (x0, y0, side)
+
+    def _fall_back(self, cropped):
+        if cropped:
+            self.fallbacks += 1
+        self.region = None
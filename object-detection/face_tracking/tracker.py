@@ -1,60 +1,207 @@
 # tracker.py
 # 미디어파이프에 감지된 사람 얼굴 좌표 변환
+# 코 끝 좌표를 등속 칼만 필터로 다듬고, 의미 있게 움직였을 때나 keepalive 주기에만 MQTT로 보낸다
+# 예측 속도(vx, vy)를 함께 보내 로봇 쪽에서 지연만큼 앞서 겨냥(lead compensation)할 수 있게 한다
+# 메시지 형식(JSON / 16바이트 binary)은 tracking_wire.py의 encoder가 정한다
 import time
-import json
+
+from tracking_wire import JsonTrackingEncoder
+
+
+class _AxisKalman:
+    """
+    한 축(x 또는 y)의 등속 칼만 필터 - 상태 [위치, 속도], 관측은 위치
+    process_noise: 가속도 분산 (클수록 빠른 움직임을 빨리 따라감), measurement_noise: 랜드마크 떨림 분산
+    """
+
+    def __init__(self, process_noise, measurement_noise):
+        self.q = process_noise
+        self.r = measurement_noise
+        self.pos = None
+        self.vel = 0.0
+        # 공분산 [[p00, p01], [p01, p11]]
+        self.p00 = self.p01 = self.p11 = 0.0
+
+    def reset(self):
+        self.pos = None
+        self.vel = 0.0
+
+    def predict(self, dt):
+        if self.pos is None or dt <= 0:
+            return
+        self.pos += self.vel * dt
+        q = self.q
+        dt2 = dt * dt
+        p00 = self.p00 + dt * (2 * self.p01 + dt * self.p11) + q * dt2 * dt2 / 4
+        p01 = self.p01 + dt * self.p11 + q * dt2 * dt / 2
+        p11 = self.p11 + q * dt2
+        self.p00, self.p01, self.p11 = p00, p01, p11
+
+    def update(self, measured):
+        if self.pos is None:
+            # 첫 관측: 위치는 그대로, 속도는 모름 (큰 분산)
+            self.pos = measured
+            self.vel = 0.0
+            self.p00, self.p01, self.p11 = self.r, 0.0, 1.0
+            return
+        s = self.p00 + self.r
+        k0 = self.p00 / s
+        k1 = self.p01 / s
+        residual = measured - self.pos
+        self.pos += k0 * residual
+        self.vel += k1 * residual
+        p00, p01, p11 = self.p00, self.p01, self.p11
+        self.p00 = (1 - k0) * p00
+        self.p01 = (1 - k0) * p01
+        self.p11 = p11 - k1 * p01
+
 
 class FaceTracker:
-    def __init__(self):
+    """
+    get_tracking_payload(face_result, view)는 보낼 메시지가 있을 때만 반환, 아니면 None
+    (encoder에 따라 JSON 문자열 또는 bytes - 보낼 토픽 접미사는 encoder.topic_suffix)
+    - track_face: 필터한 위치가 position_threshold 넘게 바뀌었거나, 속도가 velocity_threshold 넘게 바뀌었거나,
+      keepalive_interval이 지났을 때 (단, min_interval보다 자주 보내지 않음 - 기본 0.15초는 예전 고정 전송 간격과 같은 상한)
+    - track_lost: 얼굴이 lost_timeout 동안 안 보이면 한 번, 그 뒤로는 lost_repeat_interval마다 한 번만
+    """
+
+    def __init__(
+        self,
+        min_interval=0.15,
+        keepalive_interval=1.0,
+        position_threshold=0.02,
+        velocity_threshold=0.15,
+        lost_timeout=0.3,
+        lost_repeat_interval=3.0,
+        process_noise=1.0,
+        measurement_noise=1e-5,
+        encoder=None,
+    ):
+        self.min_interval = min_interval
+        self.keepalive_interval = keepalive_interval
+        self.position_threshold = position_threshold
+        self.velocity_threshold = velocity_threshold
+        self.lost_timeout = lost_timeout
+        self.lost_repeat_interval = lost_repeat_interval
+        self.encoder = encoder or JsonTrackingEncoder()
+
+        self.kx = _AxisKalman(process_noise, measurement_noise)
+        self.ky = _AxisKalman(process_noise, measurement_noise)
+        self.last_update_time = None  # 마지막 관측 시각
+        self.last_seen_time = None  # 마지막으로 얼굴을 본 시각
         self.last_sent_time = 0
-        self.send_interval = 0.15  # 0.15초마다 전송 (너무 자주 보내면 렉 걸림)
+        self.last_sent = None  # (x, y, vx, vy)
+        self.lost_sent_time = None  # 마지막 track_lost 전송 시각 (None이면 추적 중)
+
+        self.sent = 0
+        self.suppressed = 0
+
+    def state(self):
+        """필터 상태 (x, y, vx, vy) - 아직 관측이 없으면 None"""
+        if self.kx.pos is None:
+            return None
+        return self.kx.pos, self.ky.pos, self.kx.vel, self.ky.vel
+
+    def _reset(self):
+        self.kx.reset()
+        self.ky.reset()
+        self.last_update_time = None
+        self.last_sent = None
 
-    def get_tracking_payload(self, face_result):
+    def _nose_tip(self, face_result, view, landmarks=None):
+        if landmarks is not None:
+            # project_landmarks로 이미 원본 프레임 정규화 좌표로 되돌린 (N, 3) 배열
+            return float(landmarks[1][0]), float(landmarks[1][1])
+        # 첫 번째 얼굴의 1번 랜드마크 = 코 끝
+        # (MediaPipe 버전에 따라 접근 방식이 다를 수 있어 안전하게 처리)
+        if hasattr(face_result.face_landmarks[0], 'landmark'):
+            nose_tip = face_result.face_landmarks[0].landmark[6] # 최신 Task API 객체 방식
+        else:
+            nose_tip = face_result.face_landmarks[0][1] # 리스트/딕셔너리 방식
+        x, y = nose_tip.x, nose_tip.y
+        if view is not None:
+            x, y = view.to_full_normalized(x, y)
+        return x, y
+
+    def get_tracking_payload(self, face_result, view=None, now=None, landmarks=None):
         """
-        MediaPipe 결과를 받아 MQTT로 보낼 JSON 문자열을 반환
-        보낼 필요가 없거나(시간 안 됨), 얼굴이 없으면 None을 반환
+        MediaPipe 결과를 받아 MQTT로 보낼 메시지를 반환
+        보낼 필요가 없으면(변화 없음 / 너무 잦음) None을 반환
+        view: 감지에 쓴 InferenceView (얼굴 ROI로 잘라낸 경우 원본 프레임 기준 정규화 좌표로 되돌림)
+        now: 관측 시각(초) - 영상 PTS를 넘기면 프레임 간격이 정확해진다 (기본: 단조 시계)
+        landmarks: 첫 번째 얼굴의 원본 프레임 기준 랜드마크 (project_landmarks 결과) - 주면 view 대신 사용
         """
-        now = time.time()
-        
-        # 전송 주기 체크 (너무 빠르면 스킵)
-        if now - self.last_sent_time < self.send_interval:
-            return None
+        now = time.monotonic() if now is None else now
+        if self.last_sent_time > now:
+            # 재연결 등으로 영상 PTS가 되돌아감 - 이전 시각 기준 억제 / 필터 상태를 버린다
+            self._reset()
+            self.last_sent_time = 0
+            self.last_seen_time = None
+            if self.lost_sent_time is not None:
+                self.lost_sent_time = now
 
         # 얼굴 감지 여부 확인
         if not face_result or not face_result.face_landmarks:
-            # 얼굴을 놓쳤을 때 'track_lost' 명령 전송
-            # print("[Tracker] ❌ 놓침 (Face Lost) -> 'track_lost' 전송")
-            
-            self.last_sent_time = now 
-            return json.dumps({
-                "type": "command",
-                "command": "track_lost"
-            })
-
-        # 좌표 추출 (첫 번째 얼굴의 1번 랜드마크 = 코 끝)
+            return self._lost_payload(now)
+
         try:
-            # 첫 번째 얼굴의 1번 랜드마크 = 코 끝
-            # (MediaPipe 버전에 따라 접근 방식이 다를 수 있어 안전하게 처리)
-            if hasattr(face_result.face_landmarks[0], 'landmark'):
-                nose_tip = face_result.face_landmarks[0].landmark[6] # 최신 Task API 객체 방식
-            else:
-                nose_tip = face_result.face_landmarks[0][1] # 리스트/딕셔너리 방식
-
-            x = nose_tip.x
-            y = nose_tip.y
-            
-            # 로그: 얼굴 감지됨 (좌표 출력)
-            print(f"[Tracker] 🎯 감지됨 (Tracking) - X: {x:.3f}, Y: {y:.3f}")
-
-            self.last_sent_time = now
-
-            # JSON 생성
-            return json.dumps({
-                "type": "command",
-                "command": "track_face",
-                "x": round(x, 3),
-                "y": round(y, 3)
-            })
-            
+            x, y = self._nose_tip(face_result, view, landmarks)
         except Exception as e:
             print(f"[Tracker] ⚠️ 좌표 계산 중 에러 발생: {e}")
             return None
+
+        if self.last_update_time is not None and now - self.last_update_time > self.lost_timeout:
+            # 오래 끊겼다 다시 찾으면 이전 속도를 믿지 않는다
+            self._reset()
+        dt = 0.0 if self.last_update_time is None else now - self.last_update_time
+        self.kx.predict(dt)
+        self.ky.predict(dt)
+        self.kx.update(x)
+        self.ky.update(y)
+        self.last_update_time = now
+        self.last_seen_time = now
+
+        fx, fy, vx, vy = self.state()
+        reacquired = self.lost_sent_time is not None
+        if not reacquired and not self._should_send(fx, fy, vx, vy, now):
+            self.suppressed += 1
+            return None
+
+        if reacquired:
+            print(f"[Tracker] 🎯 감지됨 (Tracking) - X: {fx:.3f}, Y: {fy:.3f}")
+        self.lost_sent_time = None
+        self.last_sent_time = now
+        self.last_sent = (fx, fy, vx, vy)
+        self.sent += 1
+
+        return self.encoder.face(fx, fy, vx, vy)
+
+    def _should_send(self, x, y, vx, vy, now):
+        elapsed = now - self.last_sent_time
+        if elapsed < self.min_interval:
+            return False
+        if self.last_sent is None or elapsed >= self.keepalive_interval:
+            return True
+        sx, sy, svx, svy = self.last_sent
+        return (
+            abs(x - sx) > self.position_threshold
+            or abs(y - sy) > self.position_threshold
+            or abs(vx - svx) > self.velocity_threshold
+            or abs(vy - svy) > self.velocity_threshold
+        )
+
+    def _lost_payload(self, now):
+        # 잠깐 놓친 건 무시하고 (lost_timeout), 그 뒤로는 track_lost를 드물게만 보낸다
+        if self.last_seen_time is not None and now - self.last_seen_time < self.lost_timeout:
+            return None
+        if self.lost_sent_time is not None and now - self.lost_sent_time < self.lost_repeat_interval:
+            self.suppressed += 1
+            return None
+
+        if self.lost_sent_time is None:
+            print("[Tracker] ❌ 놓침 (Face Lost) -> 'track_lost' 전송")
+        self._reset()
+        self.lost_sent_time = now
+        self.last_sent_time = now
+        self.sent += 1
+        return self.encoder.lost()
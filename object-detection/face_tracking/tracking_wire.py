@@ -0,0 +1,108 @@
+# tracking_wire.py
+# 얼굴 추적 메시지(track_face / track_lost) 전송 형식
+# json: 기존 {"type": "command", "command": "track_face", ...} 문자열 (MQTT_BACKBONE_TOPIC)
+# binary: 16바이트 고정 struct (MQTT_BACKBONE_TOPIC + "/bin") - 로봇은 토픽 접미사로 형식을 구분해 JSON 파싱 없이 읽는다
+#
+# binary 레이아웃 (little-endian, embedded/BackboneControl/mqtt_helpers.h와 같아야 함)
+#   0  uint8   version (1)
+#   1  uint8   kind (1 = track_face, 2 = track_lost)
+#   2  uint16  seq (실제 발행할 때마다 +1, 65535 다음 0) - 로봇에서 유실 수 계산
+#              coalescing으로 버려진 메시지가 유실로 잡히지 않도록 인코딩이 아니라 stamp()에서 매긴다
+#   4  uint32  timestamp_ms (워커 유닉스 시각 ms의 하위 32비트) - NTP 동기화된 로봇에서 종단 지연 계산
+#   8  uint16  x  (0 ~ 65535 = 0.0 ~ 1.0)
+#  10  uint16  y
+#  12  int16   vx (1/1000 화면 비율 / 초)
+#  14  int16   vy
+import json
+import os
+import struct
+import time
+
+TRACKING_WIRE_FORMAT = os.getenv("TRACKING_WIRE_FORMAT", "json").lower()
+BINARY_TOPIC_SUFFIX = "/bin"
+
+WIRE_VERSION = 1
+KIND_TRACK_FACE = 1
+KIND_TRACK_LOST = 2
+TRACK_STRUCT = struct.Struct("<BBHIHHhh")
+SEQ_STRUCT = struct.Struct("<H")
+SEQ_OFFSET = 2
+
+
+def _clamp(value, low, high):
+    return low if value < low else high if value > high else value
+
+
+class JsonTrackingEncoder:
+    topic_suffix = ""
+
+    def stamp(self, topic, payload):
+        return payload
+
+    def face(self, x, y, vx, vy):
+        return json.dumps({
+            "type": "command",
+            "command": "track_face",
+            "x": round(_clamp(x, 0.0, 1.0), 3),
+            "y": round(_clamp(y, 0.0, 1.0), 3),
+            "vx": round(vx, 3),
+            "vy": round(vy, 3),
+        })
+
+    def lost(self):
+        return json.dumps({
+            "type": "command",
+            "command": "track_lost"
+        })
+
+
+class BinaryTrackingEncoder:
+    topic_suffix = BINARY_TOPIC_SUFFIX
+
+    def __init__(self):
+        self.seq = 0
+
+    def stamp(self, topic, payload):
+        """발행 직전에 호출 (CoalescingPublisher의 prepare) - 실제로 나가는 메시지에만 seq를 매긴다"""
+        self.seq = (self.seq + 1) & 0xFFFF
+        data = bytearray(payload)
+        SEQ_STRUCT.pack_into(data, SEQ_OFFSET, self.seq)
+        return bytes(data)
+
+    def _pack(self, kind, x=0.0, y=0.0, vx=0.0, vy=0.0):
+        # seq는 stamp()에서 채운다
+        return TRACK_STRUCT.pack(
+            WIRE_VERSION,
+            kind,
+            0,
+            int(time.time() * 1000) & 0xFFFFFFFF,
+            int(round(_clamp(x, 0.0, 1.0) * 65535)),
+            int(round(_clamp(y, 0.0, 1.0) * 65535)),
+            int(round(_clamp(vx * 1000, -32768, 32767))),
+            int(round(_clamp(vy * 1000, -32768, 32767))),
+        )
+
+    def face(self, x, y, vx, vy):
+        return self._pack(KIND_TRACK_FACE, x, y, vx, vy)
+
+    def lost(self):
+        return self._pack(KIND_TRACK_LOST)
+
+
+def create_tracking_encoder(wire_format=TRACKING_WIRE_FORMAT):
+    if wire_format == "binary":
+        return BinaryTrackingEncoder()
+    if wire_format != "json":
+        print(f"[Tracker] ⚠️ 알 수 없는 TRACKING_WIRE_FORMAT '{wire_format}', json으로 전송합니다.")
+    return JsonTrackingEncoder()
+
+
+def decode_binary(data):
+    """binary 메시지 → dict (디버깅 / 수신 측 확인용)"""
+    version, kind, seq, timestamp_ms, x, y, vx, vy = TRACK_STRUCT.unpack(data)
+    if version != WIRE_VERSION:
+        raise ValueError(f"지원하지 않는 추적 메시지 버전: {version}")
+    message = {"command": "track_face" if kind == KIND_TRACK_FACE else "track_lost", "seq": seq, "timestamp_ms": timestamp_ms}
+    if kind == KIND_TRACK_FACE:
+        message.update(x=x / 65535, y=y / 65535, vx=vx / 1000, vy=vy / 1000)
+    return message
@@ -1,6 +1,7 @@
 import asyncio
 import base64
 import signal
+import sys
 import cv2
 import numpy as np
 import os
@@ -38,6 +39,16 @@ import aiomqtt as mqtt
 import dotenv
 
 from tracker import FaceTracker
+from tracking_wire import TRACKING_WIRE_FORMAT, create_tracking_encoder
+
+# 얼굴 ROI / 좌표 변환은 상위 object-detection 모듈을 같이 쓴다
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from clip_encoder import open_clip_writer
+from expression_scorer import ExpressionScorer, load_expression_triggers
+from face_roi import FaceROI
+from inference_frame import InferenceResizer, project_landmarks
+from mqtt_publisher import CoalescingPublisher
+from trigger_engine import TriggerEngine
 
 warnings.filterwarnings("ignore", message="Unverified HTTPS request")
 dotenv.load_dotenv()
@@ -58,11 +69,12 @@ MQTT_REQUEST_TOPIC = os.getenv("MQTT_REQUEST_TOPIC")
 MQTT_RESPONSE_TOPIC = os.getenv("MQTT_RESPONSE_TOPIC")
 MQTT_BACKBONE_TOPIC = os.getenv("MQTT_BACKBONE_TOPIC", "buriburi/robot/robot_backbone/command") 
 
-SMILE_THRESHOLD = 0.3
 COOLDOWN_SECONDS = 3.0
 SAVING_PRE_POST_SECONDS = 5.0
 FPS = 30.0
 VIDEO_DIR = "smile_videos"
+# 얼굴 / 포즈 모델 입력 최대 너비 (0이면 원본 그대로) - 녹화는 항상 원본 해상도
+INFERENCE_MAX_WIDTH = int(os.getenv("INFERENCE_MAX_WIDTH", "640"))
 
 pre_buffer = deque(maxlen=int(FPS * SAVING_PRE_POST_SECONDS))
 is_saving = False
@@ -74,10 +86,19 @@ face_landmarker = None
 pose_detector = None
 rsp_detector = None
 last_frame_for_rsp = None
+last_inference_view = None  # 이번 프레임을 축소한 전체 프레임 InferenceView (감지한 프레임만, RSP 포즈가 재사용)
 
 mp_pose = mp.solutions.pose
 
-tracker = FaceTracker()
+# TRACKING_WIRE_FORMAT=binary면 16바이트 struct를 MQTT_BACKBONE_TOPIC + "/bin"으로 보낸다 (로봇은 두 토픽 모두 구독)
+tracker = FaceTracker(encoder=create_tracking_encoder(TRACKING_WIRE_FORMAT))
+TRACKING_TOPIC = MQTT_BACKBONE_TOPIC + tracker.encoder.topic_suffix
+# 한 번 줄인 프레임을 얼굴 / 포즈가 같이 쓰고, 랜드마크는 원본 프레임 좌표로 되돌려 쓴다
+inference_resizer = InferenceResizer(INFERENCE_MAX_WIDTH)
+face_roi = FaceROI()
+# 블렌드셰이프 인덱스는 여기서 한 번만 해석 (EXPRESSION_TRIGGERS로 표정 추가 가능)
+expression_scorer = ExpressionScorer(load_expression_triggers(os.getenv("EXPRESSION_TRIGGERS")))
+trigger_engine = TriggerEngine(expression_scorer.names, expression_scorer.thresholds)
 
 
 class RSPDetector:
@@ -237,15 +258,12 @@ def start_video_writer(first_frame, fps, idx):
     if not os.path.exists(VIDEO_DIR):
         os.makedirs(VIDEO_DIR)
     h, w = first_frame.shape[:2]
-    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     path = f"{VIDEO_DIR}/smile_{timestamp}_{idx}.mp4"
     current_video_path = path
-    writer = cv2.VideoWriter(path, fourcc, fps, (w, h))
-    if not writer.isOpened():
-        print(
-            f"❌ ERROR: VideoWriter initialization failed for FourCC='avc1'. Check FFmpeg installation."
-        )
+    # CLIP_CODEC 설정에 따라 libx264 faststart MP4 (기본) 또는 mp4v
+    writer = open_clip_writer(path, fps, (w, h))
+    if writer is None:
         current_video_path = None
         return None, None
 
@@ -290,14 +308,17 @@ async def upload_video_file(file_path):
 
 
 def execute_rsp_detection():
-    global last_frame_for_rsp, pose_detector, rsp_detector
+    global last_frame_for_rsp, last_inference_view, pose_detector, rsp_detector
 
     if last_frame_for_rsp is None:
         return "NoFrame"
 
     try:
-        image_for_pose = cv2.cvtColor(last_frame_for_rsp, cv2.COLOR_BGR2RGB)
-        pose_results = pose_detector.process(image_for_pose)
+        # 얼굴 감지에서 이미 줄인 프레임이 있으면 재사용, 없으면 새 배열로 축소 (전체 프레임이라 정규화 좌표 그대로)
+        view = last_inference_view
+        if view is None:
+            view = inference_resizer.resize_copy(cv2.cvtColor(last_frame_for_rsp, cv2.COLOR_BGR2RGB))
+        pose_results = pose_detector.process(view.image)
         rsp_status = "Unknown"
         if pose_results.pose_landmarks:
             rsp_status = rsp_detector.classify_pose(pose_results.pose_landmarks)
@@ -350,51 +371,56 @@ def process_frame_and_manage_buffer(
     frame: VideoFrame, 
     upload_queue: asyncio.Queue, 
     main_loop: asyncio.AbstractEventLoop, 
-    mqtt_client: mqtt.Client
+    tracking_publisher: CoalescingPublisher
 ):
-    global last_smile_trigger_time, is_saving, post_frames_remaining, video_writer, current_video_path, last_frame_for_rsp
+    global last_smile_trigger_time, is_saving, post_frames_remaining, video_writer, current_video_path, last_frame_for_rsp, last_inference_view
 
     try:
         frame_bgr = frame.to_ndarray(format="bgr24")
         pre_buffer.append(frame_bgr)
+        last_inference_view = None
         last_frame_for_rsp = frame_bgr 
         smile_triggered = False
 
         if not is_saving:
             frame_rgb = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
-            mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=frame_rgb)
+            # 직전 얼굴 주변만 잘라 감지 (놓치면 INFERENCE_MAX_WIDTH로 줄인 전체 프레임)
+            view = face_roi.view(frame_rgb, inference_resizer)
+            if view.is_full:
+                last_inference_view = view
+            mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=view.image)
             face_result = face_landmarker.detect(mp_image)
+            face_roi.update(face_result, view)
+            # 축소 / 잘라낸 입력 기준 랜드마크 → 원본 프레임 정규화 좌표
+            face_points = (
+                project_landmarks(face_result.face_landmarks[0], view)
+                if face_result and face_result.face_landmarks
+                else None
+            )
+            # 필터 / 트리거 시간은 영상 시각 기준
+            frame_time = frame.time if frame.time is not None else time.monotonic()
 
             # ==== 얼굴 좌표 트래킹 ====
             try:
-                face_coordinate_payload = tracker.get_tracking_payload(face_result)
+                # 칼만 필터로 다듬은 좌표 + 속도, 변화가 있거나 keepalive일 때만 발행
+                face_coordinate_payload = tracker.get_tracking_payload(
+                    face_result, now=frame_time, landmarks=face_points
+                )
 
-                if face_coordinate_payload: # 메인 루프를 통해 비동기로 MQTT 발행
-                    asyncio.run_coroutine_threadsafe(
-                        mqtt_client.publish(MQTT_BACKBONE_TOPIC, face_coordinate_payload),
-                        main_loop
-                    )
+                if face_coordinate_payload: # 토픽별 최신 값만 남겨 메인 루프에서 발행 (브로커가 밀려도 쌓이지 않음)
+                    tracking_publisher.offer(TRACKING_TOPIC, face_coordinate_payload)
             except Exception as track_e:
                 print(f"Tracking Error: {track_e}")
 
             # ========================     
-            if face_result and face_result.face_blendshapes:
-                smile_l_score = 0.0
-                smile_r_score = 0.0
-                for category in face_result.face_blendshapes[0]:
-                    if category.category_name == "mouthSmileLeft":
-                        smile_l_score = category.score
-                    elif category.category_name == "mouthSmileRight":
-                        smile_r_score = category.score
-
-                now = time.time()
-                if (
-                    smile_l_score > SMILE_THRESHOLD
-                    and smile_r_score > SMILE_THRESHOLD
-                    and (now - last_smile_trigger_time > COOLDOWN_SECONDS)
-                ):
-                    smile_triggered = True
-                    last_smile_trigger_time = now
+            expression_scores = expression_scorer.score(face_result)
+            # 한 프레임만 튀는 점수로는 녹화하지 않도록 평활 + 유지 시간 판정
+            expression = trigger_engine.update(expression_scores, frame_time)
+            now = time.time()
+            if expression is not None and (now - last_smile_trigger_time > COOLDOWN_SECONDS):
+                print(f"😀 표정 트리거: {expression}")
+                smile_triggered = True
+                last_smile_trigger_time = now
 
         if smile_triggered and not is_saving:
             if len(pre_buffer) > 0:
@@ -457,6 +483,7 @@ async def run_worker():
     pc = None
     mqtt_task = None
     upload_task = None
+    tracking_publisher = None
     try:
         mqtt_ssl_context = ssl.create_default_context()
         mqtt_ssl_context.check_hostname = False
@@ -473,6 +500,11 @@ async def run_worker():
             print("✓ MQTT Connected successfully.")
             
             mqtt_task = asyncio.create_task(mqtt_listener_worker(mqtt_client))
+            # binary 형식의 seq는 실제로 발행되는 메시지에만 매긴다 (덮어쓴 메시지를 로봇이 유실로 세지 않도록)
+            tracking_publisher = CoalescingPublisher(
+                mqtt_client, asyncio.get_running_loop(), prepare=tracker.encoder.stamp
+            )
+            tracking_publisher.start()
             
             ws_token_url = create_worker_token()
 
@@ -626,7 +658,7 @@ async def run_worker():
                                 frame,
                                 upload_queue,
                                 main_loop,
-                                mqtt_client
+                                tracking_publisher
                             )
                         except Exception as e:
                             print(f"!!! EXCEPTION in on_track: {e}")
@@ -725,7 +757,7 @@ async def run_worker():
                                 await pc.addIceCandidate(candidate)
                                 print(
                                     f"[REMOTE ICE] Added candidate: {params['candidate']}"
-[O                                )
+                                )
                             except Exception as e:
                                 print(f"[REMOTE ICE] Failed to add remote candidate: {e}")
                 
@@ -749,6 +781,8 @@ async def run_worker():
             face_landmarker.close()
         if "pose_detector" in globals() and pose_detector:
             pose_detector.close()
+        if tracking_publisher:
+            await tracking_publisher.close()
         if mqtt_task and not mqtt_task.done():
             mqtt_task.cancel()
         if upload_task and not upload_task.done():
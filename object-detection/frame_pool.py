@@ -0,0 +1,70 @@
+# frame_pool.py
+# aiortc VideoFrame(yuv420p)을 미리 할당해 둔 RGB 배열로 바로 디코딩하는 프레임 버퍼 풀
+# 예전 경로: to_ndarray("bgr24") → cvtColor(BGR2RGB) → (RSP) cvtColor(BGR2RGB) 로 프레임마다 전체 크기 배열을 여러 번 새로 만들었다
+# 지금 경로: YUV 평면을 재사용 버퍼에 모은 뒤 cvtColor(dst=...)로 재사용 RGB 버퍼에 한 번 변환한다
+import cv2
+import numpy as np
+
+
+class FrameBufferPool:
+    """
+    해상도별로 RGB 버퍼 count개를 돌려 쓰는 풀
+    반환된 배열은 count - 1 프레임 뒤까지 유효하다 (RSP 요청처럼 다른 스레드가 잠깐 읽는 용도로 충분)
+    BGR이 필요한 곳(녹화)은 bgr_view()로 복사 없이 채널 순서만 뒤집은 뷰를 쓴다
+    """
+
+    def __init__(self, count=4):
+        self.count = max(2, count)
+        self._shape = None
+        self._rgb = []
+        self._yuv = None
+        self._next = 0
+        self.reallocations = 0
+
+    def decode_rgb(self, frame):
+        width, height = frame.width, frame.height
+        if frame.format.name != "yuv420p" or width % 2 or height % 2:
+            # 드문 포맷은 PyAV 변환으로 대체
+            return frame.to_ndarray(format="rgb24")
+
+        self._ensure(height, width)
+        yuv = self._yuv
+        flat = yuv.reshape(-1)
+        y_size = width * height
+        c_w, c_h = width // 2, height // 2
+        c_size = c_w * c_h
+
+        self._copy_plane(frame.planes[0], yuv[:height], width, height)
+        self._copy_plane(
+            frame.planes[1], flat[y_size : y_size + c_size].reshape(c_h, c_w), c_w, c_h
+        )
+        self._copy_plane(
+            frame.planes[2],
+            flat[y_size + c_size : y_size + 2 * c_size].reshape(c_h, c_w),
+            c_w,
+            c_h,
+        )
+
+        rgb = self._rgb[self._next]
+        self._next = (self._next + 1) % self.count
+        cv2.cvtColor(yuv, cv2.COLOR_YUV2RGB_I420, dst=rgb)
+        return rgb
+
+    @staticmethod
+    def bgr_view(frame_rgb):
+        return frame_rgb[:, :, ::-1]
+
+    def _ensure(self, height, width):
+        if self._shape == (height, width):
+            return
+        self._shape = (height, width)
+        self._rgb = [np.empty((height, width, 3), dtype=np.uint8) for _ in range(self.count)]
+        self._yuv = np.empty((height * 3 // 2, width), dtype=np.uint8)
+        self._next = 0
+        self.reallocations += 1
+
+    @staticmethod
+    def _copy_plane(plane, dst, width, height):
+        # 평면 행 끝의 패딩(line_size > width)을 건너뛰며 복사
+        src = np.frombuffer(plane, dtype=np.uint8, count=plane.line_size * height)
+        np.copyto(dst, src.reshape(height, plane.line_size)[:, :width])
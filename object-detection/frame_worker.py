@@ -0,0 +1,194 @@
+# frame_worker.py
+# aiortc 수신 루프와 MediaPipe 추론 사이의 프레임 우편함과 처리 통계
+# 수신 루프는 우편함에 프레임을 넣기만 하고, 추론이 밀리면 오래된 프레임은 버린다 (latest frame wins)
+import threading
+import time
+from contextlib import contextmanager
+
+
+class LatestFrameMailbox:
+    """
+    크기 1짜리 '최신 프레임 우선' 우편함
+    아직 처리되지 않은 프레임이 있으면 새 프레임으로 덮어쓰고 드롭 수를 센다
+    on_put: 프레임이 들어올 때마다 (락 밖에서) 호출 - 스케줄러 알림용
+    """
+
+    def __init__(self, on_put=None):
+        self._cond = threading.Condition()
+        self._item = None
+        self._closed = False
+        self.on_put = on_put
+        self.received = 0
+        self.dropped = 0
+        self.latest_media_time = None
+
+    def put(self, frame):
+        # 수신 루프(이벤트 루프)에서 호출 - 절대 블로킹하지 않음
+        with self._cond:
+            if self._item is not None:
+                self.dropped += 1
+            self._item = (frame, time.monotonic())
+            self.received += 1
+            media_time = getattr(frame, "time", None)
+            if media_time is not None:
+                self.latest_media_time = media_time
+            self._cond.notify()
+        if self.on_put is not None:
+            self.on_put()
+
+    def get(self, timeout=None):
+        """
+        다음 프레임을 (frame, 수신 시각) 으로 반환
+        타임아웃이나 close() 시 None 반환
+        """
+        with self._cond:
+            if self._item is None and not self._closed:
+                self._cond.wait(timeout)
+            item = self._item
+            self._item = None
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def pending(self):
+        return self._item is not None
+
+    @property
+    def closed(self):
+        return self._closed
+
+
+class FrameStats:
+    """
+    스트림 하나의 처리 통계 (FPS, 수신→처리 지연, 라이브 영상 대비 지연, 드롭 수)
+    report_interval마다 한 줄 로그를 남긴다
+    """
+
+    def __init__(self, name, report_interval=10.0):
+        self.name = name
+        self.report_interval = report_interval
+
+        self.processed = 0
+        self.fps = 0.0
+        self.last_queue_wait = 0.0  # 수신 → 처리 시작까지 대기 (초)
+        self.last_latency = 0.0  # 수신 → 처리 완료까지 (초)
+        self.last_media_lag = 0.0  # 최신 수신 프레임 PTS - 처리한 프레임 PTS (초)
+
+        self._window_start = time.monotonic()
+        self._window_processed = 0
+        self._window_dropped = 0
+
+    def record(self, mailbox, frame, received_at, started_at, finished_at):
+        self.processed += 1
+        self.last_queue_wait = started_at - received_at
+        self.last_latency = finished_at - received_at
+
+        media_time = getattr(frame, "time", None)
+        latest_media_time = mailbox.latest_media_time
+        if media_time is not None and latest_media_time is not None:
+            self.last_media_lag = max(0.0, latest_media_time - media_time)
+
+        elapsed = finished_at - self._window_start
+        if elapsed >= self.report_interval:
+            processed = self.processed - self._window_processed
+            dropped = mailbox.dropped - self._window_dropped
+            self.fps = processed / elapsed
+            print(
+                f"[{self.name}] 처리 {self.fps:.1f} fps, 드롭 {dropped}장 "
+                f"(누적 {mailbox.dropped}), 대기 {self.last_queue_wait * 1000:.0f}ms, "
+                f"라이브 대비 지연 {self.last_media_lag * 1000:.0f}ms"
+            )
+            self._window_start = finished_at
+            self._window_processed = self.processed
+            self._window_dropped = mailbox.dropped
+
+    def snapshot(self, mailbox):
+        return {
+            "received": mailbox.received,
+            "processed": self.processed,
+            "dropped": mailbox.dropped,
+            "fps": self.fps,
+            "queue_wait_ms": self.last_queue_wait * 1000.0,
+            "latency_ms": self.last_latency * 1000.0,
+            "behind_live_ms": self.last_media_lag * 1000.0,
+        }
+
+
+class StageTimings:
+    """
+    처리 단계별 소요 시간 기록 (decode / color / resize / detect / rsp / write ...)
+    replay 벤치마크에서 세션에 붙여 단계별 지연 히스토그램을 만든다
+    """
+
+    BUCKETS_MS = (0.25, 0.5, 1, 2, 4, 8, 16, 33, 66, 133, 250, 500, 1000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}  # 단계 이름 -> [초, ...]
+
+    @contextmanager
+    def measure(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def summary(self, stage):
+        with self._lock:
+            values = sorted(self.samples.get(stage, ()))
+        if not values:
+            return None
+
+        def pct(p):
+            return values[min(len(values) - 1, int(p * len(values)))] * 1000.0
+
+        return {
+            "count": len(values),
+            "mean_ms": sum(values) / len(values) * 1000.0,
+            "p50_ms": pct(0.50),
+            "p90_ms": pct(0.90),
+            "p99_ms": pct(0.99),
+            "max_ms": values[-1] * 1000.0,
+        }
+
+    def histogram(self, stage):
+        """[(버킷 상한 ms, 개수), ...] - 마지막 버킷 상한은 inf"""
+        with self._lock:
+            values = list(self.samples.get(stage, ()))
+        bounds = list(self.BUCKETS_MS) + [float("inf")]
+        counts = [0] * len(bounds)
+        for seconds in values:
+            ms = seconds * 1000.0
+            for i, bound in enumerate(bounds):
+                if ms <= bound:
+                    counts[i] += 1
+                    break
+        return list(zip(bounds, counts))
+
+    def report(self, width=40):
+        lines = []
+        for stage in list(self.samples):
+            s = self.summary(stage)
+            lines.append(
+                f"[{stage}] n={s['count']} mean {s['mean_ms']:.2f}ms "
+                f"p50 {s['p50_ms']:.2f}ms p90 {s['p90_ms']:.2f}ms "
+                f"p99 {s['p99_ms']:.2f}ms max {s['max_ms']:.2f}ms"
+            )
+            histogram = self.histogram(stage)
+            peak = max(count for _, count in histogram) or 1
+            for bound, count in histogram:
+                if count == 0:
+                    continue
+                label = "inf" if bound == float("inf") else f"{bound:g}"
+                bar = "#" * max(1, round(count / peak * width))
+                lines.append(f"    <= {label:>5}ms {count:7d} {bar}")
+        return "\n".join(lines)
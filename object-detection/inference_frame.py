@@ -0,0 +1,100 @@
+# inference_frame.py
+# 얼굴/포즈 모델 입력 해상도 단계
+# 모델은 내부적으로 저해상도(얼굴 192~256, 포즈 256)로 돌기 때문에 1080p 원본을 그대로 넘길 필요가 없다
+# 한 번 줄인 프레임을 얼굴/포즈가 같이 쓰고, 결과 랜드마크는 InferenceView로 원본 프레임 좌표로 되돌린다
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+
+class InferenceView(
+    namedtuple("InferenceView", "image x0 y0 width height full_width full_height")
+):
+    """
+    모델에 넘긴 이미지(image)가 원본 프레임의 어느 영역(x0, y0, width, height 픽셀)을 담고 있는지
+    영역 전체를 균일하게 축소한 경우 정규화 좌표는 그대로 유효하고, 잘라낸 경우에만 오프셋이 생긴다
+    """
+
+    @classmethod
+    def full(cls, image, full_width, full_height):
+        return cls(image, 0, 0, full_width, full_height, full_width, full_height)
+
+    @property
+    def is_full(self):
+        """원본 프레임 전체를 담고 있는지 (잘라낸 ROI가 아닌지)"""
+        return (
+            self.x0 == 0
+            and self.y0 == 0
+            and self.width == self.full_width
+            and self.height == self.full_height
+        )
+
+    def to_full_normalized(self, x, y):
+        return (
+            (self.x0 + x * self.width) / self.full_width,
+            (self.y0 + y * self.height) / self.full_height,
+        )
+
+    def to_full_pixels(self, x, y):
+        return self.x0 + x * self.width, self.y0 + y * self.height
+
+
+def project_landmarks(landmarks, view, pixels=False):
+    """정규화 랜드마크 목록 → 원본 프레임 기준 (N, 3) 배열 (z는 영역 너비 비율로 맞춤)"""
+    coords = np.array([[lm.x, lm.y, lm.z] for lm in landmarks], dtype=np.float32)
+    if coords.size == 0:
+        return coords.reshape(0, 3)
+    coords[:, 0] = view.x0 + coords[:, 0] * view.width
+    coords[:, 1] = view.y0 + coords[:, 1] * view.height
+    coords[:, 2] *= view.width
+    if not pixels:
+        coords[:, 0] /= view.full_width
+        coords[:, 1] /= view.full_height
+        coords[:, 2] /= view.full_width
+    return coords
+
+
+class InferenceResizer:
+    """
+    원본 RGB 프레임을 max_width 이하로 한 번 축소 (종횡비 유지, 0이면 축소하지 않음)
+    축소 결과는 미리 할당한 버퍼 count개를 돌려 쓰므로 count - 1 프레임 뒤까지 유효하다
+    """
+
+    def __init__(self, max_width=0, interpolation=cv2.INTER_LINEAR, count=4):
+        self.max_width = max_width
+        self.interpolation = interpolation
+        self.count = max(2, count)
+        self._shape = None
+        self._buffers = []
+        self._next = 0
+
+    def target_size(self, width, height):
+        if self.max_width <= 0 or width <= self.max_width:
+            return width, height
+        return self.max_width, max(1, round(height * self.max_width / width))
+
+    def resize(self, frame_rgb):
+        height, width = frame_rgb.shape[:2]
+        size = self.target_size(width, height)
+        if size == (width, height):
+            return InferenceView.full(frame_rgb, width, height)
+
+        shape = (size[1], size[0], 3)
+        if self._shape != shape:
+            self._shape = shape
+            self._buffers = [np.empty(shape, dtype=np.uint8) for _ in range(self.count)]
+            self._next = 0
+        dst = self._buffers[self._next]
+        self._next = (self._next + 1) % self.count
+        cv2.resize(frame_rgb, size, dst=dst, interpolation=self.interpolation)
+        return InferenceView.full(dst, width, height)
+
+    def resize_copy(self, frame_rgb):
+        """다른 스레드(RSP 요청)에서 쓰는 용도 - 풀 버퍼를 건드리지 않고 새 배열로 축소"""
+        height, width = frame_rgb.shape[:2]
+        size = self.target_size(width, height)
+        if size == (width, height):
+            return InferenceView.full(frame_rgb, width, height)
+        image = cv2.resize(frame_rgb, size, interpolation=self.interpolation)
+        return InferenceView.full(image, width, height)
@@ -0,0 +1,155 @@
+# inference_pool.py
+# 여러 로봇 세션이 공유하는 추론 스레드 풀
+# 세션마다 우편함을 두고, 풀 스레드가 라운드로빈으로 세션을 돌며 최신 프레임을 처리한다
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class FairFrameScheduler:
+    """
+    프레임이 대기 중인 세션을 라운드로빈으로 꺼내 주는 스케줄러
+    - 한 세션은 동시에 한 스레드만 처리 (세션 상태 머신은 스레드 안전하지 않음)
+    - 처리를 마친 세션은 대기열 맨 뒤로 돌아가므로 바쁜 세션이 다른 세션을 굶기지 않는다
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._ready = deque()
+        self._queued = set()
+        self._busy = set()
+        self._closed = False
+
+    def notify(self, session):
+        with self._cond:
+            if session in self._busy or session in self._queued:
+                return
+            self._ready.append(session)
+            self._queued.add(session)
+            self._cond.notify()
+
+    def acquire(self, timeout=None):
+        with self._cond:
+            if not self._ready and not self._closed:
+                self._cond.wait(timeout)
+            if not self._ready:
+                return None
+            session = self._ready.popleft()
+            self._queued.discard(session)
+            self._busy.add(session)
+            return session
+
+    def release(self, session):
+        with self._cond:
+            self._busy.discard(session)
+            if session.mailbox.pending and session not in self._queued:
+                self._ready.append(session)
+                self._queued.add(session)
+                self._cond.notify()
+
+    def discard(self, session):
+        with self._cond:
+            if session in self._queued:
+                self._ready.remove(session)
+                self._queued.discard(session)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+
+class InferencePool:
+    """
+    공유 추론 풀
+    - size개의 스레드가 모든 세션의 프레임을 나눠 처리
+    - face_factory가 있으면 스레드마다 얼굴 랜드마커를 하나씩 만들어 세션 간에 공유 (IMAGE 모드)
+      VIDEO / LIVE_STREAM 모드는 프레임 간 추적 상태가 스트림마다 달라 세션이 자기 인스턴스를 가진다
+    - 포즈 모델은 size개를 만들어 pose() 컨텍스트로 빌려 쓴다
+    """
+
+    def __init__(self, size, face_factory=None, pose_factory=None):
+        self.size = max(1, size)
+        self.scheduler = FairFrameScheduler()
+        self.sessions = []
+        self._threads = []
+
+        self._face_runners = [face_factory() for _ in range(self.size)] if face_factory else []
+        self._poses = [pose_factory() for _ in range(self.size)] if pose_factory else []
+        self._pose_queue = queue.Queue()
+        for pose in self._poses:
+            self._pose_queue.put(pose)
+
+    def register(self, session):
+        session.mailbox.on_put = lambda: self.scheduler.notify(session)
+        if session not in self.sessions:
+            self.sessions.append(session)
+
+    def unregister(self, session):
+        session.mailbox.on_put = None
+        self.scheduler.discard(session)
+        if session in self.sessions:
+            self.sessions.remove(session)
+
+    def start(self):
+        if self._threads:
+            return
+        for i in range(self.size):
+            face_runner = self._face_runners[i] if self._face_runners else None
+            thread = threading.Thread(
+                target=self._run, args=(face_runner,), name=f"Inference-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        print(f"✓ 추론 풀 시작 (스레드 {self.size}개)")
+
+    def stop(self, timeout=2.0):
+        self.scheduler.close()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def close(self):
+        self.stop()
+        for runner in self._face_runners:
+            runner.close()
+        for pose in self._poses:
+            pose.close()
+
+    @contextmanager
+    def pose(self):
+        """포즈 모델 하나를 빌려 쓴다 (모두 사용 중이면 대기)"""
+        pose = self._pose_queue.get()
+        try:
+            yield pose
+        finally:
+            self._pose_queue.put(pose)
+
+    def stats(self):
+        return {s.session_id: s.stats.snapshot(s.mailbox) for s in list(self.sessions)}
+
+    def _run(self, face_runner):
+        while not self.scheduler.closed:
+            session = self.scheduler.acquire(timeout=1.0)
+            if session is None:
+                continue
+            try:
+                item = session.mailbox.get(timeout=0)
+                if item is not None:
+                    frame, received_at = item
+                    started_at = time.monotonic()
+                    try:
+                        session.process_frame(frame, face_runner)
+                    except Exception as e:
+                        print(f"!!! EXCEPTION in {threading.current_thread().name}: {e}")
+                    session.stats.record(
+                        session.mailbox, frame, received_at, started_at, time.monotonic()
+                    )
+            finally:
+                self.scheduler.release(session)
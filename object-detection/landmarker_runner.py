@@ -0,0 +1,139 @@
+# landmarker_runner.py
+# FaceLandmarker 실행 모드(IMAGE / VIDEO / LIVE_STREAM) 래퍼
+# VIDEO, LIVE_STREAM 모드는 프레임 PTS 타임스탬프를 넘겨 MediaPipe가 프레임 간 랜드마크를 추적하게 한다
+import threading
+import time
+
+import mediapipe as mp
+from mediapipe.tasks.python import vision
+
+RUNNING_MODES = ("IMAGE", "VIDEO", "LIVE_STREAM")
+
+
+class MonotonicTimestamps:
+    """
+    MediaPipe VIDEO / LIVE_STREAM 모드는 단조 증가 타임스탬프만 받는다 (PTS 되감김/재연결 대비)
+    - 조금 역행한 값(재정렬 등)은 직전 값 + 1로 당긴다
+    - rewind_ms 넘게 뒤로 가거나 reset() 뒤 첫 값이면 _offset_ms를 다시 잡아 기존 타임라인 뒤에 이어 붙인다
+      (PacketClipRecorder의 _ts_offset과 같은 방식 - 되감긴 뒤에도 프레임 간격이 그대로 유지됨)
+    """
+
+    def __init__(self, rewind_ms=200, frame_ms=33):
+        self.rewind_ms = rewind_ms
+        self.frame_ms = frame_ms
+        self._offset_ms = 0
+        self._last_raw_ms = None
+        self._last_timestamp_ms = -1
+        self._resync = False
+
+    def reset(self):
+        """재구독 등으로 새 스트림을 받기 시작할 때 호출 - 다음 값부터 타임라인을 이어 붙인다"""
+        self._resync = True
+
+    def next(self, timestamp_ms=None):
+        if timestamp_ms is None:
+            timestamp_ms = int(time.monotonic() * 1000)
+        last_raw = self._last_raw_ms
+        if last_raw is not None and (self._resync or timestamp_ms < last_raw - self.rewind_ms):
+            self._offset_ms = self._last_timestamp_ms + self.frame_ms - timestamp_ms
+        self._resync = False
+        self._last_raw_ms = timestamp_ms
+        timestamp_ms += self._offset_ms
+        if timestamp_ms <= self._last_timestamp_ms:
+            timestamp_ms = self._last_timestamp_ms + 1
+        self._last_timestamp_ms = timestamp_ms
+        return timestamp_ms
+
+
+def frame_timestamp_ms(frame):
+    """aiortc VideoFrame의 PTS를 밀리초로 변환 (PTS가 없으면 단조 시계 사용)"""
+    pts = getattr(frame, "pts", None)
+    time_base = getattr(frame, "time_base", None)
+    if pts is None or time_base is None:
+        return int(time.monotonic() * 1000)
+    return int(pts * time_base * 1000)
+
+
+class FaceLandmarkerRunner:
+    """
+    실행 모드와 관계없이 submit(frame_rgb, timestamp_ms) 하나로 감지를 요청한다
+    결과는 on_result(face_result, cost_seconds) 콜백으로 전달된다 (submit에 넘긴 콜백이 우선)
+      - IMAGE / VIDEO: submit() 안에서 동기 호출
+      - LIVE_STREAM: MediaPipe 내부 스레드에서 비동기 호출
+    """
+
+    def __init__(self, model_path, running_mode="IMAGE", on_result=None, num_faces=1):
+        running_mode = running_mode.upper()
+        if running_mode not in RUNNING_MODES:
+            raise ValueError(f"지원하지 않는 running_mode: {running_mode}")
+
+        self.running_mode = running_mode
+        self.on_result = on_result
+        self._timestamps = MonotonicTimestamps()
+        self._submitted = {}  # LIVE_STREAM: timestamp_ms -> (제출 시각, 콜백)
+        self._lock = threading.Lock()
+
+        options = vision.FaceLandmarkerOptions(
+            base_options=mp.tasks.BaseOptions(model_asset_path=model_path),
+            running_mode=getattr(vision.RunningMode, running_mode),
+            output_face_blendshapes=True,
+            num_faces=num_faces,
+        )
+        if running_mode == "LIVE_STREAM":
+            options.result_callback = self._on_live_result
+        self.landmarker = vision.FaceLandmarker.create_from_options(options)
+
+    @property
+    def busy(self):
+        """LIVE_STREAM에서 아직 결과가 오지 않은 요청이 있는지 (1초 넘게 안 오면 드롭된 것으로 간주)"""
+        if self.running_mode != "LIVE_STREAM":
+            return False
+        now = time.monotonic()
+        with self._lock:
+            for ts, (submitted_at, _) in list(self._submitted.items()):
+                if now - submitted_at > 1.0:
+                    del self._submitted[ts]
+            return bool(self._submitted)
+
+    def submit(self, frame_rgb, timestamp_ms=None, on_result=None):
+        on_result = on_result or self.on_result
+        mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=frame_rgb)
+        if self.running_mode == "IMAGE":
+            start = time.monotonic()
+            result = self.landmarker.detect(mp_image)
+            self._deliver(on_result, result, time.monotonic() - start)
+            return result
+
+        timestamp_ms = self._timestamps.next(timestamp_ms)
+        if self.running_mode == "VIDEO":
+            start = time.monotonic()
+            result = self.landmarker.detect_for_video(mp_image, timestamp_ms)
+            self._deliver(on_result, result, time.monotonic() - start)
+            return result
+
+        with self._lock:
+            self._submitted[timestamp_ms] = (time.monotonic(), on_result)
+        self.landmarker.detect_async(mp_image, timestamp_ms)
+        return None
+
+    def close(self):
+        self.landmarker.close()
+
+    def _on_live_result(self, result, output_image, timestamp_ms):
+        with self._lock:
+            submitted_at, on_result = self._submitted.pop(
+                timestamp_ms, (None, self.on_result)
+            )
+            # 이보다 앞선 요청은 MediaPipe가 드롭한 것
+            for ts in [ts for ts in self._submitted if ts < timestamp_ms]:
+                del self._submitted[ts]
+        cost = time.monotonic() - submitted_at if submitted_at is not None else 0.0
+        self._deliver(on_result, result, cost)
+
+    def _deliver(self, on_result, result, cost_seconds):
+        if on_result is None:
+            return
+        try:
+            on_result(result, cost_seconds)
+        except Exception as e:
+            print(f"[FaceLandmarker] on_result 처리 중 오류: {e}")
@@ -0,0 +1,344 @@
+# metrics.py
+# 워커 지표 (카운터 / 히스토그램) 와 Prometheus 텍스트 형식 HTTP 엔드포인트
+# METRICS_ENABLED=true 일 때만 켜진다. 꺼져 있으면 기록 함수는 바로 반환하고
+# StreamSession에는 단계 측정기가 붙지 않아 프레임 경로 비용이 0에 가깝다
+#   curl http://127.0.0.1:9100/metrics
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() in ("1", "true", "yes", "on")
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+
+# 초 단위 지연 버킷 (프레임 단계 0.25ms ~ 업로드 수십 초)
+LATENCY_BUCKETS = (
+    0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.02, 0.033, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._children = {}
+
+    def labels(self, *values):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _default(self):
+        return self.labels()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_name}"]
+        for key, child in list(self._children.items()):
+            lines.extend(child.render(self.name, self.label_names, key))
+        return lines
+
+
+class _CounterValue:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount=1.0):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self.value += amount
+
+    def render(self, name, label_names, label_values):
+        return [f"{name}{_format_labels(label_names, label_values)} {self.value}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def inc(self, amount=1.0):
+        self._default().inc(amount)
+
+
+class _GaugeValue(_CounterValue):
+    def __init__(self):
+        super().__init__()
+        self.function = None
+
+    def set(self, value):
+        if not METRICS_ENABLED:
+            return
+        self.value = float(value)
+
+    def set_function(self, function):
+        """스크레이프할 때 값을 읽어 오는 함수 (큐 길이처럼 매번 기록할 필요가 없는 값)"""
+        self.function = function
+
+    def render(self, name, label_names, label_values):
+        value = self.value
+        if self.function is not None:
+            try:
+                value = float(self.function())
+            except Exception:
+                return []
+        return [f"{name}{_format_labels(label_names, label_values)} {value}"]
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _GaugeValue()
+
+    def set(self, value):
+        self._default().set(value)
+
+    def set_function(self, function):
+        self._default().set_function(function)
+
+    def remove(self, *values):
+        with self._lock:
+            self._children.pop(tuple(str(v) for v in values), None)
+
+
+class FunctionCounter(Gauge):
+    """
+    스크레이프할 때 set_function의 값을 읽는 카운터 (우편함 received처럼 이미 단조 증가하는 값)
+    counter 타입 + *_total 이름으로 내보내 rate()를 그대로 쓸 수 있다
+    """
+
+    type_name = "counter"
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        if not METRICS_ENABLED:
+            return
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def render(self, name, label_names, label_values):
+        with self._lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(list(self.buckets) + ["+Inf"], counts):
+            cumulative += bucket_count
+            labels = _format_labels(label_names + ("le",), label_values + (str(bound),))
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        labels = _format_labels(label_names, label_values)
+        lines.append(f"{name}_sum{labels} {total}")
+        lines.append(f"{name}_count{labels} {count}")
+        return lines
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name, help_text, label_names=()):
+    return REGISTRY.register(Counter(name, help_text, label_names))
+
+
+def gauge(name, help_text, label_names=()):
+    return REGISTRY.register(Gauge(name, help_text, label_names))
+
+
+def function_counter(name, help_text, label_names=()):
+    return REGISTRY.register(FunctionCounter(name, help_text, label_names))
+
+
+def histogram(name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+    return REGISTRY.register(Histogram(name, help_text, label_names, buckets))
+
+
+# --- 워커 지표 ---
+FRAME_RECEIVE_INTERVAL = histogram(
+    "worker_frame_receive_interval_seconds", "aiortc 트랙에서 연속 프레임 수신 간격", ("session",)
+)
+FRAME_STAGE_SECONDS = histogram(
+    "worker_frame_stage_seconds",
+    "process_frame 단계별 소요 시간 (color=디코딩 프레임 RGB 변환, motion=움직임 게이트, detect=얼굴 추론, write/flush/preroll=녹화)",
+    ("session", "stage"),
+)
+FRAMES_RECEIVED = function_counter(
+    "worker_frames_received_total", "세션 우편함에 들어온 프레임 수", ("session",)
+)
+FRAMES_DROPPED = function_counter(
+    "worker_frames_dropped_total", "처리 전에 새 프레임으로 덮어쓴 프레임 수", ("session",)
+)
+FRAMES_PROCESSED = function_counter(
+    "worker_frames_processed_total", "추론 풀에서 처리한 프레임 수", ("session",)
+)
+MOTION_GATE_SKIPS = counter(
+    "worker_motion_gate_skips_total", "정지 장면 + 얼굴 없음으로 건너뛴 얼굴 감지 수", ("session",)
+)
+SMILE_TRIGGERS = counter(
+    "worker_smile_triggers_total", "표정(스마일 등) 녹화 트리거 수", ("session", "expression")
+)
+CLIPS_RECORDED = counter("worker_clips_recorded_total", "업로드 큐로 넘긴 클립 수", ("session",))
+CLIP_ENCODE_SECONDS = histogram(
+    "worker_clip_encode_seconds", "인코더 스레드에서 클립 하나를 쓰는 데 걸린 시간 (decode 경로)"
+)
+CLIP_FRAMES_DROPPED = counter(
+    "worker_clip_frames_dropped_total", "인코더가 밀려 클립에서 빠진 프레임 수 (decode 경로)"
+)
+CLIPS_DEGRADED = counter(
+    "worker_clips_degraded_total", "프레임이 하나 이상 빠진 채로 닫힌 클립 수 (decode 경로)"
+)
+UPLOAD_QUEUE_DEPTH = gauge("worker_upload_queue_depth", "업로드 대기 중인 클립 수")
+UPLOAD_SECONDS = histogram("worker_upload_duration_seconds", "클립 업로드 소요 시간", ("result",))
+UPLOADS = counter("worker_uploads_total", "클립 업로드 결과", ("result",))
+MQTT_REQUEST_SECONDS = histogram(
+    "worker_mqtt_request_seconds", "MQTT 요청 수신부터 응답 발행까지", ("kind",)
+)
+MQTT_PUBLISH_SECONDS = histogram(
+    "worker_mqtt_publish_seconds", "발행 요청(offer)부터 브로커 전송 완료까지 (coalescing 대기 포함)", ("topic",)
+)
+MQTT_PUBLISHES = counter(
+    "worker_mqtt_publishes_total", "coalescing 발행 결과 (sent / coalesced / dropped / failed)", ("topic", "result")
+)
+RSP_RESULTS = counter("worker_rsp_results_total", "가위바위보 응답 결과", ("result",))
+
+
+class StageMetrics:
+    """StreamSession.stage_timings 자리에 붙이는 지표 기록기 (StageTimings와 같은 measure/add 인터페이스)"""
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self._children = {}
+
+    def _child(self, stage):
+        child = self._children.get(stage)
+        if child is None:
+            child = self._children[stage] = FRAME_STAGE_SECONDS.labels(self.session_id, stage)
+        return child
+
+    def add(self, stage, seconds):
+        self._child(stage).observe(seconds)
+
+    def measure(self, stage):
+        return self._child(stage).time()
+
+
+def watch_session(session):
+    """세션 우편함 / 통계 카운터를 스크레이프 시점에 읽도록 등록 (프레임 경로에서는 아무것도 하지 않음)"""
+    sid = session.session_id
+    FRAMES_RECEIVED.labels(sid).set_function(lambda: session.mailbox.received)
+    FRAMES_DROPPED.labels(sid).set_function(lambda: session.mailbox.dropped)
+    FRAMES_PROCESSED.labels(sid).set_function(lambda: session.stats.processed)
+
+
+def unwatch_session(session):
+    for metric in (FRAMES_RECEIVED, FRAMES_DROPPED, FRAMES_PROCESSED):
+        metric.remove(session.session_id)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """METRICS_ENABLED일 때 /metrics HTTP 서버를 데몬 스레드로 띄운다"""
+    if not METRICS_ENABLED:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        print(f"❌ 지표 서버 시작 실패 ({host}:{port}): {e}")
+        return None
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="MetricsServer", daemon=True)
+    thread.start()
+    print(f"✓ 지표 엔드포인트: http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,73 @@
+# motion_gate.py
+# 빈 방에서 FaceLandmarker를 돌리지 않기 위한 움직임 사전 필터
+# 프레임을 솎아 낸 작은 휘도 이미지(기본 64px 너비)를 직전 검사 프레임과 비교해,
+# 장면이 정지해 있고 마지막 감지 결과가 "얼굴 없음"이면 MediaPipe 호출을 건너뛴다
+# 조명 변화처럼 느린 변화나 놓친 얼굴을 위해 refresh_seconds마다 한 번은 강제로 감지한다
+import time
+
+import numpy as np
+
+# ITU-R BT.601 휘도 가중치 (정수, 합 256)
+_LUMA_WEIGHTS = np.array([77, 150, 29], dtype=np.uint16)
+
+
+class MotionGate:
+    """
+    allow(frame_rgb, idle)가 False면 이번 감지를 건너뛴다
+    - idle: 마지막 감지 결과가 "얼굴 없음"인지 (얼굴이 있으면 항상 통과)
+    - 솎은 휘도에서 pixel_threshold 넘게 바뀐 픽셀이 motion_fraction 이상이면 움직임으로 본다
+    - refresh_seconds 동안 감지가 없었으면 정지 장면이라도 통과
+    """
+
+    def __init__(
+        self,
+        sample_width=64,
+        pixel_threshold=16,
+        motion_fraction=0.01,
+        refresh_seconds=2.0,
+        enabled=True,
+    ):
+        self.sample_width = max(8, sample_width)
+        self.pixel_threshold = pixel_threshold
+        self.motion_fraction = motion_fraction
+        self.refresh_seconds = refresh_seconds
+        self.enabled = enabled
+
+        self._previous = None
+        self._last_pass = 0.0
+        self.last_motion = 1.0  # 직전 검사에서 바뀐 픽셀 비율
+        self.passed = 0
+        self.skipped = 0
+
+    def luma(self, frame_rgb):
+        """세로 / 가로를 같은 간격으로 솎은 뒤 휘도로 변환 (원본 크기와 상관없이 수천 픽셀)"""
+        step = max(1, frame_rgb.shape[1] // self.sample_width)
+        small = frame_rgb[::step, ::step].astype(np.uint16)
+        return ((small @ _LUMA_WEIGHTS) >> 8).astype(np.int16)
+
+    def motion(self, frame_rgb):
+        """직전 검사 프레임 대비 바뀐 픽셀 비율 (첫 프레임 / 해상도 변경이면 1.0)"""
+        current = self.luma(frame_rgb)
+        previous = self._previous
+        self._previous = current
+        if previous is None or previous.shape != current.shape:
+            return 1.0
+        changed = np.count_nonzero(np.abs(current - previous) > self.pixel_threshold)
+        return changed / current.size
+
+    def allow(self, frame_rgb, idle, now=None):
+        if not self.enabled:
+            return True
+        now = time.monotonic() if now is None else now
+        # 얼굴이 있을 때도 기준 프레임은 갱신해 둬야 사람이 떠난 직후 비교가 맞는다
+        self.last_motion = self.motion(frame_rgb)
+        if (
+            not idle
+            or self.last_motion >= self.motion_fraction
+            or now - self._last_pass >= self.refresh_seconds
+        ):
+            self._last_pass = now
+            self.passed += 1
+            return True
+        self.skipped += 1
+        return False
@@ -0,0 +1,195 @@
+# mqtt_publisher.py
+# 감지 스레드에서 이벤트 루프의 MQTT 클라이언트로 고빈도 메시지(얼굴 좌표 등)를 넘기는 coalescing 발행기
+# - 토픽마다 가장 최신 값만 남긴다 (last value wins): 브로커가 밀리면 오래된 좌표는 보내지 않고 덮어쓴다
+# - 동시에 전송 중인 publish는 MQTT_MAX_IN_FLIGHT개, 토픽당 1개까지만 (순서 역전 없음)
+# - 전송 지연 / 덮어쓴(coalesced) / 버린(dropped) / 실패(failed) 수를 metrics와 주기 로그로 보고
+import asyncio
+import os
+import threading
+import time
+
+from metrics import MQTT_PUBLISH_SECONDS, MQTT_PUBLISHES
+
+MQTT_MAX_IN_FLIGHT = int(os.getenv("MQTT_MAX_IN_FLIGHT", "4"))
+MQTT_PUBLISH_TIMEOUT = float(os.getenv("MQTT_PUBLISH_TIMEOUT", "2.0"))
+# 발행 통계 로그 주기 (초, 0이면 끔)
+MQTT_PUBLISH_STATS_SECONDS = float(os.getenv("MQTT_PUBLISH_STATS_SECONDS", "30"))
+
+
+class CoalescingPublisher:
+    """
+    offer(topic, payload)는 어느 스레드에서나 호출할 수 있고 바로 반환한다 (감지 스레드를 막지 않음)
+    실제 publish는 start()로 띄운 이벤트 루프 태스크가 수행한다
+    """
+
+    def __init__(
+        self,
+        client,
+        loop,
+        max_in_flight=MQTT_MAX_IN_FLIGHT,
+        publish_timeout=MQTT_PUBLISH_TIMEOUT,
+        stats_interval=MQTT_PUBLISH_STATS_SECONDS,
+        qos=0,
+        prepare=None,
+    ):
+        self.client = client
+        self.loop = loop
+        self.max_in_flight = max(1, max_in_flight)
+        self.publish_timeout = publish_timeout
+        self.stats_interval = stats_interval
+        self.qos = qos
+        # prepare(topic, payload) -> payload: 실제로 보내기 직전에 한 번 호출 (덮어쓴 메시지에는 호출되지 않음)
+        self.prepare = prepare
+
+        self._lock = threading.Lock()
+        self._pending = {}  # topic -> (payload, offer 시각)
+        self._signaled = False  # 루프에 깨우기 요청을 이미 보냈는지 (offer마다 call_soon_threadsafe 하지 않도록)
+        self._closed = False
+        self._in_flight = {}  # topic -> publish 태스크 (루프에서만 접근)
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+        self.offered = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.failed = 0
+        self._latency_sum = 0.0
+        self._latency_max = 0.0
+        self._latency_count = 0
+
+    def start(self):
+        """이벤트 루프 안에서 호출"""
+        self._task = self.loop.create_task(self._run())
+        return self._task
+
+    def offer(self, topic, payload):
+        """토픽의 다음 메시지를 payload로 교체 - 아직 안 보낸 이전 값은 버린다(coalesced)"""
+        with self._lock:
+            if self._closed:
+                self.dropped += 1
+                MQTT_PUBLISHES.labels(topic, "dropped").inc()
+                return False
+            self.offered += 1
+            if topic in self._pending:
+                self.coalesced += 1
+                MQTT_PUBLISHES.labels(topic, "coalesced").inc()
+            self._pending[topic] = (payload, time.monotonic())
+            if self._signaled:
+                return True
+            self._signaled = True
+        try:
+            self.loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            # 루프가 이미 닫힘
+            pass
+        return True
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        count = self._latency_count
+        return {
+            "offered": self.offered,
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "pending": pending,
+            "in_flight": len(self._in_flight),
+            "latency_avg_ms": round(self._latency_sum / count * 1000, 1) if count else 0.0,
+            "latency_max_ms": round(self._latency_max * 1000, 1),
+        }
+
+    async def close(self, flush_timeout=1.0):
+        """대기 중인 최신 값을 flush_timeout 동안 마저 보내고 멈춘다 (못 보낸 값은 dropped)"""
+        with self._lock:
+            self._closed = True
+        self._wakeup.set()
+        deadline = time.monotonic() + flush_timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                pending = bool(self._pending)
+            if not pending and not self._in_flight:
+                break
+            await asyncio.sleep(0.01)
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        for task in list(self._in_flight.values()):
+            task.cancel()
+        with self._lock:
+            for topic in self._pending:
+                self.dropped += 1
+                MQTT_PUBLISHES.labels(topic, "dropped").inc()
+            self._pending.clear()
+        self._log_stats()
+
+    async def _run(self):
+        last_stats = time.monotonic()
+        try:
+            while True:
+                timeout = self.stats_interval if self.stats_interval > 0 else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                with self._lock:
+                    self._signaled = False
+                self._dispatch()
+
+                now = time.monotonic()
+                if self.stats_interval > 0 and now - last_stats >= self.stats_interval:
+                    last_stats = now
+                    self._log_stats()
+        except asyncio.CancelledError:
+            pass
+
+    def _dispatch(self):
+        # 전송 중이 아닌 토픽의 최신 값만 꺼내 보낸다 (루프에서만 호출)
+        while len(self._in_flight) < self.max_in_flight:
+            with self._lock:
+                topic = next((t for t in self._pending if t not in self._in_flight), None)
+                if topic is None:
+                    return
+                payload, offered_at = self._pending.pop(topic)
+            self._in_flight[topic] = self.loop.create_task(self._publish(topic, payload, offered_at))
+
+    async def _publish(self, topic, payload, offered_at):
+        try:
+            if self.prepare is not None:
+                payload = self.prepare(topic, payload)
+            await asyncio.wait_for(
+                self.client.publish(topic, payload, qos=self.qos), self.publish_timeout
+            )
+            latency = time.monotonic() - offered_at
+            self.sent += 1
+            self._latency_sum += latency
+            self._latency_count += 1
+            self._latency_max = max(self._latency_max, latency)
+            MQTT_PUBLISHES.labels(topic, "sent").inc()
+            MQTT_PUBLISH_SECONDS.labels(topic).observe(latency)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            MQTT_PUBLISHES.labels(topic, "failed").inc()
+            if self.failed == 1 or self.failed % 100 == 0:
+                print(f"[MQTT] ⚠️ 발행 실패 ({topic}, 누적 {self.failed}회): {e!r}")
+        finally:
+            self._in_flight.pop(topic, None)
+        # 기다리던 최신 값이 있으면 바로 이어서 보낸다
+        self._dispatch()
+
+    def _log_stats(self):
+        stats = self.stats()
+        if not stats["offered"]:
+            return
+        print(
+            f"[MQTT] 📊 발행 {stats['sent']}/{stats['offered']} "
+            f"(덮어씀 {stats['coalesced']}, 버림 {stats['dropped']}, 실패 {stats['failed']}) "
+            f"지연 평균 {stats['latency_avg_ms']}ms / 최대 {stats['latency_max_ms']}ms"
+        )
+        self._latency_sum = 0.0
+        self._latency_max = 0.0
+        self._latency_count = 0
@@ -0,0 +1,76 @@
+# openvidu_rpc.py
+# OpenVidu 시그널링 웹소켓 위의 JSON-RPC 2.0
+# 수신 루프 하나가 응답(id)과 서버 이벤트(method)를 나눠 주므로,
+# 구독 요청을 기다리는 동안에도 participantPublished / iceCandidate 같은 이벤트를 놓치지 않는다
+import asyncio
+import json
+
+
+class OpenViduRpcError(Exception):
+    def __init__(self, method, error):
+        super().__init__(f"{method} 실패: {error}")
+        self.method = method
+        self.error = error
+
+
+class OpenViduRpc:
+    """
+    call(method, params)는 응답의 result를 돌려주고, 오류 응답이면 OpenViduRpcError
+    on_event(method, params)는 서버가 보낸 이벤트마다 수신 루프에서 await 된다
+      (안에서 call()의 응답을 기다리면 수신 루프가 막히므로, 그런 작업은 태스크로 넘길 것)
+    run()은 웹소켓이 닫힐 때까지 수신하며, 끝나면 대기 중인 call을 모두 실패시킨다
+    """
+
+    def __init__(self, ws, on_event=None):
+        self.ws = ws
+        self.on_event = on_event
+        self._next_id = 1
+        self._pending = {}  # rpc id -> (method, Future)
+
+    async def call(self, method, params, timeout=10.0):
+        rpc_id = self._next_id
+        self._next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[rpc_id] = (method, future)
+        try:
+            await self.ws.send(
+                json.dumps({"jsonrpc": "2.0", "method": method, "id": rpc_id, "params": params})
+            )
+            response = await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(rpc_id, None)
+        if "error" in response:
+            raise OpenViduRpcError(method, response["error"])
+        return response.get("result", {})
+
+    async def notify(self, method, params):
+        """응답을 기다리지 않는 요청 (onIceCandidate 등)"""
+        rpc_id = self._next_id
+        self._next_id += 1
+        await self.ws.send(
+            json.dumps({"jsonrpc": "2.0", "method": method, "id": rpc_id, "params": params})
+        )
+
+    async def run(self):
+        try:
+            async for message in self.ws:
+                try:
+                    data = json.loads(message)
+                except ValueError:
+                    print(f"[RPC] JSON이 아닌 메시지 무시: {message[:100]}")
+                    continue
+
+                pending = self._pending.get(data.get("id"))
+                if pending is not None and "method" not in data:
+                    _, future = pending
+                    if not future.done():
+                        future.set_result(data)
+                elif data.get("method") and self.on_event is not None:
+                    try:
+                        await self.on_event(data["method"], data.get("params", {}))
+                    except Exception as e:
+                        print(f"[RPC] 이벤트 처리 중 오류 ({data['method']}): {e}")
+        finally:
+            for method, future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError(f"웹소켓 종료로 {method} 응답 없음"))
@@ -0,0 +1,284 @@
+# packet_recorder.py
+# 수신한 H.264 패킷을 디코딩/재인코딩 없이 faststart MP4로 그대로 먹싱하는 스마일 클립 녹화기
+# aiortc 수신기의 디코더 큐를 가로채 인코딩된 프레임(Annex-B)을 pre/post 구간만큼 보관한다
+import io
+import queue
+import threading
+import time
+from collections import deque
+from fractions import Fraction
+
+import av
+from aiortc import RTCRtpReceiver
+
+H264_MIME_TYPE = "video/H264"
+RTP_VIDEO_CLOCK_RATE = 90000
+# RTP 타임스탬프는 32비트라 (90kHz 기준 약 13시간마다, 시작값은 무작위) 한 바퀴 돈다
+RTP_TIMESTAMP_WRAP = 1 << 32
+
+
+def is_h264_keyframe(data):
+    """Annex-B 스트림에 IDR NAL(type 5)이 있으면 키프레임"""
+    i = data.find(b"\x00\x00\x01")
+    while i != -1 and i + 3 < len(data):
+        if data[i + 3] & 0x1F == 5:
+            return True
+        i = data.find(b"\x00\x00\x01", i + 3)
+    return False
+
+
+def prefer_h264(transceiver):
+    """구독 SDP에서 H.264를 최우선 코덱으로 제안 (패킷 먹싱은 H.264만 가능)"""
+    codecs = RTCRtpReceiver.getCapabilities("video").codecs
+    h264 = [c for c in codecs if c.mimeType == H264_MIME_TYPE]
+    others = [c for c in codecs if c.mimeType != H264_MIME_TYPE]
+    transceiver.setCodecPreferences(h264 + others)
+
+
+class _TappedDecoderQueue(queue.Queue):
+    # 수신기가 디코더 스레드로 넘기는 (codec, JitterFrame)을 먼저 sink에 보여준다
+    def __init__(self, sink):
+        super().__init__()
+        self._sink = sink
+
+    def put(self, item, block=True, timeout=None):
+        if item is not None:
+            codec, encoded_frame = item
+            try:
+                self._sink(codec.mimeType, encoded_frame.data, encoded_frame.timestamp)
+            except Exception as e:
+                print(f"[PacketRecorder] 패킷 처리 중 오류: {e}")
+        super().put(item, block, timeout)
+
+
+def tap_encoded_frames(receiver, sink):
+    """
+    RTCRtpReceiver의 디코더 큐를 교체해 인코딩된 프레임을 sink(mime, data, timestamp)로 받는다
+    디코더 스레드는 receive() 시점에 큐를 참조하므로 addTransceiver 직후에 호출해야 한다
+    """
+    attr = "_RTCRtpReceiver__decoder_queue"
+    if not isinstance(getattr(receiver, attr, None), queue.Queue):
+        print("[PacketRecorder] ⚠️ aiortc 수신기 구조가 달라 패킷을 가로챌 수 없습니다.")
+        return False
+    setattr(receiver, attr, _TappedDecoderQueue(sink))
+    return True
+
+
+def mux_h264_clip(path, packets, clock_rate=RTP_VIDEO_CLOCK_RATE):
+    """
+    (timestamp, data, is_keyframe) 목록을 faststart MP4로 먹싱 (재인코딩 없음)
+    첫 패킷은 SPS/PPS를 포함한 키프레임이어야 한다
+    """
+    # 첫 키프레임만 원시 H.264로 열어 해상도/extradata가 담긴 스트림 템플릿을 얻는다
+    with av.open(io.BytesIO(packets[0][1]), format="h264") as probe:
+        with av.open(path, mode="w", format="mp4", options={"movflags": "faststart"}) as output:
+            stream = output.add_stream_from_template(probe.streams.video[0])
+            stream.time_base = Fraction(1, clock_rate)
+
+            base_ts = packets[0][0]
+            last_pts = -1
+            for timestamp, data, is_keyframe in packets:
+                pts = timestamp - base_ts
+                if pts <= last_pts:
+                    continue  # 재전송 등으로 역행한 프레임은 버림
+                last_pts = pts
+                packet = av.Packet(data)
+                packet.stream = stream
+                packet.time_base = stream.time_base
+                packet.pts = pts
+                packet.dts = pts
+                packet.is_keyframe = is_keyframe
+                output.mux(packet)
+
+
+class PacketClipRecorder:
+    """
+    인코딩된 H.264 프레임 링 + 클립 녹화기
+    - 링은 pre_seconds 이전의 가장 가까운 키프레임부터 보관하고, max_bytes로 상한을 둔다
+    - start_clip() 시 pre 구간을 복사하고, post_seconds가 지나면 별도 스레드에서 먹싱 후 on_clip_ready(path) 호출
+    - 타임스탬프는 64비트 타임라인으로 펼쳐 쓴다 (32비트 wrap, 재연결 모두 _ts_offset으로 처리)
+    - post 구간 동안 publisher가 나가 end_ts에 닿지 못하면 post_seconds + deadline_grace 뒤 모인 만큼 먹싱한다
+    on_encoded_frame()은 aiortc 디코더 큐에서, start_clip()은 프레임 처리 스레드에서 호출된다
+    """
+
+    def __init__(
+        self,
+        pre_seconds,
+        post_seconds,
+        max_bytes=32 * 1024 * 1024,
+        clock_rate=RTP_VIDEO_CLOCK_RATE,
+        on_clip_ready=None,
+        deadline_grace=5.0,
+    ):
+        self.pre_ticks = int(pre_seconds * clock_rate)
+        self.post_ticks = int(post_seconds * clock_rate)
+        self.post_seconds = post_seconds
+        self.deadline_grace = deadline_grace
+        self.max_bytes = max_bytes
+        self.clock_rate = clock_rate
+        self.on_clip_ready = on_clip_ready
+
+        self._lock = threading.Lock()
+        self._packets = deque()  # (timestamp, data, is_keyframe)
+        self._keyframe_ts = deque()
+        self._bytes = 0
+        self._clip = None
+        self.active = False
+        self._warned_codec = False
+        # 수신 RTP 타임스탬프 + _ts_offset = 64비트 타임라인
+        # (재연결 후 새 RTP 시계를 기존 타임라인 뒤에 이어 붙이고, 32비트 wrap마다 2^32씩 더한다)
+        self._ts_offset = 0
+        self._last_raw_ts = None
+        self._latest_ts = None
+        self._resync = False
+        self._frame_ticks = clock_rate // 30
+
+    @property
+    def recording(self):
+        return self._clip is not None
+
+    def on_encoded_frame(self, mime_type, data, timestamp):
+        if mime_type != H264_MIME_TYPE:
+            if not self._warned_codec:
+                print(f"[PacketRecorder] ⚠️ {mime_type} 스트림 - 디코딩 녹화로 대체합니다.")
+                self._warned_codec = True
+            self.active = False
+            return
+
+        is_keyframe = is_h264_keyframe(data)
+        finished = None
+        with self._lock:
+            if self._resync:
+                # 새 스트림은 키프레임부터 받는다 (그 전 P 프레임은 참조할 프레임이 없음)
+                if not is_keyframe:
+                    return
+                last_ts = self._latest_ts
+                self._ts_offset = (
+                    last_ts + self._frame_ticks - timestamp if last_ts is not None else 0
+                )
+                self._last_raw_ts = timestamp
+                self._resync = False
+            timestamp = self._unwrap(timestamp)
+            if self._latest_ts is None or timestamp > self._latest_ts:
+                self._latest_ts = timestamp
+            self.active = True
+            self._packets.append((timestamp, data, is_keyframe))
+            self._bytes += len(data)
+            if is_keyframe:
+                self._keyframe_ts.append(timestamp)
+            self._trim(self._latest_ts)
+
+            clip = self._clip
+            if clip is not None:
+                if not clip["packets"] and not is_keyframe:
+                    pass  # 아직 키프레임을 못 만남 - 시작점 대기
+                else:
+                    clip["packets"].append((timestamp, data, is_keyframe))
+                if self._latest_ts >= clip["end_ts"]:
+                    finished = clip
+                    self._clip = None
+
+        if finished is not None:
+            self._start_finalize(finished)
+
+    def _unwrap(self, raw_ts):
+        # 32비트 RTP 타임스탬프 → 64비트 타임라인 (반 바퀴 넘게 뒤로 가면 wrap으로 본다)
+        last_raw = self._last_raw_ts
+        if last_raw is not None:
+            diff = raw_ts - last_raw
+            if diff < -RTP_TIMESTAMP_WRAP // 2:
+                self._ts_offset += RTP_TIMESTAMP_WRAP
+            elif diff > RTP_TIMESTAMP_WRAP // 2:
+                # wrap 직후에 늦게 도착한 wrap 이전 프레임
+                return raw_ts + self._ts_offset - RTP_TIMESTAMP_WRAP
+            elif diff < 0:
+                # 재전송 등으로 조금 역행한 프레임 - 기준은 그대로 둔다
+                return raw_ts + self._ts_offset
+        self._last_raw_ts = raw_ts
+        return raw_ts + self._ts_offset
+
+    def reset_stream(self):
+        """
+        재연결로 새 트랙을 받기 시작할 때 호출
+        보관 중인 링과 진행 중인 클립은 유지하고, 다음 키프레임부터 타임스탬프를 이어 붙인다
+        """
+        with self._lock:
+            self._resync = True
+            self.active = False
+
+    def start_clip(self, path):
+        """pre 구간 키프레임부터 클립 시작 - 링이 비었으면 False"""
+        with self._lock:
+            if self._clip is not None or not self._packets:
+                return False
+            latest_ts = self._latest_ts
+            start_ts = latest_ts - self.pre_ticks
+
+            # start_ts 이전의 마지막 키프레임 (없으면 링의 첫 키프레임)
+            key_ts = None
+            for ts in self._keyframe_ts:
+                if ts <= start_ts or key_ts is None:
+                    key_ts = ts
+                if ts > start_ts:
+                    break
+
+            packets = []
+            if key_ts is not None:
+                packets = [p for p in self._packets if p[0] >= key_ts]
+            clip = {
+                "path": path,
+                "packets": packets,
+                "end_ts": latest_ts + self.post_ticks,
+            }
+            self._clip = clip
+        # end_ts까지 패킷이 오지 않아도 (publisher 퇴장 등) 녹화 상태가 풀리도록 벽시계 마감
+        timer = threading.Timer(self.post_seconds + self.deadline_grace, self._expire, args=(clip,))
+        timer.daemon = True
+        timer.start()
+        print(f"Smile Detected! 패킷 녹화 시작... -> {path}")
+        return True
+
+    def _expire(self, clip):
+        with self._lock:
+            if self._clip is not clip:
+                return  # 이미 end_ts에 닿아 정상 종료됨
+            self._clip = None
+        print(f"⚠️ (PacketRecorder) post 구간 패킷이 끊겨 모인 만큼 저장합니다: {clip['path']}")
+        self._start_finalize(clip)
+
+    def _start_finalize(self, clip):
+        threading.Thread(
+            target=self._finalize, args=(clip,), name="ClipMuxer", daemon=True
+        ).start()
+
+    def _trim(self, latest_ts):
+        # pre 구간을 덮는 키프레임이 두 개 이상이면 앞의 GOP는 필요 없음
+        start_ts = latest_ts - self.pre_ticks
+        while len(self._keyframe_ts) >= 2 and self._keyframe_ts[1] <= start_ts:
+            self._keyframe_ts.popleft()
+        first_key = self._keyframe_ts[0] if self._keyframe_ts else latest_ts
+        while self._packets and self._packets[0][0] < first_key:
+            self._pop_packet()
+        # 키프레임 간격이 너무 길면 바이트 상한으로 자른다
+        while self._bytes > self.max_bytes and self._packets:
+            self._pop_packet()
+
+    def _pop_packet(self):
+        timestamp, data, is_keyframe = self._packets.popleft()
+        self._bytes -= len(data)
+        if is_keyframe and self._keyframe_ts and self._keyframe_ts[0] == timestamp:
+            self._keyframe_ts.popleft()
+
+    def _finalize(self, clip):
+        path = clip["path"]
+        if not clip["packets"]:
+            print(f"❌ (PacketRecorder) 키프레임이 없어 클립을 만들 수 없습니다: {path}")
+            return
+        try:
+            mux_h264_clip(path, clip["packets"], self.clock_rate)
+        except Exception as e:
+            print(f"❌ (PacketRecorder) 먹싱 실패 {path}: {e}")
+            return
+        print(f"녹화 완료: {path}")
+        if self.on_clip_ready:
+            self.on_clip_ready(path)
@@ -0,0 +1,82 @@
+# preroll_buffer.py
+# 스마일 직전 구간(pre-roll) 프레임을 JPEG로 압축해 미리 할당한 바이트 링에 보관
+# 원본 bgr24 프레임을 그대로 쌓으면 1080p 150장에 약 900MB가 필요하므로,
+# 바이트 단위로 상한을 두고, 클립을 쓸 때 인코더 스레드가 snapshot()을 디코딩한다
+from collections import deque
+
+import cv2
+
+
+class EncodedPreRollBuffer:
+    """
+    가변 길이 JPEG 프레임을 담는 원형 바이트 버퍼
+    - 메모리 사용량은 capacity_bytes로 고정 (생성 시 한 번만 할당)
+    - 공간이 모자라면 가장 오래된 프레임부터 밀어낸다
+    - max_frames를 주면 pre-roll 구간 길이(프레임 수)도 함께 제한한다
+    """
+
+    def __init__(self, capacity_bytes, max_frames=None, jpeg_quality=85):
+        self.capacity = int(capacity_bytes)
+        self.max_frames = max_frames
+        self.encode_params = [cv2.IMWRITE_JPEG_QUALITY, int(jpeg_quality)]
+
+        self._buf = bytearray(self.capacity)
+        self._view = memoryview(self._buf)
+        self._entries = deque()  # (offset, length), 오래된 순
+        self._head = 0
+        self._used = 0
+        self.oversized = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def append(self, frame_bgr):
+        ok, encoded = cv2.imencode(".jpg", frame_bgr, self.encode_params)
+        if not ok:
+            return False
+        data = encoded.reshape(-1)
+        n = data.shape[0]
+        if n > self.capacity:
+            # 한 장이 링 전체보다 크면 보관할 수 없음
+            self.oversized += 1
+            return False
+
+        if self.max_frames:
+            while len(self._entries) >= self.max_frames:
+                self._evict_oldest()
+
+        start = self._reserve(n)
+        self._view[start : start + n] = data
+        self._entries.append((start, n))
+        self._used += n
+        return True
+
+    def snapshot(self):
+        """
+        현재 pre-roll의 JPEG 바이트 복사본 목록 (오래된 순)
+        링은 계속 덮어쓰이므로 다른 스레드(인코더)에 넘길 때는 복사본을 넘긴다 - 디코딩 없이 memcpy만
+        """
+        return [bytes(self._view[offset : offset + length]) for offset, length in self._entries]
+
+    def _evict_oldest(self):
+        _, length = self._entries.popleft()
+        self._used -= length
+
+    def _reserve(self, n):
+        start = self._head
+        if start + n > self.capacity:
+            # 끝부분 자투리는 버리고 처음으로 되감는다
+            # 자투리에 남은 항목은 지난 바퀴의 것이므로 가장 오래된 항목이다
+            while self._entries and self._entries[0][0] >= start:
+                self._evict_oldest()
+            start = 0
+        end = start + n
+        # 쓰기 구간과 겹치는 (가장 오래된) 항목 제거
+        while self._entries:
+            offset, length = self._entries[0]
+            if offset < end and offset + length > start:
+                self._evict_oldest()
+            else:
+                break
+        self._head = end
+        return start
@@ -0,0 +1,290 @@
+# process_backend.py
+# MediaPipe 얼굴/포즈 추론을 별도 프로세스에서 실행하는 선택형 백엔드 (INFERENCE_BACKEND=process)
+# aiortc 디코딩, asyncio 루프와 GIL을 나눠 쓰지 않도록 모델마다 전용 프로세스를 띄우고,
+# 프레임은 피클링 대신 multiprocessing.shared_memory 버퍼로 넘긴다
+import multiprocessing as mp_proc
+import os
+import threading
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from landmarker_runner import MonotonicTimestamps
+
+# 요청 하나를 기다리는 최대 시간 / 자식 시작(모델 로드) 대기 시간 / 재시작 최소 간격 (초)
+PROCESS_INFERENCE_TIMEOUT = float(os.getenv("PROCESS_INFERENCE_TIMEOUT", "5.0"))
+PROCESS_START_TIMEOUT = float(os.getenv("PROCESS_START_TIMEOUT", "60.0"))
+PROCESS_RESPAWN_INTERVAL = float(os.getenv("PROCESS_RESPAWN_INTERVAL", "5.0"))
+
+# 자식 프로세스 결과를 부모에서 MediaPipe 결과와 같은 속성 이름으로 복원하기 위한 경량 타입
+Landmark = namedtuple("Landmark", "x y z")
+Category = namedtuple("Category", "index score category_name")
+FaceResult = namedtuple("FaceResult", "face_landmarks face_blendshapes")
+PoseResult = namedtuple("PoseResult", "pose_landmarks")
+
+
+class PoseLandmarks:
+    # RSPDetector는 coords (33, 3) 배열을 바로 쓰고, landmark[i].x 접근은 필요할 때만 만든다
+    def __init__(self, coords):
+        self.coords = coords
+
+    @property
+    def landmark(self):
+        return [Landmark(float(x), float(y), float(z)) for x, y, z in self.coords]
+
+
+def _load_model(kind, model_path, running_mode):
+    import mediapipe as mp
+    from mediapipe.tasks.python import vision
+
+    if kind == "face":
+        options = vision.FaceLandmarkerOptions(
+            base_options=mp.tasks.BaseOptions(model_asset_path=model_path),
+            running_mode=getattr(vision.RunningMode, running_mode),
+            output_face_blendshapes=True,
+            num_faces=1,
+        )
+        return vision.FaceLandmarker.create_from_options(options)
+    return mp.solutions.pose.Pose(
+        min_detection_confidence=0.5, min_tracking_confidence=0.5
+    )
+
+
+def _run_model(kind, model, running_mode, frame_rgb, timestamp_ms):
+    import mediapipe as mp
+
+    if kind == "face":
+        mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=frame_rgb)
+        if running_mode == "IMAGE":
+            result = model.detect(mp_image)
+        else:
+            result = model.detect_for_video(mp_image, timestamp_ms)
+        faces = [
+            np.array([[lm.x, lm.y, lm.z] for lm in face], dtype=np.float32)
+            for face in result.face_landmarks
+        ]
+        blendshapes = [
+            ([c.category_name for c in shapes], np.array([c.score for c in shapes], dtype=np.float32))
+            for shapes in (result.face_blendshapes or [])
+        ]
+        return faces, blendshapes
+
+    result = model.process(frame_rgb)
+    if not result.pose_landmarks:
+        return None
+    return np.array(
+        [[lm.x, lm.y, lm.z] for lm in result.pose_landmarks.landmark], dtype=np.float32
+    )
+
+
+def _worker_main(conn, kind, model_path, running_mode):
+    """자식 프로세스 진입점 - (shm 이름, shape, timestamp) 요청을 받아 결과를 돌려준다"""
+    try:
+        model = _load_model(kind, model_path, running_mode)
+    except Exception as e:
+        conn.send(("error", f"모델 로드 실패: {e}"))
+        return
+    conn.send(("ready", None))
+
+    shm = None
+    try:
+        while True:
+            request = conn.recv()
+            if request is None:
+                break
+            shm_name, shape, timestamp_ms = request
+            try:
+                if shm is None or shm.name != shm_name:
+                    if shm is not None:
+                        shm.close()
+                    shm = shared_memory.SharedMemory(name=shm_name)
+                frame_rgb = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+                conn.send(("ok", _run_model(kind, model, running_mode, frame_rgb, timestamp_ms)))
+            except Exception as e:
+                conn.send(("error", str(e)))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        if shm is not None:
+            shm.close()
+        model.close()
+
+
+class MediaPipeProcess:
+    """
+    모델 하나를 미리 로드해 둔 자식 프로세스와 공유 메모리 프레임 슬롯
+    run(frame_rgb)은 프레임을 공유 메모리에 한 번 복사한 뒤 결과가 올 때까지 기다린다 (대기 중에는 GIL을 놓는다)
+    자식이 죽었거나 timeout 안에 답하지 않으면 그 프레임은 실패로 돌리고 자식을 새로 띄운다
+    """
+
+    _ctx = mp_proc.get_context("spawn")
+
+    def __init__(
+        self,
+        kind,
+        model_path=None,
+        running_mode="IMAGE",
+        frame_bytes=1920 * 1080 * 3,
+        timeout=PROCESS_INFERENCE_TIMEOUT,
+    ):
+        self.kind = kind
+        self.model_path = model_path
+        self.running_mode = running_mode
+        self.timeout = timeout
+        self.restarts = 0
+        self._lock = threading.Lock()
+        self._shm = shared_memory.SharedMemory(create=True, size=frame_bytes)
+        self._conn = None
+        self._process = None
+        self._next_spawn_time = 0.0
+        try:
+            self._spawn()
+        except Exception:
+            self.close()
+            raise
+
+    def _spawn(self):
+        self._conn, child_conn = self._ctx.Pipe()
+        self._process = self._ctx.Process(
+            target=_worker_main,
+            args=(child_conn, self.kind, self.model_path, self.running_mode),
+            name=f"mediapipe-{self.kind}",
+            daemon=True,
+        )
+        self._process.start()
+        child_conn.close()
+
+        # 모델 로드는 오래 걸릴 수 있어 요청 timeout과 따로 기다린다
+        if not self._conn.poll(PROCESS_START_TIMEOUT):
+            self._kill()
+            raise RuntimeError(f"{self.kind} 자식 프로세스가 {PROCESS_START_TIMEOUT:.0f}s 안에 준비되지 않았습니다.")
+        try:
+            status, message = self._conn.recv()
+        except EOFError:
+            self._kill()
+            raise RuntimeError(f"{self.kind} 자식 프로세스가 시작 중에 종료됐습니다.")
+        if status != "ready":
+            self._kill()
+            raise RuntimeError(message)
+
+    def _kill(self):
+        if self._process is not None:
+            if self._process.is_alive():
+                self._process.kill()
+            self._process.join(timeout=2.0)
+            self._process = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _respawn(self, reason):
+        # 호출자는 _lock을 잡고 있다 - 계속 죽는 모델로 매 프레임 재시작하지 않도록 간격을 둔다
+        self._kill()
+        now = time.monotonic()
+        if now < self._next_spawn_time:
+            return
+        self._next_spawn_time = now + PROCESS_RESPAWN_INTERVAL
+        self.restarts += 1
+        print(f"⚠️ [ProcessBackend] {self.kind} 자식 프로세스 재시작 ({reason}, {self.restarts}회째)")
+        try:
+            self._spawn()
+        except Exception as e:
+            print(f"❌ [ProcessBackend] {self.kind} 자식 프로세스 재시작 실패: {e}")
+
+    def run(self, frame_rgb, timestamp_ms=None):
+        with self._lock:
+            if self._process is None:
+                self._respawn("이전 재시작 실패")
+                if self._process is None:
+                    raise RuntimeError(f"{self.kind} 자식 프로세스를 사용할 수 없습니다.")
+            if frame_rgb.nbytes > self._shm.size:
+                # 더 큰 해상도가 들어오면 슬롯을 새로 만든다 (자식은 이름이 바뀌면 다시 붙는다)
+                self._shm.close()
+                self._shm.unlink()
+                self._shm = shared_memory.SharedMemory(create=True, size=frame_rgb.nbytes)
+            slot = np.ndarray(frame_rgb.shape, dtype=np.uint8, buffer=self._shm.buf)
+            np.copyto(slot, frame_rgb)
+            try:
+                self._conn.send((self._shm.name, frame_rgb.shape, timestamp_ms))
+                if not self._conn.poll(self.timeout):
+                    self._respawn(f"{self.timeout:.1f}s 응답 없음")
+                    raise RuntimeError(f"{self.kind} 추론 시간 초과")
+                status, payload = self._conn.recv()
+            except (EOFError, OSError) as e:
+                self._respawn(f"연결 끊김: {e!r}")
+                raise RuntimeError(f"{self.kind} 자식 프로세스가 종료됐습니다.")
+        if status != "ok":
+            raise RuntimeError(payload)
+        return payload
+
+    def close(self):
+        if self._conn is not None:
+            try:
+                self._conn.send(None)
+            except (OSError, ValueError):
+                pass
+        if self._process is not None:
+            self._process.join(timeout=2.0)
+            if self._process.is_alive():
+                self._process.terminate()
+            self._process = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        self._shm.close()
+        self._shm.unlink()
+
+
+class ProcessFaceRunner:
+    """FaceLandmarkerRunner와 같은 인터페이스로 자식 프로세스의 FaceLandmarker를 호출"""
+
+    def __init__(self, model_path, running_mode="IMAGE", on_result=None):
+        # LIVE_STREAM 콜백은 프로세스 경계를 넘길 수 없어 VIDEO 모드로 동기 실행한다
+        self.running_mode = "IMAGE" if running_mode.upper() == "IMAGE" else "VIDEO"
+        self.on_result = on_result
+        self._timestamps = MonotonicTimestamps()
+        self._process = MediaPipeProcess("face", model_path, self.running_mode)
+
+    @property
+    def busy(self):
+        return False
+
+    def submit(self, frame_rgb, timestamp_ms=None, on_result=None):
+        on_result = on_result or self.on_result
+        if self.running_mode != "IMAGE":
+            timestamp_ms = self._timestamps.next(timestamp_ms)
+
+        start = time.monotonic()
+        faces, blendshapes = self._process.run(frame_rgb, timestamp_ms)
+        result = FaceResult(
+            face_landmarks=[[Landmark(*row) for row in face.tolist()] for face in faces],
+            face_blendshapes=[
+                [Category(i, float(score), name) for i, (name, score) in enumerate(zip(names, scores))]
+                for names, scores in blendshapes
+            ],
+        )
+        if on_result is not None:
+            try:
+                on_result(result, time.monotonic() - start)
+            except Exception as e:
+                print(f"[FaceLandmarker] on_result 처리 중 오류: {e}")
+        return result
+
+    def close(self):
+        self._process.close()
+
+
+class ProcessPoseDetector:
+    """mp.solutions.pose.Pose.process()와 같은 모양의 결과를 돌려주는 프로세스 포즈 모델"""
+
+    def __init__(self):
+        self._process = MediaPipeProcess("pose")
+
+    def process(self, frame_rgb):
+        coords = self._process.run(frame_rgb)
+        return PoseResult(pose_landmarks=PoseLandmarks(coords) if coords is not None else None)
+
+    def close(self):
+        self._process.close()
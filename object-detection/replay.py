@@ -0,0 +1,348 @@
+# replay.py
+# 라이브 OpenVidu 세션 / MQTT 브로커 / 로봇 카메라 없이 워커 파이프라인을 재생하는 벤치마크
+# 동영상 파일이나 이미지 폴더를 StreamSession의 스마일 감지 / 클립 녹화 / RSP 경로에 그대로 흘려 보내고
+# 단계별 지연 히스토그램(decode, color, resize, detect, rsp, preroll, write ...)과 처리 FPS를 출력한다
+#
+# 사용 예:
+#   python replay.py sample.mp4                       # 최대 속도 (프레임마다 동기 처리)
+#   python replay.py sample.mp4 --realtime            # 실시간 속도 (라이브처럼 우편함 + 추론 풀, 드롭 발생)
+#   python replay.py frames/ --fps 30 --rsp-every 5   # 이미지 폴더, 5초마다 가위바위보 요청
+#   python replay.py sample.mp4 --trigger-every 20 --json result.json
+#   python replay.py sample.mp4 --score-trace traces/sample.jsonl   # 표정 점수 기록 → trigger_engine.py로 튜닝
+#
+# 업로드와 MQTT는 기록만 하는 대체 싱크를 쓰므로 네트워크 없이 CI에서 돌릴 수 있다
+# H.264 RTP 패킷이 없으므로 클립은 항상 decode 경로(JPEG pre-roll + 인코더 스레드)로 녹화된다
+import argparse
+import asyncio
+import glob
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from fractions import Fraction
+
+import av
+import cv2
+import mediapipe as mp
+
+import stream_session
+from frame_worker import StageTimings
+from inference_pool import InferencePool
+from landmarker_runner import FaceLandmarkerRunner
+from process_backend import ProcessFaceRunner, ProcessPoseDetector
+from rsp_cache import RSPResponder
+from rsp_detector import RSPDetector
+from stream_session import StreamSession
+from trigger_engine import ScoreTraceWriter
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+_VIDEO_TIME_BASE = Fraction(1, 90000)
+
+
+def iter_video_frames(path, timings):
+    """동영상 파일 디코딩 (aiortc 디코더처럼 yuv420p VideoFrame을 낸다)"""
+    container = av.open(path)
+    try:
+        stream = container.streams.video[0]
+        stream.thread_type = "AUTO"
+        frames = container.decode(stream)
+        while True:
+            start = time.perf_counter()
+            try:
+                frame = next(frames)
+            except StopIteration:
+                break
+            if frame.format.name != "yuv420p":
+                frame = frame.reformat(format="yuv420p")
+            timings.add("decode", time.perf_counter() - start)
+            yield frame
+    finally:
+        container.close()
+
+
+def iter_image_frames(directory, fps, timings):
+    """이미지 폴더를 파일 이름 순서로 읽어 fps 간격의 PTS를 붙인 yuv420p VideoFrame으로 변환"""
+    paths = sorted(
+        p for p in glob.glob(os.path.join(directory, "*")) if p.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    if not paths:
+        print(f"[Replay] ❌ 이미지가 없습니다: {directory}")
+    for i, path in enumerate(paths):
+        start = time.perf_counter()
+        frame_bgr = cv2.imread(path)
+        if frame_bgr is None:
+            print(f"[Replay] ⚠️ 읽을 수 없는 이미지 건너뜀: {path}")
+            continue
+        frame = av.VideoFrame.from_ndarray(frame_bgr, format="bgr24").reformat(format="yuv420p")
+        frame.pts = int(i / fps / _VIDEO_TIME_BASE)
+        frame.time_base = _VIDEO_TIME_BASE
+        timings.add("decode", time.perf_counter() - start)
+        yield frame
+
+
+class UploadSink:
+    """업로드 대신 완성된 클립 경로만 기록하는 대체 업로드 워커"""
+
+    def __init__(self):
+        self.paths = []
+
+    async def run(self, queue):
+        while True:
+            path = await queue.get()
+            if path is None:
+                break
+            self.paths.append(path)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            print(f"[Replay] 📦 업로드 대체 싱크: {path} ({size / 1024:.0f} KB)")
+            queue.task_done()
+
+
+class MQTTSink:
+    """MQTT 브로커 대신 발행 메시지를 기록"""
+
+    def __init__(self):
+        self.messages = []
+        self._lock = threading.Lock()
+
+    def publish(self, topic, payload):
+        with self._lock:
+            self.messages.append((topic, payload))
+        print(f"[Replay] 📨 MQTT 대체 싱크 {topic}: {payload}")
+
+
+class ReplayRunner:
+    def __init__(self, args, session, responder, mqtt_sink):
+        self.args = args
+        self.session = session
+        self.responder = responder
+        self.mqtt_sink = mqtt_sink
+        self.frames_fed = 0
+        self.rsp_threads = []
+
+        self._first_media_time = None
+        self._next_rsp_time = args.rsp_every if args.rsp_every > 0 else None
+        self._armed_for = None
+        self._next_trigger_time = args.trigger_every if args.trigger_every > 0 else None
+
+    def media_time(self, frame):
+        media_time = frame.time if frame.time is not None else self.frames_fed / self.args.fps
+        if self._first_media_time is None:
+            self._first_media_time = media_time
+        return media_time - self._first_media_time
+
+    def feed(self, frames):
+        """프레임 공급 루프 (스레드에서 실행)"""
+        started = time.monotonic()
+        for frame in frames:
+            media_time = self.media_time(frame)
+
+            if self.args.realtime:
+                # 원본 PTS 간격대로 (speed 배속) 우편함에 넣는다
+                delay = started + media_time / self.args.speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+            self._simulate_requests(media_time)
+            self.frames_fed += 1
+
+            if self.args.realtime:
+                self.session.mailbox.put(frame)
+            else:
+                # 최대 속도: 감지 주기 / 모션 게이트 / ROI 갱신을 벽시계가 아니라 영상 시각으로 (라이브와 같은 프레임에서 감지)
+                self.session.process_frame(frame, now=started + media_time)
+
+            if self.args.max_frames and self.frames_fed >= self.args.max_frames:
+                break
+
+        if self.args.realtime:
+            # 남은 프레임 처리 대기
+            while self.session.mailbox.pending:
+                time.sleep(0.01)
+        for thread in self.rsp_threads:
+            thread.join()
+
+    def _simulate_requests(self, media_time):
+        if self._next_trigger_time is not None and media_time >= self._next_trigger_time:
+            # 녹화 경로 벤치마크용 강제 스마일 트리거
+            with self.session.smile_lock:
+                self.session.pending_smile_trigger = True
+                self.session.last_smile_trigger_time = time.time()
+            self._next_trigger_time += self.args.trigger_every
+
+        if self._next_rsp_time is None:
+            return
+        arm_time = self._next_rsp_time - self.args.rsp_arm_lead
+        if media_time >= arm_time and self._armed_for != self._next_rsp_time:
+            # 백엔드가 카운트다운 전에 보내는 "arm"과 같은 역할
+            self.session.pose_cache.arm()
+            self._armed_for = self._next_rsp_time
+        if media_time >= self._next_rsp_time:
+            request_time = self._next_rsp_time
+            if self.args.realtime:
+                thread = threading.Thread(target=self._respond, args=(request_time,), daemon=True)
+                thread.start()
+                self.rsp_threads.append(thread)
+            else:
+                self._respond(request_time)
+            self._next_rsp_time += self.args.rsp_every
+
+    def _respond(self, request_time):
+        start = time.perf_counter()
+        rsp_result, confidence, samples = self.responder.respond(self.session)
+        self.session.stage_timings.add("rsp_request", time.perf_counter() - start)
+        self.mqtt_sink.publish(
+            "rsp_res",
+            json.dumps(
+                {
+                    "response": "RSP_DETECT_RESULT",
+                    "result": rsp_result,
+                    "confidence": round(confidence, 3),
+                    "samples": samples,
+                    "session_id": self.session.session_id,
+                    "media_time": round(request_time, 3),
+                }
+            ),
+        )
+
+
+def build_models(args):
+    if args.backend == "process":
+        face_runner = ProcessFaceRunner(args.face_model, running_mode=args.running_mode)
+        pose_factory = ProcessPoseDetector
+    else:
+        face_runner = FaceLandmarkerRunner(args.face_model, running_mode=args.running_mode)
+
+        def pose_factory():
+            return mp.solutions.pose.Pose(
+                min_detection_confidence=0.5, min_tracking_confidence=0.5
+            )
+
+    pool = InferencePool(args.pool_size, pose_factory=pose_factory)
+    return face_runner, pool
+
+
+def finish_open_clip(session):
+    """재생이 끝났는데 녹화 중이면 지금까지 넘긴 프레임으로 클립을 닫는다 (인코딩이 끝나면 업로드 싱크로 감)"""
+    session.finish_clip()
+
+
+async def replay(args):
+    main_loop = asyncio.get_running_loop()
+    upload_queue = asyncio.Queue()
+    upload_sink = UploadSink()
+    upload_task = asyncio.create_task(upload_sink.run(upload_queue))
+    mqtt_sink = MQTTSink()
+
+    clip_dir = args.clip_dir or tempfile.mkdtemp(prefix="replay_clips_")
+    stream_session.VIDEO_DIR = clip_dir
+
+    timings = StageTimings()
+    face_runner, pool = build_models(args)
+    responder = RSPResponder(pool, RSPDetector())
+    session = StreamSession(
+        "replay",
+        upload_queue=upload_queue,
+        main_loop=main_loop,
+        face_runner=face_runner,
+        pose_sampler=responder.classify_view,
+    )
+    session.stage_timings = timings
+    if args.score_trace:
+        session.score_trace = ScoreTraceWriter(
+            args.score_trace, session.expression_scorer.names, session.expression_scorer.thresholds
+        )
+    pool.register(session)
+
+    if os.path.isdir(args.source):
+        frames = iter_image_frames(args.source, args.fps, timings)
+    else:
+        frames = iter_video_frames(args.source, timings)
+
+    runner = ReplayRunner(args, session, responder, mqtt_sink)
+    mode = f"실시간 x{args.speed:g}" if args.realtime else "최대 속도"
+    print(f"[Replay] ▶ {args.source} ({mode}, {args.running_mode}, backend: {args.backend})")
+
+    if args.realtime:
+        pool.start()
+    wall_start = time.monotonic()
+    try:
+        await asyncio.to_thread(runner.feed, frames)
+    finally:
+        wall = time.monotonic() - wall_start
+        pool.unregister(session)
+        pool.close()
+        finish_open_clip(session)
+        # 인코더 스레드가 남은 클립을 마저 쓰는 동안 업로드 큐 전달이 돌 수 있도록 스레드에서 닫는다
+        await asyncio.to_thread(session.close)
+        await upload_queue.put(None)
+        await upload_task
+
+    frame_summary = timings.summary("frame")
+    processed = frame_summary["count"] if frame_summary else 0
+    summary = {
+        "source": args.source,
+        "mode": "realtime" if args.realtime else "full_speed",
+        "frames_fed": runner.frames_fed,
+        "frames_processed": processed,
+        "frames_dropped": session.mailbox.dropped,
+        "wall_seconds": wall,
+        "sustained_fps": processed / wall if wall > 0 else 0.0,
+        "detections": session.detection_cadence.detections,
+        "motion_gate_skips": session.motion_gate.skipped,
+        "roi_crops": session.face_roi.crops,
+        "roi_fallbacks": session.face_roi.fallbacks,
+        "clips": upload_sink.paths,
+        "rsp_responses": [json.loads(payload) for _, payload in mqtt_sink.messages],
+        "stages": {stage: timings.summary(stage) for stage in list(timings.samples)},
+    }
+
+    print()
+    print(
+        f"[Replay] 공급 {runner.frames_fed}장 / 처리 {processed}장 / 드롭 {session.mailbox.dropped}장, "
+        f"{wall:.1f}s, 처리 {summary['sustained_fps']:.1f} fps, 감지 {summary['detections']}회 "
+        f"(움직임 게이트 생략 {summary['motion_gate_skips']}회), "
+        f"클립 {len(upload_sink.paths)}개"
+    )
+    print(timings.report())
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        print(f"[Replay] 결과 저장: {args.json}")
+
+    if not args.clip_dir and not args.keep_clips:
+        shutil.rmtree(clip_dir, ignore_errors=True)
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="워커 파이프라인 오프라인 재생 / 벤치마크")
+    parser.add_argument("source", help="동영상 파일 또는 이미지 폴더")
+    parser.add_argument("--realtime", action="store_true", help="원본 PTS 속도로 재생 (기본: 최대 속도)")
+    parser.add_argument("--speed", type=float, default=1.0, help="--realtime 재생 배속")
+    parser.add_argument("--fps", type=float, default=stream_session.FPS, help="이미지 폴더의 프레임 레이트")
+    parser.add_argument("--max-frames", type=int, default=0, help="처리할 최대 프레임 수 (0 = 전체)")
+    parser.add_argument(
+        "--running-mode",
+        default=os.getenv("FACE_RUNNING_MODE", "IMAGE").upper(),
+        choices=["IMAGE", "VIDEO", "LIVE_STREAM"],
+    )
+    parser.add_argument("--backend", default="thread", choices=["thread", "process"])
+    parser.add_argument("--pool-size", type=int, default=1, help="--realtime 추론 스레드 수")
+    parser.add_argument("--face-model", default="face_landmarker.task")
+    parser.add_argument("--rsp-every", type=float, default=0.0, help="N초(영상 시간)마다 가위바위보 요청")
+    parser.add_argument("--rsp-arm-lead", type=float, default=3.0, help="요청 몇 초 전에 arm 할지")
+    parser.add_argument("--trigger-every", type=float, default=0.0, help="N초마다 스마일 녹화를 강제로 시작")
+    parser.add_argument("--clip-dir", default=None, help="클립 저장 폴더 (기본: 임시 폴더, 끝나면 삭제)")
+    parser.add_argument("--keep-clips", action="store_true", help="임시 폴더의 클립을 지우지 않음")
+    parser.add_argument("--json", default=None, help="요약 결과를 JSON 파일로 저장")
+    parser.add_argument(
+        "--score-trace", default=None, help="표정 점수 트레이스(JSONL) 저장 경로 (trigger_engine.py 입력)"
+    )
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(replay(parse_args()))
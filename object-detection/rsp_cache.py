@@ -0,0 +1,129 @@
+# rsp_cache.py
+# 가위바위보 판정 캐시
+# 게임이 준비(arm)된 동안 추론 스레드가 낮은 주기로 포즈를 분류해 최근 결과를 모아 두고,
+# rsp_req가 오면 포즈 추론을 새로 돌리지 않고 최근 창의 다수결로 바로 응답한다
+import threading
+import time
+from collections import Counter, deque
+
+RSP_LABELS = ("Rock", "Paper", "Scissors")
+
+
+class RSPVoteCache:
+    """
+    window_seconds: 다수결에 쓰는 최근 구간
+    interval_seconds: 준비 상태에서 포즈를 분류하는 최소 간격
+    arm_seconds: arm() 한 번으로 유지되는 준비 시간
+    min_samples: 이보다 적게 모였으면 vote()는 None (호출 측이 즉석 추론으로 대체)
+    """
+
+    def __init__(self, window_seconds=1.0, interval_seconds=0.2, arm_seconds=15.0, min_samples=2):
+        self.window_seconds = window_seconds
+        self.interval_seconds = interval_seconds
+        self.arm_seconds = arm_seconds
+        self.min_samples = min_samples
+
+        self._samples = deque()  # (시각, 라벨)
+        self._armed_until = 0.0
+        self._last_sample_time = 0.0
+        self._lock = threading.Lock()
+
+    def arm(self, seconds=None, now=None):
+        now = time.monotonic() if now is None else now
+        seconds = self.arm_seconds if seconds is None else seconds
+        with self._lock:
+            self._armed_until = max(self._armed_until, now + seconds)
+
+    def armed(self, now=None):
+        now = time.monotonic() if now is None else now
+        return now < self._armed_until
+
+    def due(self, now=None):
+        """준비 상태이고 마지막 분류 후 interval_seconds가 지났는지"""
+        now = time.monotonic() if now is None else now
+        return self.armed(now) and now - self._last_sample_time >= self.interval_seconds
+
+    def add(self, label, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._last_sample_time = now
+            self._samples.append((now, label))
+            self._expire(now)
+
+    def vote(self, now=None):
+        """
+        최근 창의 다수결 (라벨, 신뢰도, 표본 수)
+        가위/바위/보로 분류된 표본이 있으면 그 중에서 고르고, 없으면 Unknown / NoLandmarks 중 다수
+        신뢰도 = 선택된 라벨 표본 수 / 창 안의 전체 표본 수
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._expire(now)
+            labels = [label for _, label in self._samples]
+        if len(labels) < self.min_samples:
+            return None
+
+        counts = Counter(labels)
+        decided = [(counts[label], label) for label in RSP_LABELS if counts[label]]
+        if decided:
+            count, label = max(decided)
+        else:
+            label, count = counts.most_common(1)[0]
+        return label, count / len(labels), len(labels)
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+    def _expire(self, now):
+        while self._samples and now - self._samples[0][0] > self.window_seconds:
+            self._samples.popleft()
+
+
+class RSPResponder:
+    """
+    rsp_req 응답기 (worker_server와 replay가 같이 씀)
+    pose_source: 포즈 모델을 빌려 주는 pose() 컨텍스트를 가진 객체 (InferencePool)
+    """
+
+    def __init__(self, pose_source, detector):
+        self.pose_source = pose_source
+        self.detector = detector
+
+    def classify_view(self, view):
+        """축소 RGB 프레임 하나의 가위바위보 판정 (추론 스레드의 판정 캐시와 즉석 요청이 같이 씀)"""
+        try:
+            with self.pose_source.pose() as pose_detector:
+                pose_results = pose_detector.process(view.image)
+            if pose_results.pose_landmarks:
+                return self.detector.classify_pose(pose_results.pose_landmarks)
+            return "NoLandmarks"
+        except Exception as e:
+            print(f"RSP Detector 실행 중 오류: {e}")
+            return "Error"
+
+    def respond(self, session):
+        """
+        (결과, 신뢰도, 표본 수)를 돌려준다
+        준비 구간에 모아 둔 판정이 있으면 다수결로 바로 응답하고, 없으면 마지막 프레임으로 즉석 추론
+        """
+        if session is None:
+            return "NoFrame", 0.0, 0
+
+        # 요청이 온 뒤에도 한동안 캐시를 유지해 연속 게임은 바로 응답
+        session.pose_cache.arm()
+        vote = session.pose_cache.vote()
+        if vote is not None:
+            rsp_status, confidence, samples = vote
+            print(
+                f"RSP Detector 캐시 응답 ({session.session_id}): {rsp_status} "
+                f"(신뢰도 {confidence:.2f}, 표본 {samples}개)"
+            )
+            return vote
+
+        view = session.inference_view_for_rsp()
+        if view is None:
+            return "NoFrame", 0.0, 0
+        rsp_status = self.classify_view(view)
+        print(f"RSP Detector 실행됨 ({session.session_id}): {rsp_status}")
+        return rsp_status, 1.0, 1
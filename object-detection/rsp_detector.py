@@ -0,0 +1,114 @@
+# rsp_detector.py
+# 포즈 랜드마크로 가위바위보 판정
+# 랜드마크를 (N, 33, 3) 배열로 모아 관절 각도와 x/z 오프셋을 한 번에 계산하므로
+# 실시간 한 프레임(classify_pose)과 시간 창 / 녹화 데이터셋 일괄 판정(classify_batch)이 같은 코드를 쓴다
+import numpy as np
+
+# mp.solutions.pose.PoseLandmark 인덱스 (오프라인 분석에서 mediapipe 없이 쓰도록 고정)
+LEFT_SHOULDER = 11
+RIGHT_SHOULDER = 12
+LEFT_ELBOW = 13
+RIGHT_ELBOW = 14
+LEFT_WRIST = 15
+RIGHT_WRIST = 16
+LEFT_HIP = 23
+RIGHT_HIP = 24
+NUM_POSE_LANDMARKS = 33
+
+# 각도를 구할 (a, b, c) 관절 - b에서의 끼인각
+# 왼팔 꿈치, 오른팔 꿈치, 왼쪽 어깨, 오른쪽 어깨 순
+_ANGLE_JOINTS = np.array(
+    [
+        [LEFT_SHOULDER, LEFT_ELBOW, LEFT_WRIST],
+        [RIGHT_SHOULDER, RIGHT_ELBOW, RIGHT_WRIST],
+        [LEFT_HIP, LEFT_SHOULDER, LEFT_ELBOW],
+        [RIGHT_HIP, RIGHT_SHOULDER, RIGHT_ELBOW],
+    ]
+)
+_WRISTS = [LEFT_WRIST, RIGHT_WRIST]
+_SHOULDERS = [LEFT_SHOULDER, RIGHT_SHOULDER]
+
+
+def landmarks_to_array(landmarks):
+    """pose_landmarks (landmark[i].x/y/z) → (33, 3) float64 배열"""
+    coords = getattr(landmarks, "coords", None)
+    if coords is not None:
+        return np.asarray(coords, dtype=np.float64)
+    return np.array([[lm.x, lm.y, lm.z] for lm in landmarks.landmark], dtype=np.float64)
+
+
+def joint_angles(a, b, c):
+    """
+    b에서의 끼인각(도), 입력은 (..., 3) 배열
+    벡터 길이가 0이면 0도 (기존 calculate_angle과 동일)
+    """
+    ba = a - b
+    bc = c - b
+    dot = np.einsum("...i,...i->...", ba, bc)
+    norms = np.linalg.norm(ba, axis=-1) * np.linalg.norm(bc, axis=-1)
+    cosine = np.divide(dot, norms, out=np.ones_like(dot), where=norms != 0)
+    return np.degrees(np.arccos(np.clip(cosine, -1.0, 1.0)))
+
+
+class RSPDetector:
+    """
+    임계값은 생성자에서 바꿀 수 있어 녹화 데이터셋으로 오프라인 튜닝할 때 그대로 쓴다
+    """
+
+    LABELS = np.array(["Unknown", "Rock", "Paper", "Scissors"], dtype=object)
+
+    def __init__(
+        self,
+        elbow_straight_th=90.0,
+        shoulder_rock_th=45.0,
+        x_width_th=0.15,
+        z_forward_th=-0.15,
+    ):
+        self.elbow_straight_th = elbow_straight_th
+        self.shoulder_rock_th = shoulder_rock_th
+        self.x_width_th = x_width_th
+        self.z_forward_th = z_forward_th
+
+    def features(self, landmarks):
+        """
+        (N, 33, 3) → 판정에 쓰는 특징 dict (각 값은 (N, 2) 배열, 열 0 = 왼쪽, 1 = 오른쪽)
+        elbow_angle, shoulder_angle, x_diff(|손목 x - 어깨 x|), z_diff(손목 z - 어깨 z)
+        """
+        landmarks = np.asarray(landmarks, dtype=np.float64)
+        joints = landmarks[:, _ANGLE_JOINTS]  # (N, 4, 3, 3)
+        angles = joint_angles(joints[:, :, 0], joints[:, :, 1], joints[:, :, 2])
+        offsets = landmarks[:, _WRISTS] - landmarks[:, _SHOULDERS]  # (N, 2, 3)
+        return {
+            "elbow_angle": angles[:, 0:2],
+            "shoulder_angle": angles[:, 2:4],
+            "x_diff": np.abs(offsets[:, :, 0]),
+            "z_diff": offsets[:, :, 2],
+        }
+
+    def classify_codes(self, landmarks):
+        """(N, 33, 3) → LABELS 인덱스 (N,) 배열"""
+        f = self.features(landmarks)
+
+        is_rock = np.all(f["shoulder_angle"] < self.shoulder_rock_th, axis=1)
+        arms_straight = np.all(f["elbow_angle"] > self.elbow_straight_th, axis=1)
+        is_wide = np.all(f["x_diff"] > self.x_width_th, axis=1)
+        is_narrow = np.all(f["x_diff"] < self.x_width_th, axis=1)
+        is_forward = np.all(f["z_diff"] < self.z_forward_th, axis=1)
+
+        # 우선순위: 바위 > 보 > 가위 > Unknown
+        codes = np.zeros(len(is_rock), dtype=np.int8)
+        codes[arms_straight & is_narrow & is_forward] = 3
+        codes[arms_straight & is_wide] = 2
+        codes[is_rock] = 1
+        return codes
+
+    def classify_batch(self, landmarks):
+        """(N, 33, 3) 랜드마크 배열 → 라벨 N개 ("Rock" / "Paper" / "Scissors" / "Unknown")"""
+        landmarks = np.asarray(landmarks, dtype=np.float64)
+        if landmarks.ndim == 2:
+            landmarks = landmarks[None]
+        return self.LABELS[self.classify_codes(landmarks)].tolist()
+
+    def classify_pose(self, landmarks):
+        """MediaPipe pose_landmarks 하나 판정 (실시간 경로)"""
+        return self.classify_batch(landmarks_to_array(landmarks)[None])[0]
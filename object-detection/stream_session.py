@@ -0,0 +1,408 @@
+# stream_session.py
+# 로봇 스트림(세션) 하나의 스마일 감지 / 클립 녹화 / RSP 상태
+# 예전 worker_server.py의 모듈 전역 상태(pre_buffer, is_saving, video_writer, last_frame_for_rsp ...)를 세션별로 분리
+# decode 경로 클립 인코딩은 clip_recorder.ClipRecorder의 인코더 스레드가 맡는다
+import asyncio
+import os
+import re
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime
+
+from clip_recorder import ClipRecorder
+from detection_cadence import DetectionCadence
+from expression_scorer import ExpressionScorer, load_expression_triggers
+from face_roi import FaceROI
+from frame_pool import FrameBufferPool
+from inference_frame import InferenceResizer
+from frame_worker import FrameStats, LatestFrameMailbox
+from landmarker_runner import MonotonicTimestamps, frame_timestamp_ms
+from metrics import CLIPS_RECORDED, MOTION_GATE_SKIPS, SMILE_TRIGGERS
+from motion_gate import MotionGate
+from packet_recorder import PacketClipRecorder
+from preroll_buffer import EncodedPreRollBuffer
+from rsp_cache import RSPVoteCache
+from trigger_engine import ScoreTraceWriter, TriggerEngine
+
+COOLDOWN_SECONDS = 3.0
+SAVING_PRE_POST_SECONDS = 5.0
+FPS = 30.0
+VIDEO_DIR = "smile_videos"
+
+# 녹화를 시작할 표정 목록 (expression_scorer.py 참고, 비워 두면 양쪽 입꼬리 0.3 스마일)
+EXPRESSION_TRIGGERS = load_expression_triggers(os.getenv("EXPRESSION_TRIGGERS"))
+
+# 표정 점수 트레이스 기록 폴더 (설정하면 세션마다 JSONL 하나, trigger_engine.py로 파라미터 비교)
+SCORE_TRACE_DIR = os.getenv("SCORE_TRACE_DIR", "")
+
+# 감지 주기: 기본 N프레임마다 1회, 최대 간격은 짧은 미소를 놓치지 않는 선으로 제한
+DETECT_BASE_STRIDE = int(os.getenv("DETECT_BASE_STRIDE", "3"))
+DETECT_MAX_GAP_SECONDS = float(os.getenv("DETECT_MAX_GAP_SECONDS", "0.25"))
+DETECT_NEAR_RATIO = float(os.getenv("DETECT_NEAR_RATIO", "0.7"))
+
+# pre-roll 버퍼: JPEG로 압축해 바이트 단위로 상한을 둔다 (1080p 기준 5초 ≈ 40MB)
+PRE_BUFFER_MAX_BYTES = int(os.getenv("PRE_BUFFER_MAX_BYTES", str(64 * 1024 * 1024)))
+PRE_BUFFER_JPEG_QUALITY = int(os.getenv("PRE_BUFFER_JPEG_QUALITY", "85"))
+
+# 클립 녹화 방식: packet = 수신 H.264 패킷을 그대로 faststart MP4로 먹싱, decode = 디코딩 후 재인코딩
+# packet 모드라도 H.264가 아닌 스트림이 오면 decode 방식으로 대체된다
+CLIP_RECORDING_MODE = os.getenv("CLIP_RECORDING_MODE", "packet").lower()
+PACKET_BUFFER_MAX_BYTES = int(
+    os.getenv("PACKET_BUFFER_MAX_BYTES", str(32 * 1024 * 1024))
+)
+
+# 디코딩 RGB 버퍼 풀 크기: 마지막 프레임을 RSP 요청이 읽는 동안 덮어쓰지 않도록 여유를 둔다
+FRAME_POOL_SIZE = int(os.getenv("FRAME_POOL_SIZE", "4"))
+
+# 모델 입력 최대 너비 (0이면 원본 해상도), 녹화는 항상 원본 해상도
+INFERENCE_MAX_WIDTH = int(os.getenv("INFERENCE_MAX_WIDTH", "640"))
+
+# 가위바위보 판정 캐시: 준비(arm) 후 RSP_ARM_SECONDS 동안 RSP_SAMPLE_INTERVAL_SECONDS마다 포즈 분류,
+# 요청 시 최근 RSP_VOTE_WINDOW_SECONDS 구간 다수결로 응답
+RSP_ARM_SECONDS = float(os.getenv("RSP_ARM_SECONDS", "15"))
+RSP_SAMPLE_INTERVAL_SECONDS = float(os.getenv("RSP_SAMPLE_INTERVAL_SECONDS", "0.2"))
+RSP_VOTE_WINDOW_SECONDS = float(os.getenv("RSP_VOTE_WINDOW_SECONDS", "1.0"))
+
+# 움직임 게이트: 장면이 정지해 있고 마지막 감지에서 얼굴이 없었으면 FaceLandmarker 호출을 건너뜀
+# MOTION_REFRESH_SECONDS마다 한 번은 강제로 감지
+MOTION_GATE_ENABLED = os.getenv("MOTION_GATE_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+MOTION_SAMPLE_WIDTH = int(os.getenv("MOTION_SAMPLE_WIDTH", "64"))
+MOTION_PIXEL_THRESHOLD = int(os.getenv("MOTION_PIXEL_THRESHOLD", "16"))
+MOTION_MIN_FRACTION = float(os.getenv("MOTION_MIN_FRACTION", "0.01"))
+MOTION_REFRESH_SECONDS = float(os.getenv("MOTION_REFRESH_SECONDS", "2.0"))
+
+# 얼굴 ROI: 얼굴을 찾은 뒤에는 직전 랜드마크 주변(얼굴 크기 x FACE_ROI_EXPAND)만 잘라 감지
+# 얼굴을 놓치거나 영역 가장자리에 걸리면, 그리고 FACE_ROI_REFRESH_SECONDS마다 전체 프레임 감지
+# IMAGE 모드에서만 쓴다 - VIDEO / LIVE_STREAM은 MediaPipe가 프레임 사이 얼굴 영역을 직접 추적하므로
+# 크기와 위치가 바뀌는 잘라낸 입력을 넣으면 그 추적이 깨지고 (전체 ↔ 잘라낸 입력 전환마다 리사이즈 버퍼도 새로 잡힘)
+FACE_ROI_ENABLED = os.getenv("FACE_ROI_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+FACE_ROI_EXPAND = float(os.getenv("FACE_ROI_EXPAND", "2.0"))
+FACE_ROI_REFRESH_SECONDS = float(os.getenv("FACE_ROI_REFRESH_SECONDS", "2.0"))
+
+# 세션별 감지 시점을 황금비 간격으로 흩어 여러 스트림이 같은 프레임에 몰리지 않게 함
+_PHASE_STEP = 0.618
+
+
+def new_clip_path(session_id, idx):
+    # 한 워커가 여러 세션을 받으므로 같은 초에 트리거돼도 겹치지 않게 세션 id를 넣는다
+    if not os.path.exists(VIDEO_DIR):
+        os.makedirs(VIDEO_DIR)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    safe_session = re.sub(r"[^A-Za-z0-9_-]", "_", str(session_id))
+    return f"{VIDEO_DIR}/smile_{safe_session}_{timestamp}_{idx}.mp4"
+
+
+class StreamSession:
+    """
+    스트림 하나의 상태 머신
+    process_frame()은 추론 풀 스레드에서, on_face_result()는 감지 직후 또는 LIVE_STREAM 콜백 스레드에서 호출된다
+    face_runner: VIDEO / LIVE_STREAM 모드에서 이 세션 전용 랜드마커 (None이면 풀의 공유 인스턴스 사용)
+    pose_sampler: InferenceView를 받아 가위바위보 라벨을 돌려주는 함수 (None이면 판정 캐시를 채우지 않음)
+    clip_recorder: 세션들이 나눠 쓰는 인코더 스레드 풀 (None이면 세션 전용 스레드 하나를 만든다)
+    """
+
+    def __init__(
+        self,
+        session_id,
+        index=0,
+        upload_queue=None,
+        main_loop=None,
+        face_runner=None,
+        pose_sampler=None,
+        clip_recorder=None,
+    ):
+        self.session_id = session_id
+        self.upload_queue = upload_queue
+        self.main_loop = main_loop
+        self.face_runner = face_runner
+        self.pose_sampler = pose_sampler
+        self.publisher_id = None  # 이 슬롯에 배정된 OpenVidu 퍼블리셔 connectionId (없으면 빈 슬롯)
+        self.pose_cache = RSPVoteCache(
+            window_seconds=RSP_VOTE_WINDOW_SECONDS,
+            interval_seconds=RSP_SAMPLE_INTERVAL_SECONDS,
+            arm_seconds=RSP_ARM_SECONDS,
+        )
+
+        self.mailbox = LatestFrameMailbox()
+        self.stats = FrameStats(session_id)
+        self.frame_pool = FrameBufferPool(FRAME_POOL_SIZE)
+        self.resizer = InferenceResizer(INFERENCE_MAX_WIDTH, count=FRAME_POOL_SIZE)
+        # 프레임 PTS → 세션 타임라인 (재구독 / PTS 되감김에도 단조 증가, 트리거 판정과 랜드마커가 같이 씀)
+        self.timestamps = MonotonicTimestamps()
+
+        self.pre_buffer = EncodedPreRollBuffer(
+            PRE_BUFFER_MAX_BYTES,
+            max_frames=int(FPS * SAVING_PRE_POST_SECONDS),
+            jpeg_quality=PRE_BUFFER_JPEG_QUALITY,
+        )
+        self.packet_recorder = (
+            PacketClipRecorder(
+                pre_seconds=SAVING_PRE_POST_SECONDS,
+                post_seconds=SAVING_PRE_POST_SECONDS,
+                max_bytes=PACKET_BUFFER_MAX_BYTES,
+                on_clip_ready=self.submit_upload,
+            )
+            if CLIP_RECORDING_MODE == "packet"
+            else None
+        )
+        self.detection_cadence = DetectionCadence(
+            fps=FPS,
+            threshold=1.0,  # 표정 점수는 임계값 대비 비율(closeness)로 넘긴다
+            base_stride=DETECT_BASE_STRIDE,
+            max_gap_seconds=DETECT_MAX_GAP_SECONDS,
+            near_ratio=DETECT_NEAR_RATIO,
+            phase=(index * _PHASE_STEP) % 1.0,
+        )
+        self.motion_gate = MotionGate(
+            sample_width=MOTION_SAMPLE_WIDTH,
+            pixel_threshold=MOTION_PIXEL_THRESHOLD,
+            motion_fraction=MOTION_MIN_FRACTION,
+            refresh_seconds=MOTION_REFRESH_SECONDS,
+            enabled=MOTION_GATE_ENABLED,
+        )
+        self.face_roi = FaceROI(
+            expand=FACE_ROI_EXPAND,
+            refresh_seconds=FACE_ROI_REFRESH_SECONDS,
+            count=FRAME_POOL_SIZE,
+            enabled=FACE_ROI_ENABLED,
+        )
+        self.expression_scorer = ExpressionScorer(EXPRESSION_TRIGGERS)
+        # 한 프레임 임계값 대신 평활 + 히스테리시스 + 최소 유지 시간으로 판정
+        self.trigger_engine = TriggerEngine(
+            self.expression_scorer.names, self.expression_scorer.thresholds
+        )
+        self.score_trace = (
+            ScoreTraceWriter(
+                os.path.join(
+                    SCORE_TRACE_DIR,
+                    f"{session_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl",
+                ),
+                self.expression_scorer.names,
+                self.expression_scorer.thresholds,
+            )
+            if SCORE_TRACE_DIR
+            else None
+        )
+        self.last_face_time = 0.0  # 마지막으로 감지에 넘긴 프레임의 영상 시각 (초)
+        self.last_trigger_expression = None
+        self.face_in_view = None  # 마지막 감지 결과에 얼굴이 있었는지 (None = 아직 감지 전)
+
+        self._owns_clip_recorder = clip_recorder is None
+        self.clip_recorder = clip_recorder or ClipRecorder(threads=1)
+        self.clip_job = None  # 녹화 중인 decode 경로 클립 (인코더 스레드로 프레임 참조만 넘김)
+
+        self.is_saving = False
+        self.post_frames_remaining = 0
+        self.last_smile_trigger_time = 0.0
+        self.pending_smile_trigger = False
+        self.smile_lock = threading.Lock()
+        # StageTimings(replay) / StageMetrics(METRICS_ENABLED)를 붙이면 process_frame 단계별 시간을 기록
+        self.stage_timings = None
+        self.last_frame_for_rsp = None  # RGB 원본 (풀 버퍼)
+        self.last_inference_view = None  # 같은 프레임을 축소한 InferenceView (감지한 프레임만)
+        self.last_face_view = None  # 마지막 얼굴 감지에 쓴 InferenceView (랜드마크 → 원본 좌표 변환용)
+        self.frame_now = None  # process_frame에 넘긴 now (None이면 단조 시계)
+
+    def submit_upload(self, path):
+        if self.upload_queue is None or self.main_loop is None:
+            print(f"Upload task dropped (업로드 큐 없음): {path}")
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.upload_queue.put(path), self.main_loop)
+            CLIPS_RECORDED.labels(self.session_id).inc()
+            print(f"Upload task submitted to queue: {path}")
+        except Exception as e:
+            print(f"Failed to submit upload task to queue: {e}")
+
+    def inference_view_for_rsp(self):
+        """RSP 포즈 입력 - 이번 프레임을 이미 축소했으면 재사용, 아니면 새 배열로 축소"""
+        view = self.last_inference_view
+        if view is not None:
+            return view
+        frame_rgb = self.last_frame_for_rsp
+        if frame_rgb is None:
+            return None
+        return self.resizer.resize_copy(frame_rgb)
+
+    def _motion_allows(self, frame_rgb, now=None):
+        """빈 방(직전 결과 얼굴 없음)에서 장면이 그대로면 이번 감지를 건너뛴다"""
+        with self._stage("motion"):
+            allowed = self.motion_gate.allow(frame_rgb, idle=self.face_in_view is False, now=now)
+        if not allowed:
+            MOTION_GATE_SKIPS.labels(self.session_id).inc()
+        return allowed
+
+    def reset_stream(self):
+        """재구독으로 새 트랙을 받기 시작할 때 호출 - 새 PTS를 기존 타임라인 뒤에 이어 붙인다"""
+        self.timestamps.reset()
+        if self.packet_recorder is not None:
+            self.packet_recorder.reset_stream()
+
+    def close(self):
+        self.mailbox.close()
+        if self.score_trace is not None:
+            self.score_trace.close()
+        self.finish_clip()
+        if self._owns_clip_recorder:
+            self.clip_recorder.close()
+        if self.face_runner is not None:
+            self.face_runner.close()
+            self.face_runner = None
+
+    def on_face_result(self, face_result, detect_cost):
+        """
+        표정(스마일 등) 트리거 상태 머신 입력
+        IMAGE / VIDEO 모드는 감지 직후, LIVE_STREAM 모드는 MediaPipe 콜백 스레드에서 호출된다
+        """
+        # 감지 주기는 process_frame과 같은 시계로 (replay 최대 속도에서는 영상 시각)
+        now = self.frame_now
+        self.detection_cadence.record_detection(detect_cost, now=now)
+        self.face_in_view = bool(face_result and face_result.face_landmarks)
+        if self.last_face_view is not None:
+            # 다음 감지 영역 결정 (랜드마크는 last_face_view 기준으로 원본 좌표로 되돌림)
+            self.face_roi.update(face_result, self.last_face_view)
+
+        scores = self.expression_scorer.score(face_result)
+        if self.score_trace is not None:
+            self.score_trace.write(self.last_face_time, scores)
+        expression = self.trigger_engine.update(scores, self.last_face_time)
+        if scores is None:
+            return
+
+        # 어느 표정이든 임계값 근처면 다음 프레임부터 매 프레임 감지
+        self.detection_cadence.observe_score(self.expression_scorer.closeness(scores), now=now)
+
+        now = time.time()
+        with self.smile_lock:
+            if expression is not None and (now - self.last_smile_trigger_time > COOLDOWN_SECONDS):
+                self.pending_smile_trigger = True
+                self.last_smile_trigger_time = now
+                self.last_trigger_expression = expression
+                SMILE_TRIGGERS.labels(self.session_id, expression).inc()
+
+    def finish_clip(self):
+        """녹화 중인 decode 경로 클립을 닫는다 (남은 인코딩과 업로드는 인코더 스레드가 마무리)"""
+        # 이벤트 루프(구독 해제)와 프레임 처리 스레드 양쪽에서 불릴 수 있어 먼저 떼어 낸다
+        job, self.clip_job = self.clip_job, None
+        if job is not None:
+            job.finish()
+        self.is_saving = False
+
+    def _on_clip_encoded(self, path, ok):
+        # 인코더 스레드에서 호출됨
+        if ok:
+            self.submit_upload(path)
+        else:
+            print(f"❌ [{self.session_id}] 클립 인코딩 실패: {path}")
+
+    def _stage(self, name):
+        if self.stage_timings is None:
+            return nullcontext()
+        return self.stage_timings.measure(name)
+
+    def process_frame(self, frame, face_runner=None, now=None):
+        """
+        now: 감지 주기 / 모션 게이트 / 얼굴 ROI 갱신에 쓸 시각(초, time.monotonic과 같은 축)
+        라이브는 None(단조 시계), replay 최대 속도는 영상 시각을 넘겨 실제 처리 속도와 무관하게 같은 주기로 감지한다
+        """
+        with self._stage("frame"):
+            self._process_frame(frame, face_runner, now)
+
+    def _process_frame(self, frame, face_runner, now=None):
+        self.frame_now = now
+        try:
+            # 재사용 버퍼에 RGB로 한 번만 디코딩, 녹화용 BGR은 복사 없는 뷰
+            with self._stage("color"):
+                frame_rgb = self.frame_pool.decode_rgb(frame)
+            frame_bgr = FrameBufferPool.bgr_view(frame_rgb)
+            self.last_inference_view = None
+            self.last_frame_for_rsp = frame_rgb
+            # H.264 패킷을 받고 있으면 pre-roll은 패킷 링이 담당
+            use_packets = self.packet_recorder is not None and self.packet_recorder.active
+            if not use_packets:
+                with self._stage("preroll"):
+                    self.pre_buffer.append(frame_bgr)
+
+            if (
+                self.is_saving
+                and self.clip_job is None
+                and (self.packet_recorder is None or not self.packet_recorder.recording)
+            ):
+                # 패킷 녹화가 끝나면 다시 감지 시작
+                self.is_saving = False
+
+            face_runner = self.face_runner or face_runner
+            if (
+                not self.is_saving
+                and face_runner is not None
+                and not face_runner.busy
+                and self.detection_cadence.should_detect(now)
+                and self._motion_allows(frame_rgb, now)
+            ):
+                if self.face_roi.enabled and getattr(face_runner, "running_mode", "IMAGE") != "IMAGE":
+                    self.face_roi.enabled = False
+                    print(
+                        f"[{self.session_id}] 얼굴 ROI는 IMAGE 모드에서만 사용합니다 "
+                        f"({face_runner.running_mode}는 MediaPipe 자체 추적 사용)"
+                    )
+                # 축소(또는 얼굴 ROI 잘라내기)는 감지하는 프레임에서 한 번만
+                with self._stage("resize"):
+                    view = self.face_roi.view(frame_rgb, self.resizer, now=now)
+                if view.is_full:
+                    # 전체 프레임이면 RSP 포즈도 같은 축소 결과를 쓴다
+                    self.last_inference_view = view
+                self.last_face_view = view
+                timestamp_ms = self.timestamps.next(frame_timestamp_ms(frame))
+                # 트리거 판정은 영상 시각 기준 (replay 최대 속도에서도 유지 시간이 같게)
+                self.last_face_time = timestamp_ms / 1000.0
+                # 결과는 on_face_result로 전달됨 (LIVE_STREAM은 비동기)
+                with self._stage("detect"):
+                    face_runner.submit(view.image, timestamp_ms, on_result=self.on_face_result)
+
+            if self.pose_sampler is not None and self.pose_cache.due():
+                # 게임 준비 중에만 낮은 주기로 포즈 분류 (얼굴 감지와 같은 축소 프레임 공유)
+                view = self.last_inference_view
+                if view is None:
+                    with self._stage("resize"):
+                        view = self.resizer.resize(frame_rgb)
+                    self.last_inference_view = view
+                with self._stage("rsp"):
+                    self.pose_cache.add(self.pose_sampler(view))
+
+            with self.smile_lock:
+                # 녹화 중에 늦게 도착한 LIVE_STREAM 결과는 버린다
+                smile_triggered = self.pending_smile_trigger and not self.is_saving
+                self.pending_smile_trigger = False
+
+            if smile_triggered and not self.is_saving:
+                if use_packets:
+                    if self.packet_recorder.start_clip(
+                        new_clip_path(self.session_id, int(self.last_smile_trigger_time))
+                    ):
+                        self.is_saving = True
+                elif len(self.pre_buffer) > 0:
+                    # pre-roll은 JPEG 스냅샷(memcpy)만 넘기고 디코딩 / 인코딩은 인코더 스레드에서
+                    path = new_clip_path(self.session_id, int(self.last_smile_trigger_time))
+                    with self._stage("flush"):
+                        preroll = self.pre_buffer.snapshot()
+                    self.clip_job = self.clip_recorder.start(
+                        path, FPS, preroll, on_done=self._on_clip_encoded
+                    )
+                    print(
+                        f"[{self.session_id}] Smile Detected! (Idx: {int(self.last_smile_trigger_time)}) 녹화 시작... -> {path}"
+                    )
+                    self.post_frames_remaining = int(FPS * SAVING_PRE_POST_SECONDS)
+                    self.is_saving = True
+
+            job = self.clip_job
+            if self.is_saving and job is not None:
+                # 디코딩된 프레임 참조만 넘긴다 (BGR 변환도 인코더 스레드에서)
+                with self._stage("write"):
+                    job.push(frame)
+                self.post_frames_remaining -= 1
+                if self.post_frames_remaining <= 0:
+                    self.finish_clip()
+        except Exception as e:
+            print(f"!!! EXCEPTION in process_frame ({self.session_id}): {e}")
+            self.finish_clip()
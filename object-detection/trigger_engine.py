@@ -0,0 +1,219 @@
+# trigger_engine.py
+# 표정 점수 → 녹화 트리거 판정 (한 프레임 튀는 점수로 클립이 생기지 않도록)
+# - 감지 간격이 일정하지 않으므로 시간 상수(ema_seconds) 기반 EMA로 점수를 평활
+# - 히스테리시스: EMA가 threshold를 넘으면 "높음", threshold * release_ratio 아래로 내려가야 해제
+# - "높음"이 sustain_seconds 이상 이어져야 트리거, 한 번 트리거하면 해제될 때까지 다시 트리거하지 않음
+# 점수 기록(트레이스)을 다시 돌려 파라미터를 맞춰 볼 수 있다
+#   python trigger_engine.py traces/*.jsonl --sustain 0.1,0.2,0.3 --ema 0.1,0.2
+import argparse
+import glob
+import json
+import math
+import os
+import time
+
+TRIGGER_EMA_SECONDS = float(os.getenv("TRIGGER_EMA_SECONDS", "0.15"))
+TRIGGER_RELEASE_RATIO = float(os.getenv("TRIGGER_RELEASE_RATIO", "0.7"))
+TRIGGER_SUSTAIN_SECONDS = float(os.getenv("TRIGGER_SUSTAIN_SECONDS", "0.2"))
+# 감지 결과 사이 간격이 이보다 길면 (얼굴을 놓쳤다 다시 찾는 등) 상태를 처음부터 다시 쌓는다
+TRIGGER_MAX_GAP_SECONDS = float(os.getenv("TRIGGER_MAX_GAP_SECONDS", "1.0"))
+
+
+class _ExpressionState:
+    def __init__(self):
+        self.ema = None
+        self.high_since = None  # EMA가 threshold를 넘은 시각 (해제되면 None)
+        self.fired = False  # 이번 "높음" 구간에서 이미 트리거했는지
+
+
+class TriggerEngine:
+    """
+    update(scores, t)에 표정 점수 배열(ExpressionScorer.scores, 얼굴 없음이면 None)과 시각(초)을 넣으면
+    이번에 트리거된 표정 이름(설정 순서가 우선순위) 또는 None을 돌려준다
+    ema_seconds=0, sustain_seconds=0이면 예전 한 프레임 임계값 판정과 같다
+    """
+
+    def __init__(
+        self,
+        names,
+        thresholds,
+        ema_seconds=TRIGGER_EMA_SECONDS,
+        release_ratio=TRIGGER_RELEASE_RATIO,
+        sustain_seconds=TRIGGER_SUSTAIN_SECONDS,
+        max_gap_seconds=TRIGGER_MAX_GAP_SECONDS,
+    ):
+        self.names = list(names)
+        self.thresholds = [float(t) for t in thresholds]
+        self.ema_seconds = ema_seconds
+        self.release_ratio = release_ratio
+        self.sustain_seconds = sustain_seconds
+        self.max_gap_seconds = max_gap_seconds
+        self._states = [_ExpressionState() for _ in self.names]
+        self._last_t = None
+
+    def reset(self):
+        self._states = [_ExpressionState() for _ in self.names]
+        self._last_t = None
+
+    @property
+    def smoothed(self):
+        """표정별 평활 점수 (아직 없으면 0.0)"""
+        return [state.ema or 0.0 for state in self._states]
+
+    def update(self, scores, t):
+        if scores is None:
+            # 얼굴이 없으면 진행 중이던 "높음" 구간을 끊는다
+            self.reset()
+            return None
+
+        dt = None if self._last_t is None else t - self._last_t
+        self._last_t = t
+        if dt is not None and (dt < 0 or dt > self.max_gap_seconds):
+            self._states = [_ExpressionState() for _ in self.names]
+            dt = None
+
+        if dt is None or self.ema_seconds <= 0:
+            alpha = 1.0
+        else:
+            alpha = 1.0 - math.exp(-dt / self.ema_seconds)
+
+        fired = None
+        for name, threshold, state, score in zip(self.names, self.thresholds, self._states, scores):
+            score = float(score)
+            state.ema = score if state.ema is None else state.ema + alpha * (score - state.ema)
+
+            if state.high_since is None:
+                if state.ema > threshold:
+                    state.high_since = t
+            elif state.ema < threshold * self.release_ratio:
+                state.high_since = None
+                state.fired = False
+
+            if (
+                state.high_since is not None
+                and not state.fired
+                and t - state.high_since >= self.sustain_seconds
+            ):
+                state.fired = True
+                if fired is None:
+                    fired = name
+        return fired
+
+
+class ScoreTraceWriter:
+    """
+    감지 결과마다 {"t": 영상 시각(초), "scores": [...] 또는 null}을 JSONL로 기록
+    첫 줄은 {"expressions": [...], "thresholds": [...]} 헤더
+    """
+
+    def __init__(self, path, names, thresholds):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._file = open(path, "w", buffering=1)
+        self._file.write(
+            json.dumps({"expressions": list(names), "thresholds": [float(t) for t in thresholds]})
+            + "\n"
+        )
+
+    def write(self, t, scores):
+        if self._file is None:
+            return
+        values = None if scores is None else [round(float(s), 4) for s in scores]
+        self._file.write(json.dumps({"t": round(t, 4), "scores": values}) + "\n")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def load_trace(path):
+    """트레이스 파일 → (names, thresholds, [(t, scores), ...])"""
+    with open(path) as f:
+        header = json.loads(f.readline())
+        samples = []
+        for line in f:
+            line = line.strip()
+            if line:
+                data = json.loads(line)
+                samples.append((data["t"], data["scores"]))
+    return header["expressions"], header["thresholds"], samples
+
+
+def count_triggers(engine, samples, cooldown_seconds):
+    """트레이스를 엔진에 흘려 클립 트리거 수를 센다 (StreamSession과 같은 녹화 쿨다운 적용)"""
+    counts = {name: 0 for name in engine.names}
+    last_trigger = None
+    for t, scores in samples:
+        fired = engine.update(scores, t)
+        if fired is None:
+            continue
+        if last_trigger is not None and t - last_trigger <= cooldown_seconds:
+            continue
+        last_trigger = t
+        counts[fired] += 1
+    return counts
+
+
+def _float_list(text):
+    return [float(v) for v in text.split(",") if v.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="표정 점수 트레이스로 트리거 파라미터 비교")
+    parser.add_argument("traces", nargs="+", help="ScoreTraceWriter JSONL 파일 (glob 가능)")
+    parser.add_argument("--ema", type=_float_list, default=[TRIGGER_EMA_SECONDS], help="EMA 시간 상수(초), 쉼표로 여러 개")
+    parser.add_argument("--sustain", type=_float_list, default=[TRIGGER_SUSTAIN_SECONDS], help="유지 시간(초), 쉼표로 여러 개")
+    parser.add_argument("--release", type=_float_list, default=[TRIGGER_RELEASE_RATIO], help="해제 비율, 쉼표로 여러 개")
+    parser.add_argument("--cooldown", type=float, default=3.0, help="녹화 쿨다운(초)")
+    parser.add_argument("--json", default=None, help="결과를 JSON 파일로 저장")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    paths = sorted({p for pattern in args.traces for p in glob.glob(pattern)})
+    traces = [load_trace(path) for path in paths]
+    if not traces:
+        print("[Trigger] 트레이스 파일이 없습니다.")
+        return []
+
+    configs = [(0.0, 0.0, 1.0)] + [
+        (ema, sustain, release)
+        for ema in args.ema
+        for sustain in args.sustain
+        for release in args.release
+    ]
+    started = time.monotonic()
+    results = []
+    for ema, sustain, release in configs:
+        totals = {}
+        for names, thresholds, samples in traces:
+            engine = TriggerEngine(
+                names, thresholds, ema_seconds=ema, release_ratio=release, sustain_seconds=sustain
+            )
+            for name, count in count_triggers(engine, samples, args.cooldown).items():
+                totals[name] = totals.get(name, 0) + count
+        results.append(
+            {"ema": ema, "sustain": sustain, "release": release, "clips": sum(totals.values()), "by_expression": totals}
+        )
+
+    baseline = results[0]["clips"]
+    duration = sum(samples[-1][0] - samples[0][0] for _, _, samples in traces if samples)
+    print(f"[Trigger] 트레이스 {len(traces)}개, 총 {duration / 60:.1f}분")
+    for i, result in enumerate(results):
+        label = "한 프레임 임계값" if i == 0 else (
+            f"ema {result['ema']:.2f}s / 유지 {result['sustain']:.2f}s / 해제 x{result['release']:.2f}"
+        )
+        change = "" if i == 0 or baseline == 0 else f" ({(result['clips'] - baseline) / baseline * 100:+.0f}%)"
+        print(f"  {label:<40} 클립 {result['clips']:>4}개{change}  {result['by_expression']}")
+    print(f"[Trigger] {time.monotonic() - started:.2f}s")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ import signal
 import cv2
 import numpy as np
 import os
+import random
 import time
 import ssl
 from aiortc import (
@@ -15,7 +16,6 @@ from aiortc import (
 )
 from aiortc.contrib.media import MediaStreamTrack
 from aiortc.sdp import candidate_from_sdp
-import requests
 from av import VideoFrame
 from fractions import Fraction
 import websockets
@@ -24,7 +24,6 @@ import warnings
 from urllib.parse import urlparse, urlunparse, parse_qs, urlencode
 
 import httpx
-from collections import deque
 from datetime import datetime
 
 import mediapipe as mp
@@ -37,6 +36,28 @@ import aiomqtt as mqtt
 
 import dotenv
 
+from clip_recorder import CLIP_ENCODER_THREADS, ClipRecorder
+from clip_uploader import ClipUploader
+from inference_pool import InferencePool
+from landmarker_runner import FaceLandmarkerRunner
+from metrics import (
+    FRAME_RECEIVE_INTERVAL,
+    METRICS_ENABLED,
+    MQTT_REQUEST_SECONDS,
+    RSP_RESULTS,
+    UPLOAD_QUEUE_DEPTH,
+    StageMetrics,
+    start_metrics_server,
+    unwatch_session,
+    watch_session,
+)
+from openvidu_rpc import OpenViduRpc, OpenViduRpcError
+from packet_recorder import prefer_h264, tap_encoded_frames
+from process_backend import ProcessFaceRunner, ProcessPoseDetector
+from rsp_cache import RSPResponder
+from rsp_detector import RSPDetector
+from stream_session import StreamSession
+
 warnings.filterwarnings("ignore", message="Unverified HTTPS request")
 dotenv.load_dotenv()
 
@@ -55,130 +76,111 @@ MQTT_SECRET = os.getenv("MQTT_SECRET")
 MQTT_REQUEST_TOPIC = os.getenv("MQTT_REQUEST_TOPIC")
 MQTT_RESPONSE_TOPIC = os.getenv("MQTT_RESPONSE_TOPIC")
 
-SMILE_THRESHOLD = 0.3
-COOLDOWN_SECONDS = 3.0
-SAVING_PRE_POST_SECONDS = 5.0
-FPS = 30.0
-VIDEO_DIR = "smile_videos"
-
-pre_buffer = deque(maxlen=int(FPS * SAVING_PRE_POST_SECONDS))
-is_saving = False
-post_frames_remaining = 0
-video_writer = None
-last_smile_trigger_time = 0.0
-current_video_path = None
-face_landmarker = None
-pose_detector = None
-rsp_detector = None
-last_frame_for_rsp = None
-
-mp_pose = mp.solutions.pose
-
+# 한 워커가 구독할 OpenVidu 세션 목록 (쉼표 구분, 없으면 SESSION_ID 하나)
+SESSION_IDS = [
+    sid.strip() for sid in os.getenv("SESSION_IDS", SESSION_ID or "").split(",") if sid.strip()
+]
 
-class RSPDetector:
-    def calculate_angle(self, a_coord, b_coord, c_coord):
-        vec_ba = a_coord - b_coord
-        vec_bc = c_coord - b_coord
+# FaceLandmarker 실행 모드: IMAGE(기본, 기존 동작) | VIDEO | LIVE_STREAM
+# IMAGE 모드만 랜드마커를 세션 간에 공유한다 (VIDEO / LIVE_STREAM은 세션마다 추적 상태가 필요)
+FACE_RUNNING_MODE = os.getenv("FACE_RUNNING_MODE", "IMAGE").upper()
+FACE_MODEL_PATH = "face_landmarker.task"
 
-        dot_product = np.dot(vec_ba, vec_bc)
-        norm_ba = np.linalg.norm(vec_ba)
-        norm_bc = np.linalg.norm(vec_bc)
+# 공유 추론 풀 크기 (스레드 수 = 공유 랜드마커/포즈 모델 수)
+INFERENCE_POOL_SIZE = int(os.getenv("INFERENCE_POOL_SIZE", "2"))
 
-        if norm_ba == 0 or norm_bc == 0:
-            return 0.0
+# OpenVidu 재연결: 세션이 끊기면 RECONNECT_BASE_DELAY부터 2배씩 (최대 RECONNECT_MAX_DELAY, 지터 포함) 기다렸다가 다시 연결
+# RECONNECT_HEALTHY_SECONDS 이상 유지된 연결이 끊긴 경우는 첫 시도부터 다시 센다
+RECONNECT_BASE_DELAY = float(os.getenv("RECONNECT_BASE_DELAY", "1.0"))
+RECONNECT_MAX_DELAY = float(os.getenv("RECONNECT_MAX_DELAY", "30.0"))
+RECONNECT_HEALTHY_SECONDS = float(os.getenv("RECONNECT_HEALTHY_SECONDS", "60.0"))
 
-        cosine_angle = dot_product / (norm_ba * norm_bc)
-        cosine_angle = np.clip(cosine_angle, -1.0, 1.0)
+# 추론 실행 백엔드: thread = 워커 프로세스 안에서 실행, process = 모델마다 전용 프로세스 (GIL 회피)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "thread").lower()
 
-        angle = np.degrees(np.arccos(cosine_angle))
-        return angle
+sessions = {}  # session_id -> StreamSession
+inference_pool = None
+clip_recorder = None  # 세션들이 나눠 쓰는 클립 인코더 스레드 풀
+openvidu_http = None  # OpenVidu REST API 공유 클라이언트 (run_worker에서 생성)
+rsp_detector = None
+rsp_responder = None
 
-    def _get_coords(self, landmarks, lm_enum):
-        lm = landmarks.landmark[lm_enum]
-        return np.array([lm.x, lm.y, lm.z])
+mp_pose = mp.solutions.pose
 
-    def classify_pose(self, landmarks):
-        L_SH = self._get_coords(landmarks, mp_pose.PoseLandmark.LEFT_SHOULDER)
-        R_SH = self._get_coords(landmarks, mp_pose.PoseLandmark.RIGHT_SHOULDER)
-        L_EL = self._get_coords(landmarks, mp_pose.PoseLandmark.LEFT_ELBOW)
-        R_EL = self._get_coords(landmarks, mp_pose.PoseLandmark.RIGHT_ELBOW)
-        L_WR = self._get_coords(landmarks, mp_pose.PoseLandmark.LEFT_WRIST)
-        R_WR = self._get_coords(landmarks, mp_pose.PoseLandmark.RIGHT_WRIST)
-        L_HIP = self._get_coords(landmarks, mp_pose.PoseLandmark.LEFT_HIP)
-        R_HIP = self._get_coords(landmarks, mp_pose.PoseLandmark.RIGHT_HIP)
 
-        left_elbow_angle = self.calculate_angle(L_SH, L_EL, L_WR)
-        right_elbow_angle = self.calculate_angle(R_SH, R_EL, R_WR)
+def create_pose_detector():
+    if INFERENCE_BACKEND == "process":
+        return ProcessPoseDetector()
+    return mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5)
 
-        left_shoulder_angle = self.calculate_angle(L_HIP, L_SH, L_EL)
-        right_shoulder_angle = self.calculate_angle(R_HIP, R_SH, R_EL)
 
-        left_z_diff = L_WR[2] - L_SH[2]
-        right_z_diff = R_WR[2] - R_SH[2]
+def create_face_runner(on_result=None):
+    if INFERENCE_BACKEND == "process":
+        return ProcessFaceRunner(
+            FACE_MODEL_PATH, running_mode=FACE_RUNNING_MODE, on_result=on_result
+        )
+    return FaceLandmarkerRunner(
+        FACE_MODEL_PATH, running_mode=FACE_RUNNING_MODE, on_result=on_result
+    )
 
-        left_x_diff = abs(L_WR[0] - L_SH[0])
-        right_x_diff = abs(R_WR[0] - R_SH[0])
 
-        ELBOW_STRAIGHT_TH = 90.0
-        SHOULDER_ROCK_TH = 45.0
-        X_WIDTH_THRESHOLD = 0.15
-        Z_FORWARD_TH = -0.15
+def load_models():
+    # process 백엔드는 spawn으로 자식을 띄우며 이 모듈을 다시 import하므로
+    # 모델 로드는 import 시점이 아니라 워커 시작 시점에 한다
+    global inference_pool, clip_recorder, rsp_detector, rsp_responder
 
-        is_rock = (
-            left_shoulder_angle < SHOULDER_ROCK_TH
-            and right_shoulder_angle < SHOULDER_ROCK_TH
+    print(f"MediaPipe 모델 로드 중... (backend: {INFERENCE_BACKEND})")
+    try:
+        inference_pool = InferencePool(
+            INFERENCE_POOL_SIZE,
+            face_factory=create_face_runner if FACE_RUNNING_MODE == "IMAGE" else None,
+            pose_factory=create_pose_detector,
         )
-
-        if is_rock:
-            return "Rock"
-
-        are_arms_straight_enough = (
-            left_elbow_angle > ELBOW_STRAIGHT_TH
-            and right_elbow_angle > ELBOW_STRAIGHT_TH
+        print(
+            f"✓ Face Landmarker (스마일, {FACE_RUNNING_MODE}) / Pose 모델 {INFERENCE_POOL_SIZE}개 로드 완료."
         )
-        if not are_arms_straight_enough:
-            return "Unknown"
-
-        is_wide = left_x_diff > X_WIDTH_THRESHOLD and right_x_diff > X_WIDTH_THRESHOLD
-        if is_wide:
-            return "Paper"
-
-        is_narrow = left_x_diff < X_WIDTH_THRESHOLD and right_x_diff < X_WIDTH_THRESHOLD
-        is_forward = left_z_diff < Z_FORWARD_TH and right_z_diff < Z_FORWARD_TH
-
-        if is_narrow and is_forward:
-            return "Scissors"
-
-        return "Unknown"
-
+        rsp_detector = RSPDetector()
+        rsp_responder = RSPResponder(inference_pool, rsp_detector)
+        print("✓ RSP Detector (가위바위보) 로드 완료.")
+        # 세션마다 인코더 스레드 하나 - 동시에 녹화해도 뒤 클립이 앞 클립을 기다리다 프레임을 버리지 않게
+        encoder_threads = CLIP_ENCODER_THREADS or max(1, len(SESSION_IDS))
+        clip_recorder = ClipRecorder(encoder_threads)
+        print(f"✓ 클립 인코더 스레드 {encoder_threads}개 시작.")
+    except Exception as e:
+        print(f"❌ MediaPipe 모델 로드 실패: {e}")
+        exit()
+
+
+async def get_or_create_session(session_id, upload_queue, main_loop):
+    session = sessions.get(session_id)
+    if session is None:
+        session = StreamSession(
+            session_id,
+            index=len(sessions),
+            upload_queue=upload_queue,
+            main_loop=main_loop,
+            pose_sampler=rsp_responder.classify_view,
+            clip_recorder=clip_recorder,
+        )
+        if METRICS_ENABLED:
+            session.stage_timings = StageMetrics(session_id)
+            watch_session(session)
+        # 러너를 만드는 동안 같은 슬롯이 두 번 생기지 않도록 먼저 등록 (러너 전까지는 감지만 건너뜀)
+        sessions[session_id] = session
+        inference_pool.register(session)
+        if FACE_RUNNING_MODE != "IMAGE":
+            # 모델 로드 (process 백엔드는 자식 프로세스 준비까지 최대 수십 초) - 이벤트 루프를 막지 않게 스레드에서
+            session.face_runner = await asyncio.to_thread(
+                create_face_runner, on_result=session.on_face_result
+            )
+    return session
 
-print("MediaPipe 모델 로드 중...")
-try:
-    BaseOptions = mp.tasks.BaseOptions
-    FaceLandmarker = vision.FaceLandmarker
-    FaceLandmarkerOptions = vision.FaceLandmarkerOptions
-    VisionRunningMode = vision.RunningMode
-    face_options = FaceLandmarkerOptions(
-        base_options=BaseOptions(model_asset_path="face_landmarker.task"),
-        running_mode=VisionRunningMode.IMAGE,
-        output_face_blendshapes=True,
-        num_faces=1,
-    )
-    face_landmarker = FaceLandmarker.create_from_options(face_options)
-    print("✓ Face Landmarker (스마일) 로드 완료.")
 
-    pose_detector = mp_pose.Pose(
-        min_detection_confidence=0.5, min_tracking_confidence=0.5
+async def create_worker_token(session_id):
+    """OpenVidu REST API로 SUBSCRIBER 토큰 발급 (공유 비동기 클라이언트, 이벤트 루프를 막지 않음)"""
+    print(
+        f"OpenVidu 원본 API에 'SUBSCRIBER' 토큰 요청 중... (URL: {OPENVIDU_URL}, 세션: {session_id})"
     )
-    rsp_detector = RSPDetector()
-    print("✓ RSP Detector (가위바위보) 로드 완료.")
-except Exception as e:
-    print(f"❌ MediaPipe 모델 로드 실패: {e}")
-    exit()
-
-
-def create_worker_token() -> str:
-    print(f"OpenVidu 원본 API에 'SUBSCRIBER' 토큰 요청 중... (URL: {OPENVIDU_URL})")
     auth_string = f"{OPENVIDU_USER}:{OPENVIDU_SECRET}"
     auth_bytes = base64.b64encode(auth_string.encode("utf-8")).decode("utf-8")
     headers = {
@@ -186,33 +188,29 @@ def create_worker_token() -> str:
         "Content-Type": "application/json",
     }
     try:
-        session_response = requests.post(
+        session_response = await openvidu_http.post(
             f"{OPENVIDU_URL}/openvidu/api/sessions",
             headers=headers,
-            json={"customSessionId": SESSION_ID},
-            verify=False,
-            timeout=10,
+            json={"customSessionId": session_id},
         )
         if session_response.status_code not in [200, 409]:
             print(
                 f"❌ 세션 생성/확인 실패: {session_response.status_code} - {session_response.text}"
             )
             return None
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"❌ 세션 생성/확인 중 예외 발생: {e}")
         return None
     connection_payload = {
         "role": "SUBSCRIBER",
         "serverData": f'{{"participantId": "{WORKER_PARTICIPANT_ID}"}}',
     }
-    connection_url = f"{OPENVIDU_URL}/openvidu/api/sessions/{SESSION_ID}/connection"
+    connection_url = f"{OPENVIDU_URL}/openvidu/api/sessions/{session_id}/connection"
     try:
-        connection_response = requests.post(
+        connection_response = await openvidu_http.post(
             connection_url,
             headers=headers,
             json=connection_payload,
-            verify=False,
-            timeout=10,
         )
         if connection_response.status_code != 200:
             print(
@@ -222,115 +220,76 @@ def create_worker_token() -> str:
         token_url = connection_response.json()["token"]
         print(f"✓ OpenVidu 원본 API 통해 워커 토큰 확보")
         return token_url
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"❌ 커넥션 생성 중 예외 발생: {e}")
         return None
 
 
-def start_video_writer(first_frame, fps, idx):
-    global current_video_path
-    if not os.path.exists(VIDEO_DIR):
-        os.makedirs(VIDEO_DIR)
-    h, w = first_frame.shape[:2]
-    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    path = f"{VIDEO_DIR}/smile_{timestamp}_{idx}.mp4"
-    current_video_path = path
-    writer = cv2.VideoWriter(path, fourcc, fps, (w, h))
-    if not writer.isOpened():
-        print(
-            f"❌ ERROR: VideoWriter initialization failed for FourCC='avc1'. Check FFmpeg installation."
-        )
-        current_video_path = None
-        return None, None
-
-    print(f"Smile Detected! (Idx: {idx}) 녹화 시작... -> {path}")
-    return writer, path
-
-
-async def upload_video_file(file_path):
-    if not file_path or not os.path.exists(file_path):
-        print(f"Upload Error: 파일 없음 {file_path}")
-        return
-    if not API_UPLOAD_URL:
-        print(f"Upload Error: API_UPLOAD_URL이 .env에 설정되지 않았습니다.")
-        try:
-            os.remove(file_path)
-        except OSError:
-            pass
-        return
-
-    print(f"파일 업로드 시도: {file_path}")
-    try:
-        async with httpx.AsyncClient() as client:
-            with open(file_path, "rb") as f:
-                files = {"file": (os.path.basename(file_path), f, "video/mp4")}
-                params = {"directory": "smile_videos"}
-                response = await client.post(
-                    API_UPLOAD_URL, files=files, params=params, timeout=30.0
-                )
-            if 200 <= response.status_code < 300:
-                print(f"✓ (Upload Success) {file_path}")
-            else:
-                print(
-                    f"❌ (Upload Failed) {file_path} -> {response.status_code} - {response.text}"
-                )
-    except Exception as e:
-        print(f"❌ (Upload Exception) {file_path} -> {e}")
-    finally:
-        try:
-            os.remove(file_path)
-        except OSError:
-            pass
-
-
-def execute_rsp_detection():
-    global last_frame_for_rsp, pose_detector, rsp_detector
-
-    if last_frame_for_rsp is None:
-        return "NoFrame"
-
-    try:
-        image_for_pose = cv2.cvtColor(last_frame_for_rsp, cv2.COLOR_BGR2RGB)
-        pose_results = pose_detector.process(image_for_pose)
-        rsp_status = "Unknown"
-        if pose_results.pose_landmarks:
-            rsp_status = rsp_detector.classify_pose(pose_results.pose_landmarks)
-            print(f"RSP Detector 실행됨: {rsp_status}")
-            return rsp_status
-        else:
-            print("RSP Detector 실행됨: NoLandmarks")
-            return "NoLandmarks"
-
-    except Exception as e:
-        print(f"RSP Detector 실행 중 오류: {e}")
-        return "Error"
+def resolve_rsp_session(topic):
+    """
+    요청 토픽으로 대상 세션을 찾는다
+    - MQTT_REQUEST_TOPIC: 기존 단일 세션 방식 → 첫 번째 세션
+    - MQTT_REQUEST_TOPIC/<session_id>: 해당 세션
+    - MQTT_REQUEST_TOPIC/<session_id>-2 ...: 같은 세션의 두 번째 이후 로봇 (acquire_stream_session 슬롯)
+    """
+    suffix = topic[len(MQTT_REQUEST_TOPIC) :].lstrip("/")
+    session_id = suffix or (SESSION_IDS[0] if SESSION_IDS else None)
+    return session_id, sessions.get(session_id)
 
 
 async def mqtt_listener_worker(client):
-    print(f"✓ MQTT 리스너 시작, 토픽 구독: {MQTT_REQUEST_TOPIC}")
+    print(f"✓ MQTT 리스너 시작, 토픽 구독: {MQTT_REQUEST_TOPIC} (+ /<session_id>)")
 
     try:
         await client.subscribe(MQTT_REQUEST_TOPIC)
+        await client.subscribe(f"{MQTT_REQUEST_TOPIC}/+")
 
         async for message in client.messages:
             try:
+                received_at = time.monotonic()
                 topic = message.topic
                 print(f"[MQTT] Request received on topic: {topic}")
 
-                if not message.topic.matches(MQTT_REQUEST_TOPIC):
+                if not (
+                    message.topic.matches(MQTT_REQUEST_TOPIC)
+                    or message.topic.matches(f"{MQTT_REQUEST_TOPIC}/+")
+                ):
                     continue
 
-                rsp_result = await asyncio.to_thread(execute_rsp_detection)
+                session_id, session = resolve_rsp_session(topic.value)
+
+                payload = message.payload
+                if isinstance(payload, (bytes, bytearray)):
+                    payload = payload.decode("utf-8", errors="ignore")
+                if str(payload).strip().lower() == "arm":
+                    # 게임 시작 알림: 응답 없이 판정 캐시만 채우기 시작
+                    if session is not None:
+                        session.pose_cache.arm()
+                        print(f"[MQTT] RSP armed ({session_id})")
+                    continue
+
+                rsp_result, confidence, samples = await asyncio.to_thread(
+                    rsp_responder.respond, session
+                )
 
                 response_message = {
                     "response": "RSP_DETECT_RESULT",
                     "result": rsp_result,
+                    "confidence": round(confidence, 3),
+                    "samples": samples,
+                    "session_id": session_id,
                 }
 
+                # 세션 토픽으로 온 요청은 세션 토픽으로 응답
+                response_topic = MQTT_RESPONSE_TOPIC
+                if topic.value != MQTT_REQUEST_TOPIC:
+                    response_topic = f"{MQTT_RESPONSE_TOPIC}/{session_id}"
+
                 await client.publish(
-                    MQTT_RESPONSE_TOPIC, json.dumps(response_message), qos=0
+                    response_topic, json.dumps(response_message), qos=0
                 )
+                MQTT_REQUEST_SECONDS.labels("rsp").observe(time.monotonic() - received_at)
+                RSP_RESULTS.labels(rsp_result).inc()
                 print(f"[MQTT] Response sent. Result: {rsp_result}")
             except Exception as e:
                 print(f"[MQTT] Internal Error: {e}")
@@ -338,79 +297,6 @@ async def mqtt_listener_worker(client):
         print(f"MQTT 리스너 워커 오류: {e}")
 
 
-def process_frame_and_manage_buffer(
-    frame: VideoFrame, upload_queue: asyncio.Queue, main_loop: asyncio.AbstractEventLoop
-):
-    global last_smile_trigger_time, is_saving, post_frames_remaining, video_writer, current_video_path, last_frame_for_rsp
-
-    try:
-        frame_bgr = frame.to_ndarray(format="bgr24")
-        pre_buffer.append(frame_bgr)
-        last_frame_for_rsp = frame_bgr
-        smile_triggered = False
-
-        if not is_saving:
-            frame_rgb = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
-            mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=frame_rgb)
-            face_result = face_landmarker.detect(mp_image)
-
-            if face_result and face_result.face_blendshapes:
-                smile_l_score = 0.0
-                smile_r_score = 0.0
-                for category in face_result.face_blendshapes[0]:
-                    if category.category_name == "mouthSmileLeft":
-                        smile_l_score = category.score
-                    elif category.category_name == "mouthSmileRight":
-                        smile_r_score = category.score
-
-                now = time.time()
-                if (
-                    smile_l_score > SMILE_THRESHOLD
-                    and smile_r_score > SMILE_THRESHOLD
-                    and (now - last_smile_trigger_time > COOLDOWN_SECONDS)
-                ):
-                    smile_triggered = True
-                    last_smile_trigger_time = now
-
-        if smile_triggered and not is_saving:
-            if len(pre_buffer) > 0:
-                video_writer, _ = start_video_writer(
-                    pre_buffer[0], FPS, int(last_smile_trigger_time)
-                )
-
-                if video_writer is None:
-                    return
-
-                for bf in pre_buffer:
-                    video_writer.write(bf)
-                post_frames_remaining = int(FPS * SAVING_PRE_POST_SECONDS)
-                is_saving = True
-
-        if is_saving and video_writer is not None:
-            video_writer.write(frame_bgr)
-            post_frames_remaining -= 1
-            if post_frames_remaining <= 0:
-                print(f"녹화 완료: {current_video_path}")
-                video_writer.release()
-                video_writer = None
-                is_saving = False
-                if current_video_path:
-                    try:
-                        asyncio.run_coroutine_threadsafe(
-                            upload_queue.put(current_video_path), main_loop
-                        )
-                        print(f"Upload task submitted to queue: {current_video_path}")
-                    except Exception as e:
-                        print(f"Failed to submit upload task to queue: {e}")
-                current_video_path = None
-    except Exception as e:
-        print(f"!!! EXCEPTION in process_frame_and_manage_buffer: {e}")
-        if video_writer is not None:
-            video_writer.release()
-        is_saving = False
-        video_writer = None
-
-
 def add_tcp_transport(turn_url: str) -> str:
     url_parts = list(urlparse(turn_url))
     query = parse_qs(url_parts[4])
@@ -419,73 +305,243 @@ def add_tcp_transport(turn_url: str) -> str:
     return urlunparse(url_parts)
 
 
-async def upload_worker(queue: asyncio.Queue):
+class StreamSubscription:
+    """구독 중인 퍼블리셔(로봇) 스트림 하나 - 퍼블리셔마다 RTCPeerConnection을 따로 둔다"""
+
+    def __init__(self, connection_id, stream_id, session):
+        self.connection_id = connection_id
+        self.stream_id = stream_id
+        self.session = session
+        self.pc = None
+        self.ready = False  # sdpAnswer 적용 완료 (원격 ICE 후보를 바로 넣어도 됨)
+
+
+async def acquire_stream_session(session_id, connection_id, upload_queue, main_loop):
+    """
+    퍼블리셔에게 StreamSession 슬롯을 배정한다 - 첫 로봇은 session_id, 이후 로봇은 session_id-2, -3 ...
+    비어 있는 슬롯을 먼저 재사용하므로 로봇 카메라가 재시작해도 pre-roll / 감지 / 녹화 상태가 이어진다
+    """
+    n = 1
     while True:
-        file_path = await queue.get()
-        if file_path is None:
-            break
-        await upload_video_file(file_path)
-        queue.task_done()
+        key = session_id if n == 1 else f"{session_id}-{n}"
+        session = await get_or_create_session(key, upload_queue, main_loop)
+        if session.publisher_id in (None, connection_id):
+            session.publisher_id = connection_id
+            return session
+        n += 1
+
+
+async def add_remote_candidate(pc, params):
+    candidate_str = params["candidate"].split(":", 1)[1]
+    candidate = candidate_from_sdp(candidate_str)
+    candidate.sdpMid = params.get("sdpMid")
+    candidate.sdpMLineIndex = params.get("sdpMLineIndex")
+    await pc.addIceCandidate(candidate)
+
+
+async def run_session(session_id, upload_queue, main_loop):
+    """
+    OpenVidu 세션 하나에 SUBSCRIBER로 참가해 퍼블리셔(로봇)마다 스트림을 구독한다
+    - joinRoom 응답에 있는 퍼블리셔와, 나중에 participantPublished로 들어온 퍼블리셔를 구독
+    - participantUnpublished / participantLeft 이면 그 구독만 정리 (슬롯은 다음 퍼블리셔가 재사용)
+    연결이 끊기면 반환하고, 재연결은 supervise_session이 맡는다
+    StreamSession(모델, pre-roll, 녹화 상태)은 sessions에 남아 재연결 뒤에도 그대로 쓰인다
+    """
+    subscriptions = {}  # 퍼블리셔 connectionId -> StreamSubscription
+    early_candidates = {}  # 구독 준비 전에 도착한 원격 ICE 후보 (connectionId -> [params])
+    subscribe_tasks = set()
+    reader = None
+    worker_connection_id = None
+    ice_servers = [
+        RTCIceServer(urls=["stun:stun.l.google.com:19302"]),
+        RTCIceServer(urls=["stun:stun1.l.google.com:19302"]),
+    ]
+
+    async def close_subscription(connection_id, reason):
+        sub = subscriptions.pop(connection_id, None)
+        early_candidates.pop(connection_id, None)
+        if sub is None:
+            return
+        if sub.session.publisher_id == connection_id:
+            sub.session.publisher_id = None
+        # post 구간 중에 트랙이 끊기면 더 올 프레임이 없으니 클립을 여기서 닫는다 (인코더 스레드가 기다리지 않도록)
+        sub.session.finish_clip()
+        if sub.pc is not None:
+            await sub.pc.close()
+        print(f"[{sub.session.session_id}] 스트림 구독 해제 ({reason}): {sub.stream_id}")
+
+    async def subscribe(rpc, connection_id, stream_id):
+        if connection_id in subscriptions:
+            if subscriptions[connection_id].stream_id == stream_id:
+                return
+            await close_subscription(connection_id, "스트림 교체")
 
+        session = await acquire_stream_session(session_id, connection_id, upload_queue, main_loop)
+        if connection_id in subscriptions:
+            # 세션을 준비하는 동안 같은 퍼블리셔 구독이 먼저 끝남
+            return
+        sub = StreamSubscription(connection_id, stream_id, session)
+        subscriptions[connection_id] = sub
+        print(f"✓ [{session.session_id}] 'publisher_robot' 스트림 발견: {stream_id}")
+
+        try:
+            pc = RTCPeerConnection(configuration=RTCConfiguration(iceServers=ice_servers))
+            sub.pc = pc
+
+            transceiver = pc.addTransceiver("video", direction="recvonly")
+            # 재구독이면 PTS 타임라인과 패킷 링을 새 시계에 이어 붙인다
+            session.reset_stream()
+            if session.packet_recorder is not None:
+                prefer_h264(transceiver)
+                tap_encoded_frames(
+                    transceiver.receiver, session.packet_recorder.on_encoded_frame
+                )
+
+            @pc.on("iceconnectionstatechange")
+            async def on_ice_connection_state_change():
+                print(f"[{session.session_id}] ICE connection state: {pc.iceConnectionState}")
+                if pc.iceConnectionState == "failed":
+                    print(f"❌ [{session.session_id}] ICE connection failed! 다시 구독합니다.")
+                    if subscriptions.get(connection_id) is sub:
+                        await close_subscription(connection_id, "ICE failed")
+                        await asyncio.sleep(1.0)
+                        task = asyncio.create_task(subscribe(rpc, connection_id, stream_id))
+                        subscribe_tasks.add(task)
+                        task.add_done_callback(subscribe_tasks.discard)
+                elif pc.iceConnectionState == "connected":
+                    print(f"✅ [{session.session_id}] ICE connection established! (미디어 수신 시작)")
+
+            @pc.on("icecandidate")
+            async def on_ice_candidate(event):
+                if event.candidate:
+                    candidate = event.candidate
+                    candidate_str = f"candidate:{candidate.foundation} {candidate.component} {candidate.protocol} {candidate.priority} {candidate.ip} {candidate.port} typ {candidate.type}"
+                    if candidate.relatedAddress:
+                        candidate_str += f" raddr {candidate.relatedAddress} rport {candidate.relatedPort}"
+                    print(f"[LOCAL ICE] Sending candidate: {candidate.type}")
+                    try:
+                        # 구독 엔드포인트는 퍼블리셔 connectionId로 지정한다
+                        await rpc.notify(
+                            "onIceCandidate",
+                            {
+                                "endpointName": connection_id,
+                                "candidate": candidate_str,
+                                "sdpMid": str(candidate.sdpMid) if candidate.sdpMid else "0",
+                                "sdpMLineIndex": (
+                                    candidate.sdpMLineIndex
+                                    if candidate.sdpMLineIndex is not None
+                                    else 0
+                                ),
+                            },
+                        )
+                    except Exception as e:
+                        print(f"[LOCAL ICE] ❌ Failed to send candidate: {e}")
+
+            @pc.on("track")
+            async def on_track(track):
+                print(f"✓ [{session.session_id}] Track received (kind: {track.kind})")
+                receive_interval = FRAME_RECEIVE_INTERVAL.labels(session.session_id)
+                last_received = None
+                while True:
+                    try:
+                        frame = await track.recv()
+                        now = time.monotonic()
+                        if last_received is not None:
+                            receive_interval.observe(now - last_received)
+                        last_received = now
+                        # 추론은 공유 풀 스레드에서, 수신 루프는 최신 프레임만 넘겨준다
+                        session.mailbox.put(frame)
+                    except Exception as e:
+                        print(f"[{session.session_id}] 트랙 수신 종료: {e}")
+                        break
+
+            offer = await pc.createOffer()
+            await pc.setLocalDescription(offer)
+            print(f"... 'receiveVideoFrom' ({stream_id}) 요청 중 ...")
+            result = await rpc.call(
+                "receiveVideoFrom",
+                {"sender": stream_id, "sdpOffer": pc.localDescription.sdp},
+            )
+            await pc.setRemoteDescription(
+                RTCSessionDescription(sdp=result["sdpAnswer"], type="answer")
+            )
+            sub.ready = True
+            for params in early_candidates.pop(connection_id, []):
+                try:
+                    await add_remote_candidate(pc, params)
+                except Exception as e:
+                    print(f"Failed to add early ICE candidate: {e}")
+            print(f"✓ [{session.session_id}] 'receiveVideoFrom' ({stream_id}) 성공.")
+        except Exception as e:
+            print(f"❌ [{session.session_id}] Subscribe error ({stream_id}): {e}")
+            if subscriptions.get(connection_id) is sub:
+                await close_subscription(connection_id, "구독 실패")
+
+    def start_subscribe(rpc, connection_id, stream_id):
+        task = asyncio.create_task(subscribe(rpc, connection_id, stream_id))
+        subscribe_tasks.add(task)
+        task.add_done_callback(subscribe_tasks.discard)
+
+    async def on_event(method, params):
+        if method == "iceCandidate":
+            sender = params.get("senderConnectionId") or params.get("endpointName")
+            sub = subscriptions.get(sender)
+            if sub is not None and sub.ready:
+                try:
+                    await add_remote_candidate(sub.pc, params)
+                    print(f"[REMOTE ICE] Added candidate: {params['candidate']}")
+                except Exception as e:
+                    print(f"[REMOTE ICE] Failed to add remote candidate: {e}")
+            else:
+                early_candidates.setdefault(sender, []).append(params)
+        elif method == "participantPublished":
+            connection_id = params.get("id")
+            streams = params.get("streams") or []
+            if connection_id and streams and connection_id != worker_connection_id:
+                start_subscribe(rpc, connection_id, streams[0]["id"])
+        elif method in ("participantUnpublished", "participantLeft"):
+            connection_id = params.get("connectionId") or params.get("name")
+            await close_subscription(connection_id, method)
+        else:
+            print(f"[EVENT] Received: {method}")
 
-async def run_worker():
-    print("MediaPipe 워커(aiortc) 시작 중...")
-    pc = None
-    mqtt_task = None
-    upload_task = None
     try:
-        mqtt_ssl_context = ssl.create_default_context()
-        mqtt_ssl_context.check_hostname = False
-        mqtt_ssl_context.verify_mode = ssl.CERT_NONE
+        ws_token_url = await create_worker_token(session_id)
+
+        if not ws_token_url:
+            print(f"[{session_id}] 토큰 발급 실패.")
+            return
 
-        async with mqtt.Client(
-            hostname=MQTT_BROKER_HOST,
-            port=MQTT_BROKER_PORT,
-            username=MQTT_USERNAME,
-            password=MQTT_SECRET,
-            tls_context=mqtt_ssl_context,
-        ) as mqtt_client:
+        if "/openvidu" not in ws_token_url:
+            ws_url = ws_token_url.replace(f"?", f"/openvidu?")
+        else:
+            ws_url = ws_token_url
 
-            print("✓ MQTT Connected successfully.")
+        print(f"\nConnecting to WebSocket: {ws_url}")
 
-            mqtt_task = asyncio.create_task(mqtt_listener_worker(mqtt_client))
+        ssl_context = ssl.create_default_context()
+        ssl_context.check_hostname = False
+        ssl_context.verify_mode = ssl.CERT_NONE
+        BROWSER_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.0.0 Safari/537.36"
 
-            ws_token_url = create_worker_token()
+        async with websockets.connect(
+            ws_url,
+            ssl=ssl_context,
+            ping_interval=20,
+            open_timeout=10,
+            user_agent_header=BROWSER_USER_AGENT,
+        ) as ws:
 
-            if not ws_token_url:
-                print("토큰 발급 실패. 30초 후 재시도합니다.")
-                await asyncio.sleep(30)
-                return
+            print("✓ WebSocket connected!")
+            rpc = OpenViduRpc(ws, on_event=on_event)
+            reader = asyncio.create_task(rpc.run())
 
-            if "/openvidu" not in ws_token_url:
-                ws_url = ws_token_url.replace(f"?", f"/openvidu?")
-            else:
-                ws_url = ws_token_url
-
-            print(f"\nConnecting to WebSocket: {ws_url}")
-
-            ssl_context = ssl.create_default_context()
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
-            BROWSER_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.0.0 Safari/537.36"
-
-            async with websockets.connect(
-                ws_url,
-                ssl=ssl_context,
-                ping_interval=20,
-                open_timeout=10,
-                user_agent_header=BROWSER_USER_AGENT,
-            ) as ws:
-
-                print("✓ WebSocket connected!")
-                rpc_id = 1
-                join_message = {
-                    "jsonrpc": "2.0",
-                    "method": "joinRoom",
-                    "id": rpc_id,
-                    "params": {
+            try:
+                result = await rpc.call(
+                    "joinRoom",
+                    {
                         "token": ws_token_url,
-                        "session": SESSION_ID,
+                        "session": session_id,
                         "role": "SUBSCRIBER",
                         "serverData": f'{{"participantId": "{WORKER_PARTICIPANT_ID}"}}',
                         "platform": "Python_aiortc",
@@ -494,250 +550,174 @@ async def run_worker():
                         "recorder": False,
                         "dataChannels": True,
                     },
-                }
-                rpc_id_join = rpc_id
-                rpc_id += 1
-                await ws.send(json.dumps(join_message))
-
-                ice_servers = [
-                    RTCIceServer(urls=["stun:stun.l.google.com:19302"]),
-                    RTCIceServer(urls=["stun:stun1.l.google.com:19302"]),
-                ]
-
-                join_data = None
-                early_ice_candidates = []
-                while join_data is None:
-                    response = await ws.recv()
-                    data = json.loads(response)
-                    if data.get("id") == rpc_id_join:
-                        join_data = data
-                        print(f"✓ 'joinRoom' 응답 (ID: {rpc_id_join}) 수신.")
-                    elif data.get("method") == "iceCandidate":
-                        early_ice_candidates.append(data)
-                    elif data.get("method"):
-                        print(
-                            f"[EVENT] Received (while waiting for join): {data.get('method')}"
-                        )
-
-                if "error" in join_data:
-                    print(f"❌ Join error: {join_data['error']}")
-                    return
-                if not join_data.get("result") or not join_data["result"].get("id"):
-                    print(
-                        f"❌ 'joinRoom' 응답에 'result.id' (connectionId)가 없습니다: {join_data}"
-                    )
-                    return
-
-                worker_connection_id = join_data["result"]["id"]
-                print(f"✓ 'joinRoom' 성공. (ConnectionId: {worker_connection_id})")
-
-                result = join_data["result"]
-                if "customIceServers" in result and result["customIceServers"]:
-                    for turn_server in result["customIceServers"]:
-                        turn_url = turn_server.get("url")
-                        if not turn_url:
-                            continue
-
-                        ice_servers.append(
-                            RTCIceServer(
-                                urls=[turn_url],
-                                username=turn_server.get("username"),
-                                credential=turn_server.get("credential"),
-                            )
-                        )
+                )
+            except (OpenViduRpcError, ConnectionError, asyncio.TimeoutError) as e:
+                print(f"❌ Join error: {e}")
+                return
 
-                configuration = RTCConfiguration(iceServers=ice_servers)
-
-                pc = RTCPeerConnection(configuration=configuration)
-                upload_queue = asyncio.Queue()
-                main_loop = asyncio.get_event_loop()
-
-                pc.addTransceiver("video", direction="recvonly")
-
-                @pc.on("iceconnectionstatechange")
-                async def on_ice_connection_state_change():
-                    print(f"ICE connection state: {pc.iceConnectionState}")
-                    if pc.iceConnectionState == "failed":
-                        print("❌ ICE connection failed!")
-                    elif pc.iceConnectionState == "connected":
-                        print("✅ ICE connection established! (미디어 수신 시작)")
-
-                @pc.on("icecandidate")
-                async def on_ice_candidate(event):
-                    if event.candidate:
-                        candidate = event.candidate
-                        candidate_str = f"candidate:{candidate.foundation} {candidate.component} {candidate.protocol} {candidate.priority} {candidate.ip} {candidate.port} typ {candidate.type}"
-                        if candidate.relatedAddress:
-                            candidate_str += f" raddr {candidate.relatedAddress} rport {candidate.relatedPort}"
-                        candidate_message = {
-                            "jsonrpc": "2.0",
-                            "method": "onIceCandidate",
-                            "params": {
-                                "endpointName": worker_connection_id,
-                                "candidate": candidate_str,
-                                "sdpMid": (
-                                    str(candidate.sdpMid) if candidate.sdpMid else "0"
-                                ),
-                                "sdpMLineIndex": (
-                                    candidate.sdpMLineIndex
-                                    if candidate.sdpMLineIndex is not None
-                                    else 0
-                                ),
-                            },
-                        }
-                        print(f"[LOCAL ICE] Sending candidate: {candidate.type}")
-                        try:
-                            await ws.send(json.dumps(candidate_message))
-                        except Exception as e:
-                            print(f"[LOCAL ICE] ❌ Failed to send candidate: {e}")
-
-                @pc.on("track")
-                async def on_track(track):
-                    print(f"✓ Track received (kind: {track.kind})")
-                    while True:
-                        try:
-                            frame = await track.recv()
-                            await asyncio.to_thread(
-                                process_frame_and_manage_buffer,
-                                frame,
-                                upload_queue,
-                                main_loop,
-                            )
-                        except Exception as e:
-                            print(f"!!! EXCEPTION in on_track: {e}")
-                            break
-
-                if early_ice_candidates:
-                    print(
-                        f"--- Adding {len(early_ice_candidates)} early ICE candidates ---"
-                    )
-                    for data in early_ice_candidates:
-                        try:
-                            params = data["params"]
-                            candidate_str = params["candidate"].split(":", 1)[1]
-                            candidate = candidate_from_sdp(candidate_str)
-                            candidate.sdpMid = params.get("sdpMid")
-                            candidate.sdpMLineIndex = params.get("sdpMLineIndex")
-                            await pc.addIceCandidate(candidate)
-                            print(f"Added early ICE candidate: {params['candidate']}")
-                        except Exception as e:
-                            print(f"Failed to add early ICE candidate: {e}")
-
-                found_stream = False
-                for participant in join_data.get("result", {}).get("value", []):
-                    if participant.get(
-                        "id"
-                    ) != worker_connection_id and participant.get("streams"):
-                        stream_id = participant["streams"][0]["id"]
-                        print(f"✓ 'publisher_robot' 스트림 발견: {stream_id}")
-                        found_stream = True
-
-                        subscribe_offer = await pc.createOffer()
-                        await pc.setLocalDescription(subscribe_offer)
-                        subscribe_message = {
-                            "jsonrpc": "2.0",
-                            "method": "receiveVideoFrom",
-                            "id": rpc_id,
-                            "params": {
-                                "sender": stream_id,
-                                "sdpOffer": pc.localDescription.sdp,
-                            },
-                        }
-                        rpc_id_subscribe = rpc_id
-                        rpc_id += 1
-
-                        print(f"... 'receiveVideoFrom' ({stream_id}) 요청 중 ...")
-                        await ws.send(json.dumps(subscribe_message))
-
-                        subscribe_response = None
-                        while subscribe_response is None:
-                            response = await ws.recv()
-                            data = json.loads(response)
-                            if data.get("id") == rpc_id_subscribe:
-                                subscribe_response = data
-                                print(
-                                    f"✓ 'receiveVideoFrom' 응답 (ID: {rpc_id_subscribe}) 수신."
-                                )
-                            elif data.get("method") == "iceCandidate":
-                                print(
-                                    f"[EVENT] (During subscribe) Received iceCandidate"
-                                )
-                            elif data.get("method"):
-                                print(
-                                    f"[EVENT] Received (while waiting for subscribe): {data.get('method')}"
-                                )
-
-                        if "error" in subscribe_response:
-                            print(f"❌ Subscribe error: {subscribe_response['error']}")
-                            return
-
-                        answer_sdp = subscribe_response["result"]["sdpAnswer"]
-                        answer = RTCSessionDescription(sdp=answer_sdp, type="answer")
-                        await pc.setRemoteDescription(answer)
-                        print(f"✓ 'receiveVideoFrom' ({stream_id}) 성공.")
-                        break
+            worker_connection_id = result.get("id")
+            if not worker_connection_id:
+                print(f"❌ 'joinRoom' 응답에 'result.id' (connectionId)가 없습니다: {result}")
+                return
+            print(f"✓ 'joinRoom' 성공. (ConnectionId: {worker_connection_id})")
 
-                if not found_stream:
-                    print(
-                        "⚠️ 'joinRoom' 응답에 'publisher_robot'의 스트림이 없습니다. 대기합니다..."
+            for turn_server in result.get("customIceServers") or []:
+                turn_url = turn_server.get("url")
+                if not turn_url:
+                    continue
+                ice_servers.append(
+                    RTCIceServer(
+                        urls=[turn_url],
+                        username=turn_server.get("username"),
+                        credential=turn_server.get("credential"),
                     )
+                )
 
-                upload_task = asyncio.create_task(upload_worker(upload_queue))
+            publishers = [
+                (participant["id"], participant["streams"][0]["id"])
+                for participant in result.get("value", [])
+                if participant.get("id") != worker_connection_id and participant.get("streams")
+            ]
+            for connection_id, stream_id in publishers:
+                start_subscribe(rpc, connection_id, stream_id)
+            if not publishers:
+                print("⚠️ 아직 스트림을 발행한 로봇이 없습니다. 'participantPublished'를 기다립니다...")
 
-                print("\n" + "=" * 30)
-                print("✅ MediaPipe 워커 (스마일 감지) 활성화 완료")
-                print("=" * 30)
+            print("\n" + "=" * 30)
+            print(f"✅ MediaPipe 워커 (스마일 감지) 활성화 완료 - 세션 {session_id}")
+            print("=" * 30)
 
-                try:
-                    while True:
-                        message = await ws.recv()
-                        data = json.loads(message)
-                        if data.get("method") == "iceCandidate":
-                            try:
-                                params = data["params"]
-                                candidate_str = params["candidate"].split(":", 1)[1]
-                                candidate = candidate_from_sdp(candidate_str)
-                                candidate.sdpMid = params.get("sdpMid")
-                                candidate.sdpMLineIndex = params.get("sdpMLineIndex")
-                                await pc.addIceCandidate(candidate)
-                                print(
-                                    f"[REMOTE ICE] Added candidate: {params['candidate']}"
-                                )
-                            except Exception as e:
-                                print(
-                                    f"[REMOTE ICE] Failed to add remote candidate: {e}"
-                                )
-
-                except websockets.exceptions.ConnectionClosed as e:
-                    print(f"WebSocket connection closed: {e}")
-                except Exception as e:
-                    print(f"WebSocket loop error: {e}")
+            # 웹소켓이 닫힐 때까지 이벤트 처리
+            await reader
+            print(f"WebSocket connection closed: {session_id}")
 
-    except mqtt.exceptions.MqttError as e:
-        print(f"❌ MQTT connection failed: {e}")
-        await asyncio.sleep(30)
     except websockets.exceptions.InvalidStatus as e:
-        print(f"❌ WebSocket 연결 실패 (서버 거부): {e}")
+        print(f"❌ [{session_id}] WebSocket 연결 실패 (서버 거부): {e}")
+    except websockets.exceptions.ConnectionClosed as e:
+        print(f"WebSocket connection closed: {e}")
+    except Exception as e:
+        print(f"❌ [{session_id}] 세션 처리 중 오류 발생: {e}")
+        import traceback
+
+        traceback.print_exc()
+    finally:
+        if reader is not None and not reader.done():
+            reader.cancel()
+        for task in list(subscribe_tasks):
+            task.cancel()
+        for connection_id in list(subscriptions):
+            await close_subscription(connection_id, "세션 종료")
+        print(f"세션 종료: {session_id}")
+
+
+def reconnect_delay(attempt):
+    """attempt번째 재연결 전 대기 시간 - 지터 섞인 지수 백오프"""
+    delay = min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2**attempt)
+    return random.uniform(delay / 2, delay)
+
+
+async def supervise_session(session_id, upload_queue, main_loop):
+    """run_session을 감싸 끊길 때마다 지터 섞인 지수 백오프로 다시 연결 (모델 재로드 / 프로세스 재시작 없음)"""
+    attempt = 0
+    while True:
+        started = time.monotonic()
+        await run_session(session_id, upload_queue, main_loop)
+        if time.monotonic() - started >= RECONNECT_HEALTHY_SECONDS:
+            attempt = 0
+        delay = reconnect_delay(attempt)
+        attempt += 1
+        print(f"[{session_id}] {delay:.1f}초 후 재연결 시도 ({attempt}번째)")
+        await asyncio.sleep(delay)
+
+
+async def supervise_mqtt():
+    """
+    MQTT 연결 + 리스너를 세션과 같은 백오프로 다시 연결
+    브로커가 끊겨도 OpenVidu 세션(감지 / 녹화 / 업로드)은 그대로 돌고, RSP 요청만 재연결될 때까지 못 받는다
+    """
+    mqtt_ssl_context = ssl.create_default_context()
+    mqtt_ssl_context.check_hostname = False
+    mqtt_ssl_context.verify_mode = ssl.CERT_NONE
+
+    attempt = 0
+    while True:
+        started = time.monotonic()
+        try:
+            async with mqtt.Client(
+                hostname=MQTT_BROKER_HOST,
+                port=MQTT_BROKER_PORT,
+                username=MQTT_USERNAME,
+                password=MQTT_SECRET,
+                tls_context=mqtt_ssl_context,
+            ) as mqtt_client:
+                print("✓ MQTT Connected successfully.")
+                await mqtt_listener_worker(mqtt_client)
+        except mqtt.exceptions.MqttError as e:
+            print(f"❌ MQTT connection failed: {e}")
+        if time.monotonic() - started >= RECONNECT_HEALTHY_SECONDS:
+            attempt = 0
+        delay = reconnect_delay(attempt)
+        attempt += 1
+        print(f"[MQTT] {delay:.1f}초 후 재연결 시도 ({attempt}번째)")
+        await asyncio.sleep(delay)
+
+
+async def run_worker():
+    print("MediaPipe 워커(aiortc) 시작 중...")
+    if not SESSION_IDS:
+        print("❌ SESSION_ID 또는 SESSION_IDS가 설정되지 않았습니다.")
+        return
+    global openvidu_http
+
+    load_models()
+    start_metrics_server()
+    # OpenVidu는 자체 서명 인증서를 쓰므로 검증 생략 (기존 requests verify=False와 동일)
+    openvidu_http = httpx.AsyncClient(verify=False, timeout=10.0)
+    mqtt_task = None
+    uploader = None
+    try:
+        # MQTT는 세션과 따로 재연결 (브로커 장애로 워커가 내려가지 않게)
+        mqtt_task = asyncio.create_task(supervise_mqtt())
+
+        main_loop = asyncio.get_running_loop()
+        uploader = ClipUploader(API_UPLOAD_URL)
+        await uploader.start()
+        upload_queue = uploader.queue
+        UPLOAD_QUEUE_DEPTH.set_function(lambda: uploader.pending)
+
+        inference_pool.start()
+        print(f"구독 세션 {len(SESSION_IDS)}개: {', '.join(SESSION_IDS)}")
+        await asyncio.gather(
+            *(
+                supervise_session(session_id, upload_queue, main_loop)
+                for session_id in SESSION_IDS
+            )
+        )
+
     except Exception as e:
         print(f"❌ 치명적인 오류 발생: {e}")
         import traceback
 
         traceback.print_exc()
     finally:
-        if face_landmarker:
-            face_landmarker.close()
-        if "pose_detector" in globals() and pose_detector:
-            pose_detector.close()
         if mqtt_task and not mqtt_task.done():
             mqtt_task.cancel()
-        if upload_task and not upload_task.done():
-            upload_task.cancel()
-
-        if pc:
-            await pc.close()
+        if uploader is not None:
+            await uploader.close()
+        if openvidu_http is not None:
+            await openvidu_http.aclose()
+
+        for session in sessions.values():
+            unwatch_session(session)
+            inference_pool.unregister(session)
+            session.close()
+        sessions.clear()
+        if inference_pool:
+            inference_pool.close()
+        if clip_recorder is not None:
+            clip_recorder.close()
         print("워커 종료.")
 
-
 if __name__ == "__main__":
     try:
         loop = asyncio.get_event_loop_policy().get_event_loop()